@@ -0,0 +1,345 @@
+"""API HTTP/JSON do catálogo, para integrações (planilha do caixa, bot de catálogo do WhatsApp...).
+
+Roda ao lado do Streamlit, usando o mesmo banco, sem abrir sessões do Streamlit. Catálogo,
+estoque e vendas passam por utils/armazenamento.py: com ESTOQUE_BACKEND=postgres a API lê e
+vende direto no PostgreSQL (usuários e login continuam no SQLite).
+
+Rotas:
+    GET  /api/produtos?pagina=1&por_pagina=50&busca=&marca=&estilo=&tipo=&local_id=
+    GET  /api/produtos/<id>
+    GET  /api/locais
+    GET  /fotos/<arquivo>?v=<versão>&px=<largura>   (foto ou miniatura; ver utils/images.py)
+    POST /api/login                    {"username": ..., "password": ...} -> {"token": ...}
+    POST /api/produtos/<id>/vender     {"quantidade": 1, "local_id": null}
+                                       (cabeçalho "Authorization: Bearer <token>")
+
+As respostas GET têm ETag derivado da versão dos dados: com If-None-Match a API responde
+304 sem consultar os produtos. Respostas maiores que 1 KB são compactadas com gzip
+quando o cliente aceita. As fotos têm ETag do hash do conteúdo; pedidas com a versão
+atual (?v=, como nas URLs geradas por foto_html) vêm com Cache-Control de um ano.
+
+Exemplo:
+    python api.py --port 8502
+    curl -s "http://127.0.0.1:8502/api/produtos?busca=batom&por_pagina=5"
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+import re
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from utils.armazenamento import get_armazenamento
+from utils.auth import issue_session_token, verify_user_password
+from utils.images import MINIATURAS_PX, arquivo_foto
+from utils.permissions import lookup_user, principal_do_token
+
+logger = logging.getLogger(__name__)
+
+MAX_POR_PAGINA = 200
+MIN_BYTES_GZIP = 1024
+MAX_CORPO_BYTES = 64 * 1024
+CACHE_FOTO_VERSIONADA = "public, max-age=31536000, immutable"
+
+ROTA_PRODUTO = re.compile(r"^/api/produtos/(\d+)$")
+ROTA_VENDA = re.compile(r"^/api/produtos/(\d+)/vender$")
+ROTA_FOTO = re.compile(r"^/fotos/([^/]+)$")
+
+
+class ErroApi(Exception):
+    """Erro com status HTTP, devolvido ao cliente como {"erro": mensagem}."""
+
+    def __init__(self, status, mensagem):
+        super().__init__(mensagem)
+        self.status = status
+        self.mensagem = mensagem
+
+
+def _inteiro(params, nome, padrao=None, minimo=1, maximo=None):
+    valor = params.get(nome, [None])[0]
+    if valor in (None, ""):
+        return padrao
+    try:
+        numero = int(valor)
+    except ValueError:
+        raise ErroApi(HTTPStatus.BAD_REQUEST, f"'{nome}' deve ser um número inteiro.")
+    if numero < minimo or (maximo is not None and numero > maximo):
+        raise ErroApi(HTTPStatus.BAD_REQUEST, f"'{nome}' fora do intervalo permitido.")
+    return numero
+
+
+def _texto(params, nome):
+    return params.get(nome, [None])[0] or None
+
+
+# ====================================================================
+# ROTAS
+# ====================================================================
+
+def listar(params):
+    pagina = _inteiro(params, "pagina", 1)
+    por_pagina = _inteiro(params, "por_pagina", 50, maximo=MAX_POR_PAGINA)
+    resultado = get_armazenamento().listar_produtos(
+        pagina, por_pagina, local_id=_inteiro(params, "local_id"), busca=_texto(params, "busca"),
+        marca=_texto(params, "marca"), estilo=_texto(params, "estilo"), tipo=_texto(params, "tipo"),
+    )
+    return {
+        "pagina": pagina,
+        "por_pagina": por_pagina,
+        "total": resultado["total"],
+        "paginas": -(-resultado["total"] // por_pagina),
+        "itens": resultado["itens"],
+    }
+
+
+def detalhar(produto_id):
+    armazenamento = get_armazenamento()
+    produto = armazenamento.get_produto_by_id(produto_id)
+    if produto is None:
+        raise ErroApi(HTTPStatus.NOT_FOUND, "Produto não encontrado.")
+    produto["estoque_por_local"] = armazenamento.get_estoque_por_local(produto_id)
+    return produto
+
+
+def entrar(corpo):
+    user = lookup_user(corpo.get("username") or "")
+    if not verify_user_password(user, corpo.get("password") or ""):
+        raise ErroApi(HTTPStatus.UNAUTHORIZED, "Usuário ou senha incorretos.")
+    return {"token": issue_session_token(user["username"], user.get("role")), "role": user.get("role")}
+
+
+def vender(produto_id, corpo, principal):
+    if not principal.can("vender"):
+        raise ErroApi(HTTPStatus.FORBIDDEN if principal.autenticado else HTTPStatus.UNAUTHORIZED,
+                      "Faça login com um usuário que possa vender.")
+    quantidade = corpo.get("quantidade", 1)
+    local_id = corpo.get("local_id")
+    # bool é subclasse de int no Python: true/false no JSON não valem como número
+    if not isinstance(quantidade, int) or isinstance(quantidade, bool) or quantidade < 1:
+        raise ErroApi(HTTPStatus.BAD_REQUEST, "'quantidade' deve ser um inteiro positivo.")
+    if local_id is not None and (not isinstance(local_id, int) or isinstance(local_id, bool) or local_id < 1):
+        raise ErroApi(HTTPStatus.BAD_REQUEST, "'local_id' deve ser um inteiro positivo (ou omitido).")
+
+    armazenamento = get_armazenamento()
+    if not armazenamento.vender(produto_id, quantidade, local_id=local_id):
+        produto = armazenamento.get_produto_by_id(produto_id)
+        if produto is None:
+            raise ErroApi(HTTPStatus.NOT_FOUND, "Produto não encontrado.")
+        if local_id is None:
+            disponivel = produto["quantidade"]
+        else:
+            disponivel = next(
+                (l["quantidade"] for l in armazenamento.get_estoque_por_local(produto_id) if l["local_id"] == local_id), 0
+            )
+        raise ErroApi(HTTPStatus.CONFLICT, f"Estoque insuficiente ({disponivel} disponível).")
+    return armazenamento.get_produto_by_id(produto_id)
+
+
+# ====================================================================
+# HANDLER HTTP
+# ====================================================================
+
+class ApiHandler(BaseHTTPRequestHandler):
+    server_version = "EstoqueAPI/1.0"
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, formato, *args):
+        logger.info("%s - %s", self.address_string(), formato % args)
+
+    # --- Respostas ---
+
+    def _aceita_gzip(self):
+        return "gzip" in (self.headers.get("Accept-Encoding") or "").lower()
+
+    def _responder(self, status, dados, etag=None):
+        corpo = json.dumps(dados, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        compactado = len(corpo) >= MIN_BYTES_GZIP and self._aceita_gzip()
+        if compactado:
+            corpo = gzip.compress(corpo, compresslevel=6)
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(corpo)))
+        self.send_header("Vary", "Accept-Encoding")
+        if compactado:
+            self.send_header("Content-Encoding", "gzip")
+        if self.close_connection:
+            self.send_header("Connection", "close")
+        if etag:
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(corpo)
+
+    def _nao_modificado(self, etag, cache_control=None):
+        self.send_response(HTTPStatus.NOT_MODIFIED)
+        self.send_header("ETag", etag)
+        self.send_header("Vary", "Accept-Encoding")
+        if cache_control:
+            self.send_header("Cache-Control", cache_control)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def _etag_confere(self, etag):
+        return etag in [t.strip() for t in (self.headers.get("If-None-Match") or "").split(",")]
+
+    def _enviar_foto(self, nome, params):
+        """Foto (ou miniatura) com ETag do conteúdo; cache longo quando a URL traz a versão atual."""
+        px = _inteiro(params, "px")
+        if px is not None and px not in MINIATURAS_PX:
+            raise ErroApi(HTTPStatus.BAD_REQUEST, f"'px' deve ser um de {', '.join(map(str, MINIATURAS_PX))}.")
+        encontrada = arquivo_foto(nome, px)
+        if encontrada is None:
+            raise ErroApi(HTTPStatus.NOT_FOUND, "Foto não encontrada.")
+        caminho, versao = encontrada
+        etag = f'"{versao}-{px or 0}"'
+        # Versão antiga ou ausente na URL: o navegador revalida sempre (ETag); atual: guarda por um ano
+        cache_control = CACHE_FOTO_VERSIONADA if _texto(params, "v") == versao else "no-cache"
+        if self._etag_confere(etag):
+            self._nao_modificado(etag, cache_control)
+            return
+        with open(caminho, "rb") as f:
+            corpo = f.read()
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", mimetypes.guess_type(caminho)[0] or "application/octet-stream")
+        self.send_header("Content-Length", str(len(corpo)))
+        self.send_header("ETag", etag)
+        self.send_header("Cache-Control", cache_control)
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(corpo)
+
+    def _etag(self, url):
+        """ETag da representação: versão dos dados + URL + codificação (sem ler os produtos)."""
+        chave = f"{get_armazenamento().get_versao()}|{url.path}?{url.query}|{self._aceita_gzip()}"
+        return '"' + hashlib.sha1(chave.encode()).hexdigest()[:20] + '"'
+
+    def _tamanho_corpo(self):
+        try:
+            tamanho = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            tamanho = -1
+        if tamanho < 0:
+            raise ErroApi(HTTPStatus.BAD_REQUEST, "Content-Length inválido.")
+        return tamanho
+
+    def _corpo_json(self):
+        tamanho = self._tamanho_corpo()
+        if tamanho > MAX_CORPO_BYTES:
+            raise ErroApi(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "Corpo da requisição muito grande.")
+        self._corpo_lido = True
+        if not tamanho:
+            return {}
+        try:
+            corpo = json.loads(self.rfile.read(tamanho))
+        except ValueError:
+            raise ErroApi(HTTPStatus.BAD_REQUEST, "JSON inválido.")
+        if not isinstance(corpo, dict):
+            raise ErroApi(HTTPStatus.BAD_REQUEST, "O corpo deve ser um objeto JSON.")
+        return corpo
+
+    def _token(self):
+        autorizacao = self.headers.get("Authorization") or ""
+        return autorizacao[7:].strip() if autorizacao.lower().startswith("bearer ") else None
+
+    def _fechar_se_corpo_pendente(self):
+        """Resposta de erro antes de ler o corpo: fecha a conexão (keep-alive), senão os bytes
+        que sobraram no socket seriam lidos como a próxima requisição."""
+        try:
+            pendente = not self._corpo_lido and self._tamanho_corpo() > 0
+        except ErroApi:
+            pendente = True
+        if pendente:
+            self.close_connection = True
+
+    def _executar(self, rota):
+        self._corpo_lido = False
+        try:
+            rota()
+        except ErroApi as e:
+            self._fechar_se_corpo_pendente()
+            self._responder(e.status, {"erro": e.mensagem})
+        except Exception:
+            logger.exception("Erro ao processar %s %s", self.command, self.path)
+            self._fechar_se_corpo_pendente()
+            self._responder(HTTPStatus.INTERNAL_SERVER_ERROR, {"erro": "Erro interno."})
+
+    # --- Métodos ---
+
+    def do_GET(self):
+        self._executar(self._get)
+
+    def do_HEAD(self):
+        self._executar(self._get)
+
+    def do_POST(self):
+        self._executar(self._post)
+
+    def _get(self):
+        url = urlsplit(self.path)
+        params = parse_qs(url.query)
+        if ROTA_FOTO.match(url.path):
+            self._enviar_foto(unquote(ROTA_FOTO.match(url.path).group(1)), params)
+            return
+        if url.path == "/api/produtos":
+            gerar = lambda: listar(params)
+        elif ROTA_PRODUTO.match(url.path):
+            produto_id = int(ROTA_PRODUTO.match(url.path).group(1))
+            gerar = lambda: detalhar(produto_id)
+        elif url.path == "/api/locais":
+            gerar = get_armazenamento().get_totais_por_local
+        else:
+            raise ErroApi(HTTPStatus.NOT_FOUND, "Rota não encontrada.")
+
+        # Requisição condicional: se a versão não mudou, nem consulta os produtos
+        etag = self._etag(url)
+        if self._etag_confere(etag):
+            self._nao_modificado(etag)
+            return
+        self._responder(HTTPStatus.OK, gerar(), etag=etag)
+
+    def _post(self):
+        url = urlsplit(self.path)
+        if url.path == "/api/login":
+            self._responder(HTTPStatus.OK, entrar(self._corpo_json()))
+        elif ROTA_VENDA.match(url.path):
+            produto_id = int(ROTA_VENDA.match(url.path).group(1))
+            principal = principal_do_token(self._token())
+            self._responder(HTTPStatus.OK, vender(produto_id, self._corpo_json(), principal))
+        else:
+            raise ErroApi(HTTPStatus.NOT_FOUND, "Rota não encontrada.")
+
+
+def criar_servidor(host="127.0.0.1", port=8502, conexoes=8):
+    """Cria o servidor (uma thread por requisição) com o pool de conexões do banco ativado."""
+    get_armazenamento().ativar_pool(conexoes)
+    servidor = ThreadingHTTPServer((host, port), ApiHandler)
+    servidor.daemon_threads = True
+    return servidor
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default=os.environ.get("ESTOQUE_API_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("ESTOQUE_API_PORT", 8502)))
+    parser.add_argument("--conexoes", type=int, default=8, help="Conexões ociosas mantidas no pool do banco")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    servidor = criar_servidor(args.host, args.port, args.conexoes)
+    print(f"API do estoque em http://{args.host}:{args.port}/api/produtos (Ctrl+C para encerrar)")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+
+
+if __name__ == "__main__":
+    main()
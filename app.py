@@ -1,10 +1,14 @@
 import streamlit as st
 import os
-from utils.database import create_tables
+from utils.database import create_tables, garantir_snapshot_do_dia
+from utils.instrumentation import page_timer
+from utils.permissions import logout
 
 
 # Inicializa o banco de dados e as tabelas
 create_tables()
+# Fotografia diária do estoque para o histórico (se o agendador ainda não a gravou hoje)
+garantir_snapshot_do_dia()
 def load_css(file_name):
     """Carrega e aplica o CSS personalizado, forçando a codificação UTF-8."""
     if not os.path.exists(file_name):
@@ -21,28 +25,29 @@ st.set_page_config(
     initial_sidebar_state="expanded",
 )
 
-st.title("🌸 Cores e Fragrâncias by Berenice 🌸")
+with page_timer("Início"):
+    st.title("🌸 Cores e Fragrâncias by Berenice 🌸")
 
-st.markdown("""
+    st.markdown("""
 Este é o aplicativo para **gerenciamento de estoque** da loja.
 
 Use o menu lateral (ícone das páginas do Streamlit) para navegar entre:
 - 📦 Estoque Completo
 - 💰 Produtos Vendidos
+- 📈 Histórico do Estoque (valor em estoque por data)
 - 🔐 Área Administrativa (login / cadastro)
 - 🛠️ Gerenciar Produtos (somente após login)
 - 🤖 Chatbot de Estoque
 """)
 
-# Mostra logo (verifique assets/logo.png)
-try:
-    st.image("assets/logo.png", width=250)
-except Exception:
-    st.info("Coloque a sua logo em assets/logo.png para exibir aqui.")
-
-# Botão de Logout (mostrado no sidebar se estiver logado)
-if "logged_in" in st.session_state and st.session_state["logged_in"]:
-    if st.sidebar.button("Sair"):
-        st.session_state["logged_in"] = False
-        st.session_state["username"] = ""
-        st.rerun()
\ No newline at end of file
+    # Mostra logo (verifique assets/logo.png)
+    try:
+        st.image("assets/logo.png", width=250)
+    except Exception:
+        st.info("Coloque a sua logo em assets/logo.png para exibir aqui.")
+
+    # Botão de Logout (mostrado no sidebar se estiver logado)
+    if "logged_in" in st.session_state and st.session_state["logged_in"]:
+        if st.sidebar.button("Sair"):
+            logout(st.session_state)
+            st.rerun()
\ No newline at end of file
@@ -1,8 +1,28 @@
 import streamlit as st
-from utils.database import get_all_produtos
+from utils.database import get_all_produtos, get_locais, get_totais_estoque, get_totais_por_local, get_facetas
+from utils.images import foto_html
+from utils.instrumentation import page_timer
+from utils.permissions import get_principal
 import os
 
 # --- Funções Auxiliares ---
+def filtro_atual(key, todos):
+    """Valor selecionado no filtro (antes de desenhá-lo), ou None para 'Todos'."""
+    valor = st.session_state.get(key, todos)
+    return None if valor == todos else valor
+
+def selectbox_faceta(rotulo, faceta, todos, facetas, key):
+    """Selectbox de filtro com a contagem de produtos de cada opção, ex.: 'Natura (132)'."""
+    contagens = dict(facetas[faceta])
+    atual = st.session_state.get(key, todos)
+    if atual != todos and atual not in contagens:
+        contagens[atual] = 0  # Mantém a seleção mesmo sem produtos com os outros filtros
+    opcoes = [todos] + sorted(contagens)
+    return st.selectbox(
+        rotulo, opcoes, key=key,
+        format_func=lambda v: v if v == todos else f"{v} ({contagens[v]})",
+    )
+
 def load_css(file_name):
     if not os.path.exists(file_name):
         st.warning(f"O arquivo CSS '{file_name}' não foi encontrado.")
@@ -17,76 +37,94 @@ load_css("style.css")
 
 st.set_page_config(page_title="Estoque - Cores e Fragrâncias")
 
-st.title("📦 Estoque Completo")
-
-# 🔄 CHAMADA CRÍTICA: Obter dados mais recentes
-produtos = get_all_produtos()
-
-if not produtos:
-    st.info("Nenhum produto cadastrado no estoque.")
-else:
-    # Coleta de categorias únicas para os filtros
-    marcas = sorted(list({p.get("marca") for p in produtos if p.get("marca")}))
-    estilos = sorted(list({p.get("estilo") for p in produtos if p.get("estilo")}))
-    tipos = sorted(list({p.get("tipo") for p in produtos if p.get("tipo")}))
-
-    # Filtros em colunas
-    col1, col2, col3 = st.columns(3)
-    with col1:
-        marca_filtro = st.selectbox("Filtrar por Marca", ["Todas"] + marcas)
-    with col2:
-        estilo_filtro = st.selectbox("Filtrar por Estilo", ["Todos"] + estilos)
-    with col3:
-        tipo_filtro = st.selectbox("Filtrar por Tipo", ["Todos"] + tipos)
-
-    # Aplicação dos filtros
-    produtos_filtrados = produtos
-    if marca_filtro != "Todas":
-        produtos_filtrados = [p for p in produtos_filtrados if p.get("marca") == marca_filtro]
-    if estilo_filtro != "Todos": 
-        produtos_filtrados = [p for p in produtos_filtrados if p.get("estilo") == estilo_filtro]
-    if tipo_filtro != "Todos":
-        produtos_filtrados = [p for p in produtos_filtrados if p.get("tipo") == tipo_filtro]
-
-    st.markdown("---")
-    st.subheader(f"{len(produtos_filtrados)} produtos encontrados")
-
-    # Exibição dos produtos filtrados
-    for p in produtos_filtrados:
-        st.markdown(f"### **{p.get('nome')}**")
+with page_timer("Estoque Completo"):
+    st.title("📦 Estoque Completo")
+
+    if not get_principal(st.session_state).can("ver_estoque"):
+        st.error("Acesso negado. Faça login na área administrativa.")
+        st.stop()
+
+    # Totais por local (mantidos no banco, sem somar produto a produto)
+    totais_locais = get_totais_por_local()
+    cols_locais = st.columns(len(totais_locais) or 1)
+    for col, t in zip(cols_locais, totais_locais):
+        col.metric(t["nome"], f"{t['unidades']} un.", f"R$ {t['valor']:,.2f}", delta_color="off")
+
+    locais = {l["nome"]: l["id"] for l in get_locais()}
+    local_filtro = st.selectbox("Filtrar por Local", ["Todos"] + list(locais))
+    local_id = locais.get(local_filtro)
+
+    # 🔄 CHAMADA CRÍTICA: Obter dados mais recentes (com local, a quantidade é a do local)
+    produtos = get_all_produtos(local_id)
+
+    if not produtos:
+        st.info("Nenhum produto cadastrado no estoque.")
+    else:
+        # Opções de filtro com contagens (GROUP BY no banco, em cache até os produtos mudarem),
+        # cada uma condicionada às seleções atuais das outras
+        facetas = get_facetas(
+            local_id=local_id,
+            marca=filtro_atual("filtro_marca", "Todas"),
+            estilo=filtro_atual("filtro_estilo", "Todos"),
+            tipo=filtro_atual("filtro_tipo", "Todos"),
+        )
+
+        # Filtros em colunas
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            marca_filtro = selectbox_faceta("Filtrar por Marca", "marca", "Todas", facetas, "filtro_marca")
+        with col2:
+            estilo_filtro = selectbox_faceta("Filtrar por Estilo", "estilo", "Todos", facetas, "filtro_estilo")
+        with col3:
+            tipo_filtro = selectbox_faceta("Filtrar por Tipo", "tipo", "Todos", facetas, "filtro_tipo")
+
+        # Aplicação dos filtros
+        produtos_filtrados = produtos
+        if marca_filtro != "Todas":
+            produtos_filtrados = [p for p in produtos_filtrados if p.get("marca") == marca_filtro]
+        if estilo_filtro != "Todos": 
+            produtos_filtrados = [p for p in produtos_filtrados if p.get("estilo") == estilo_filtro]
+        if tipo_filtro != "Todos":
+            produtos_filtrados = [p for p in produtos_filtrados if p.get("tipo") == tipo_filtro]
+
+        st.markdown("---")
+        st.subheader(f"{len(produtos_filtrados)} produtos encontrados")
+
+        # Exibição dos produtos filtrados
+        for p in produtos_filtrados:
+            st.markdown(f"### **{p.get('nome')}**")
         
-        # TRATAMENTO DE ERRO: Preço e Quantidade
-        try:
-            preco_formatado = f"R$ {float(p.get('preco')):.2f}"
-            quantidade_int = int(p.get('quantidade', 0))
-        except (ValueError, TypeError):
-            preco_formatado = "R$ N/A"
-            quantidade_int = "N/A"
-
-        st.write(f"**Preço:** {preco_formatado}")
-        st.write(f"**Quantidade:** {quantidade_int}")
-        st.write(f"**Marca:** {p.get('marca')}")
-        st.write(f"**Estilo:** {p.get('estilo')}")
-        st.write(f"**Tipo:** {p.get('tipo')}")
-        st.write(f"**Validade:** {p.get('data_validade') or 'N/A'}")
+            # Preço e quantidade já são válidos no banco (regras de utils/validacao.py)
+            st.write(f"**Preço:** R$ {p['preco']:.2f}")
+            st.write(f"**Quantidade:** {p['quantidade']}")
+            st.write(f"**Marca:** {p.get('marca')}")
+            st.write(f"**Estilo:** {p.get('estilo')}")
+            st.write(f"**Tipo:** {p.get('tipo')}")
+            st.write(f"**Validade:** {p.get('data_validade') or 'N/A'}")
         
-        # TRATAMENTO DE ERRO: Carregamento da foto
-        if p.get("foto"):
-            photo_path = os.path.join("assets", p.get('foto'))
-            if os.path.exists(photo_path):
-                try:
-                    st.image(photo_path, width=180)
-                except Exception:
-                    st.info("Erro ao carregar imagem.")
-            else:
-                st.info("Sem foto ou caminho inválido.")
+            # TRATAMENTO DE ERRO: Carregamento da foto
+            if p.get("foto"):
+                photo_path = os.path.join("assets", p.get('foto'))
+                img_html = foto_html(p.get('foto'), 180)
+                if img_html:
+                    # Servida pela API com cache longo: reruns não reenviam a foto
+                    st.markdown(img_html, unsafe_allow_html=True)
+                elif os.path.exists(photo_path):
+                    try:
+                        st.image(photo_path, width=180)
+                    except Exception:
+                        st.info("Erro ao carregar imagem.")
+                else:
+                    st.info("Sem foto ou caminho inválido.")
                 
-        st.markdown("---")
+            st.markdown("---")
 
-    # Cálculo do valor total em estoque (filtrado) - Robusto
-    total_estoque = sum(
-        (float(p.get("preco", 0)) if p.get("preco") else 0) * (int(p.get("quantidade", 0)) if p.get("quantidade") else 0)
-        for p in produtos_filtrados
-    )
+        # Valor total em estoque (filtrado), calculado no SQL
+        total_estoque = get_totais_estoque(
+            local_id=local_id,
+            marca=None if marca_filtro == "Todas" else marca_filtro,
+            estilo=None if estilo_filtro == "Todos" else estilo_filtro,
+            tipo=None if tipo_filtro == "Todos" else tipo_filtro,
+        )["valor"]
     
-    st.success(f"💰 Valor Total em Estoque (filtrado): R$ {total_estoque:,.2f}")
\ No newline at end of file
+        st.success(f"💰 Valor Total em Estoque (filtrado): R$ {total_estoque:,.2f}")
\ No newline at end of file
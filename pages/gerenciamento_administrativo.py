@@ -1,6 +1,13 @@
 import streamlit as st
 import os
-from utils.database import add_user, get_user, get_all_users, hash_password
+from datetime import date, timedelta
+from utils.database import (
+    add_user, delete_user, update_user_role, get_audit_log,
+    get_categorias, add_categoria, rename_categoria, delete_categoria,
+)
+from utils.auth import verify_user_password
+from utils.permissions import get_principal, login, logout, lookup_user, list_users, ROLES
+from utils.instrumentation import page_timer, get_metrics, reset_metrics
 
 # --- Funções Auxiliares ---
 def load_css(file_name):
@@ -18,68 +25,191 @@ load_css("style.css")
 
 st.set_page_config(page_title="Área Administrativa - Cores e Fragrâncias")
 
-st.title("🔐 Área Administrativa")
+with page_timer("Área Administrativa"):
+    st.title("🔐 Área Administrativa")
 
-# Inicializa o estado de login
-if "logged_in" not in st.session_state:
-    st.session_state["logged_in"] = False
-
-# Adiciona botão de Logout se logado
-if st.session_state.get("logged_in"):
-    st.sidebar.success(f"Logado como: **{st.session_state.get('username')}** ({st.session_state.get('role')})")
-    if st.sidebar.button("Logout"):
+    # Inicializa o estado de login
+    if "logged_in" not in st.session_state:
         st.session_state["logged_in"] = False
-        st.session_state.pop("username", None)
-        st.session_state.pop("role", None)
-        st.success("Sessão encerrada com sucesso.")
-        st.rerun()
-
-st.markdown("Faça login ou cadastre um novo administrador ou funcionário abaixo.")
-
-option = st.selectbox("Escolha uma ação", ["Login", "Cadastrar Novo Usuário", "Gerenciar Contas (Admins)"])
-
-if option == "Login":
-    username = st.text_input("Nome de usuário", key="login_user")
-    password = st.text_input("Senha", type="password", key="login_pass")
-    if st.button("Entrar"):
-        user = get_user(username)
-        if not user:
-            st.error("Usuário não encontrado.")
+
+    # Principal em cache na sessão (token assinado validado a cada rerun, sem refazer o hash)
+    principal = get_principal(st.session_state)
+
+    # Adiciona botão de Logout se logado
+    if principal.autenticado:
+        st.sidebar.success(f"Logado como: **{principal.username}** ({principal.role})")
+        if st.sidebar.button("Logout"):
+            logout(st.session_state)
+            st.success("Sessão encerrada com sucesso.")
+            st.rerun()
+
+    st.markdown("Faça login ou cadastre um novo administrador ou funcionário abaixo.")
+
+    option = st.selectbox("Escolha uma ação", ["Login", "Cadastrar Novo Usuário", "Gerenciar Contas (Admins)", "Diagnóstico de Desempenho (Admins)", "Auditoria de Produtos (Admins)", "Categorias (Admins)"])
+
+    if option == "Login":
+        username = st.text_input("Nome de usuário", key="login_user")
+        password = st.text_input("Senha", type="password", key="login_pass")
+        if st.button("Entrar"):
+            user = lookup_user(username)
+            if not user:
+                st.error("Usuário não encontrado.")
+            else:
+                # Verificação (scrypt) síncrona, ~50 ms; senhas antigas em SHA256 são migradas aqui
+                with st.spinner("Verificando credenciais..."):
+                    senha_ok = verify_user_password(user, password)
+                if senha_ok:
+                    st.success(f"Bem-vindo(a), {username} ({user.get('role')})!")
+                    login(st.session_state, user)
+                    st.rerun()
+                else:
+                    st.error("Usuário ou senha incorretos.")
+
+    elif option == "Cadastrar Novo Usuário":
+        new_username = st.text_input("Novo nome de usuário", key="reg_user")
+        new_password = st.text_input("Senha", type="password", key="reg_pass")
+        confirm = st.text_input("Confirme a senha", type="password", key="reg_conf")
+        # Só um admin escolhe o papel; sem nenhum admin cadastrado, a primeira conta vira admin
+        if principal.can("gerenciar_contas"):
+            role = st.selectbox("Papel do usuário", ROLES[::-1])
+        elif not any(u.get('role') == 'admin' for u in list_users()):
+            role = 'admin'
+            st.info("Nenhum administrador cadastrado: esta conta será criada como admin.")
         else:
-            if hash_password(password) == user.get("password"):
-                st.success(f"Bem-vindo(a), {username} ({user.get('role')})!")
-                st.session_state["logged_in"] = True
-                st.session_state["username"] = username
-                st.session_state["role"] = user.get('role')
-                st.rerun()
+            role = 'staff'
+            st.caption("A conta será criada como funcionário (staff); um admin pode alterar o papel depois.")
+        if st.button("Cadastrar"):
+            if not new_username or not new_password:
+                st.error("Preencha todos os campos.")
+            elif new_password != confirm:
+                st.error("As senhas não coincidem.")
             else:
-                st.error("Usuário ou senha incorretos.")
-
-elif option == "Cadastrar Novo Usuário":
-    new_username = st.text_input("Novo nome de usuário", key="reg_user")
-    new_password = st.text_input("Senha", type="password", key="reg_pass")
-    confirm = st.text_input("Confirme a senha", type="password", key="reg_conf")
-    role = st.selectbox("Papel do usuário", ["admin", "staff"])
-    if st.button("Cadastrar"):
-        if not new_username or not new_password:
-            st.error("Preencha todos os campos.")
-        elif new_password != confirm:
-            st.error("As senhas não coincidem.")
+                if lookup_user(new_username):
+                    st.error("Nome de usuário já existe.")
+                else:
+                    add_user(new_username, new_password, role=role)
+                    st.success(f"Usuário '{new_username}' criado com papel '{role}'. Agora faça login.")
+                    st.rerun() # Atualiza a página para limpar os campos e incentivar o login
+
+    elif option == "Gerenciar Contas (Admins)":
+        if not principal.can("gerenciar_contas"):
+            st.error('Apenas administradores podem gerenciar contas. Faça login como admin.')
+        else:
+            st.subheader('Usuários cadastrados')
+            users = list_users()
+            for u in users:
+                nome_usuario = u.get('username')
+                cols = st.columns([3, 2, 1])
+                with cols[0]:
+                    st.write(f"- {nome_usuario} ({u.get('role')})")
+                with cols[1]:
+                    novo_papel = st.selectbox(
+                        "Papel", ROLES, index=ROLES.index(u.get('role')) if u.get('role') in ROLES else 0,
+                        key=f"role_{nome_usuario}", label_visibility="collapsed"
+                    )
+                    if novo_papel != u.get('role'):
+                        if update_user_role(nome_usuario, novo_papel):
+                            st.success(f"Papel de '{nome_usuario}' alterado para '{novo_papel}'.")
+                            st.rerun()
+                        else:
+                            st.error("Não é possível rebaixar o último administrador.")
+                with cols[2]:
+                    if nome_usuario == principal.username:
+                        st.caption('Você')
+                    elif st.button('Remover', key=f"del_user_{nome_usuario}"):
+                        if delete_user(nome_usuario):
+                            st.warning(f"Usuário '{nome_usuario}' removido.")
+                            st.rerun()
+                        else:
+                            st.error("Não é possível remover o último administrador.")
+
+    elif option == "Diagnóstico de Desempenho (Admins)":
+        if not principal.can("ver_diagnostico"):
+            st.error('Apenas administradores podem ver o diagnóstico. Faça login como admin.')
+        else:
+            st.subheader('Tempo gasto neste processo')
+            st.caption('Métricas acumuladas desde o início do processo do Streamlit (todas as sessões).')
+            metricas = get_metrics()
+
+            st.markdown('##### Por página')
+            st.dataframe(metricas['paginas'], use_container_width=True)
+            st.markdown('##### Por função do banco de dados')
+            st.dataframe(metricas['funcoes'], use_container_width=True)
+            st.markdown('##### Por consulta SQL')
+            st.dataframe(metricas['queries'], use_container_width=True)
+
+            if st.button('Zerar métricas'):
+                reset_metrics()
+                st.rerun()
+
+    elif option == "Auditoria de Produtos (Admins)":
+        if not principal.can("ver_auditoria"):
+            st.error('Apenas administradores podem ver a auditoria. Faça login como admin.')
         else:
-            if get_user(new_username):
-                st.error("Nome de usuário já existe.")
+            st.subheader('Histórico de alterações de produtos')
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                produto_id = st.number_input("ID do produto (0 = todos)", min_value=0, step=1, value=0)
+            with col2:
+                desde = st.date_input("De", value=date.today() - timedelta(days=30))
+            with col3:
+                ate = st.date_input("Até", value=date.today())
+            limite = st.selectbox("Máximo de registros", [100, 500, 2000])
+
+            changes = get_audit_log(produto_id=produto_id or None, desde=desde.isoformat(), ate=ate.isoformat(), limit=limite)
+            if not changes:
+                st.info("Nenhuma alteração encontrada para os filtros selecionados.")
             else:
-                add_user(new_username, new_password, role=role)
-                st.success(f"Usuário '{new_username}' criado com papel '{role}'. Agora faça login.")
-                st.rerun() # Atualiza a página para limpar os campos e incentivar o login
-
-elif option == "Gerenciar Contas (Admins)":
-    if not st.session_state.get('logged_in') or st.session_state.get('role') != 'admin':
-        st.error('Apenas administradores podem gerenciar contas. Faça login como admin.')
-    else:
-        st.subheader('Usuários cadastrados')
-        users = get_all_users()
-        # Não incluí a funcionalidade de deletar usuário para simplificar,
-        # mas você a adicionaria aqui, com um st.button e st.rerun().
-        for u in users:
-            st.write(f"- {u.get('username')} ({u.get('role')})")
\ No newline at end of file
+                linhas = []
+                for c in changes:
+                    if c['op'] == 'UPDATE':
+                        detalhes = "; ".join(f"{col}: {c['old_values'].get(col)} → {c['new_values'].get(col)}" for col in c['changed_columns'])
+                    else:
+                        detalhes = (c['new_values'] or c['old_values']).get('nome', '')
+                    linhas.append({
+                        'Seq': c['seq'], 'Data/Hora': c['ts'], 'Usuário': c['usuario'] or '-',
+                        'Operação': c['op'], 'Produto': c['produto_id'], 'Alterações': detalhes,
+                    })
+                st.dataframe(linhas, use_container_width=True, hide_index=True)
+
+    elif option == "Categorias (Admins)":
+        if not principal.can("gerenciar_categorias"):
+            st.error('Apenas administradores podem gerenciar categorias. Faça login como admin.')
+        else:
+            rotulos = {"Marcas": "marca", "Estilos": "estilo", "Tipos": "tipo"}
+            rotulo = st.radio("Categoria", list(rotulos), horizontal=True)
+            campo = rotulos[rotulo]
+
+            with st.form(f"add_categoria_{campo}", clear_on_submit=True):
+                novo = st.text_input(f"Novo(a) {rotulo[:-1].lower()}")
+                if st.form_submit_button("Adicionar"):
+                    if not novo.strip():
+                        st.error("Informe um nome.")
+                    elif add_categoria(campo, novo):
+                        st.success(f"'{novo.strip()}' adicionado(a) em {rotulo}.")
+                    else:
+                        st.error(f"'{novo.strip()}' já existe em {rotulo}.")
+
+            st.subheader(f'{rotulo} cadastrados(as)')
+            st.caption('Renomear altera todos os produtos de uma vez; só é possível remover itens sem produtos.')
+            for c in get_categorias(campo):
+                cols = st.columns([3, 1, 1])
+                with cols[0]:
+                    nome = st.text_input("Nome", value=c['nome'], key=f"cat_{campo}_{c['id']}", label_visibility="collapsed")
+                    if nome.strip() and nome.strip() != c['nome']:
+                        if rename_categoria(campo, c['id'], nome):
+                            st.success(f"'{c['nome']}' renomeado(a) para '{nome.strip()}'.")
+                            st.rerun()
+                        else:
+                            st.error(f"'{nome.strip()}' já existe em {rotulo}.")
+                with cols[1]:
+                    st.caption(f"{c['produtos']} produto(s)")
+                with cols[2]:
+                    if c['produtos']:
+                        st.caption('Em uso')
+                    elif st.button('Remover', key=f"del_cat_{campo}_{c['id']}"):
+                        if delete_categoria(campo, c['id']):
+                            st.warning(f"'{c['nome']}' removido(a).")
+                        else:
+                            st.error(f"'{c['nome']}' passou a ser usado(a) por produtos.")
+                        st.rerun()
\ No newline at end of file
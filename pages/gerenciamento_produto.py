@@ -1,12 +1,24 @@
 import streamlit as st
+import hashlib
 import os
+import tempfile
+import time
+import pandas as pd
+from contextlib import nullcontext
 from datetime import datetime, date
 from utils.database import (
-    add_produto, get_all_produtos, update_produto, delete_produto, get_produto_by_id,
+    add_produto, get_all_produtos, patch_produto, patch_many, delete_produto, get_produto_by_id,
+    get_produto_by_codigo, normalizar_codigo, diff_produtos, bulk_update_produtos, foto_em_uso,
+    arquivar_produto, restaurar_produto, get_produtos_arquivados, arquivar_sem_movimento, ARQUIVAR_APOS_MESES,
     export_produtos_to_csv, import_produtos_from_csv, generate_stock_pdf,
-    mark_produto_as_sold,
-    MARCAS, ESTILOS, TIPOS, ASSETS_DIR
+    mark_produto_as_sold, get_estoque_por_local, transfer_estoque, get_totais_estoque,
+    get_nomes_categoria, ASSETS_DIR
 )
+from utils.instrumentation import page_timer
+from utils.images import foto_html, salvar_foto
+from utils.validacao import validar_produto
+from utils.permissions import get_principal
+from utils.relatorios import AGRUPAMENTOS as AGRUPAMENTOS_RELATORIO, TIPOS as TIPOS_RELATORIO, gerar_relatorios
 
 # --- Configurações Iniciais e CSS ---
 def load_css(file_name):
@@ -37,17 +49,19 @@ def add_product_form_com_colunas():
     if not os.path.exists(ASSETS_DIR):
         os.makedirs(ASSETS_DIR)
     
+    marcas, estilos, tipos = (get_nomes_categoria(c) for c in ("marca", "estilo", "tipo"))
     with st.form("add_product_form", clear_on_submit=True):
         nome = st.text_input("Nome do Produto", max_chars=150)
+        codigo_barras = st.text_input("Código de Barras / SKU (opcional)", max_chars=64, key="add_input_codigo")
         
         col1, col2 = st.columns([3, 1]) 
 
         with col1:
             st.markdown("##### Detalhes Principais")
             # Adicionei a opção 'Selecionar' para forçar a escolha
-            marca = st.selectbox("📝 Marca do Produto", options=['Selecionar'] + MARCAS, key="add_input_marca")
-            tipo = st.selectbox("🏷️ Tipo de Produto", options=['Selecionar'] + TIPOS, key="add_input_tipo")
-            estilo = st.selectbox("Estilo", ['Selecionar'] + ESTILOS, key="add_input_estilo")
+            marca = st.selectbox("📝 Marca do Produto", options=['Selecionar'] + marcas, key="add_input_marca")
+            tipo = st.selectbox("🏷️ Tipo de Produto", options=['Selecionar'] + tipos, key="add_input_tipo")
+            estilo = st.selectbox("Estilo", ['Selecionar'] + estilos, key="add_input_estilo")
             
             # VALIDAÇÃO: min_value 0.01 para garantir preço positivo
             preco = st.number_input("Preço (R$)", min_value=0.01, format="%.2f", step=1.0)
@@ -65,18 +79,21 @@ def add_product_form_com_colunas():
         submitted = st.form_submit_button("Adicionar Produto")
 
         if submitted:
-            # TRATAMENTO DE ERRO: Validação de campos obrigatórios
-            if not nome or preco <= 0 or quantidade < 0 or marca == 'Selecionar' or tipo == 'Selecionar':
-                st.error("Nome, Preço (positivo), Quantidade (não negativa), Marca e Tipo são obrigatórios.")
+            # Validação de campos obrigatórios (mesmas regras do banco), antes de gravar a foto
+            if marca == 'Selecionar' or tipo == 'Selecionar':
+                st.error("Marca e Tipo são obrigatórios.")
+                return
+            try:
+                validar_produto({"nome": nome, "preco": preco, "quantidade": quantidade})
+            except ValueError as e:
+                st.error(str(e))
                 return
             
             photo_name = None
             if foto:
-                # TRATAMENTO DE ERRO: Salvando a foto
+                # TRATAMENTO DE ERRO: Salvando a foto (a redução de tamanho continua em segundo plano)
                 try:
-                    photo_name = f"{int(datetime.now().timestamp())}_{foto.name}"
-                    with open(os.path.join(ASSETS_DIR, photo_name), "wb") as f:
-                        f.write(foto.getbuffer())
+                    photo_name, _ = salvar_foto(foto)
                 except Exception as e:
                     st.error(f"Erro ao salvar a foto: {e}. Tente novamente.")
                     return
@@ -85,7 +102,7 @@ def add_product_form_com_colunas():
                 # Chamada do DB
                 add_produto(
                     nome, preco, quantidade, marca, estilo, tipo, 
-                    photo_name, data_validade.isoformat()
+                    photo_name, data_validade.isoformat(), codigo_barras=codigo_barras
                 )
                 st.success(f"Produto '{nome}' adicionado com sucesso!")
                 st.rerun()
@@ -110,20 +127,14 @@ def show_edit_form():
 
     st.subheader(f"Editar Produto: {produto.get('nome')}")
 
-    # TRATAMENTO DE ERRO: Conversão de data para o date_input
-    default_date = None
-    if produto.get("data_validade"):
-        try:
-            default_date = datetime.fromisoformat(produto.get("data_validade")).date()
-        except (ValueError, TypeError):
-            default_date = date.today() # Usa a data atual se a data armazenada for inválida
-            
-    # Garantir valores numéricos para o number_input
-    default_preco = float(produto.get("preco", 0.01))
-    default_quantidade = int(produto.get("quantidade", 0))
+    # Valores já validados no banco; só o preço zero antigo (listado por verificar_integridade) precisa de ajuste
+    default_date = date.fromisoformat(produto["data_validade"]) if produto.get("data_validade") else None
+    default_preco = max(produto["preco"], 0.01)
+    default_quantidade = produto["quantidade"]
 
-    with st.form("edit_product_form", clear_on_submit=False):
+    with st.form(key=f"edit_product_form_{produto_id}", clear_on_submit=False):
         nome = st.text_input("Nome", value=produto.get("nome"))
+        codigo_barras = st.text_input("Código de Barras / SKU", value=produto.get("codigo_barras") or "", max_chars=64)
         
         col1, col2 = st.columns(2)
         with col1:
@@ -132,13 +143,14 @@ def show_edit_form():
             quantidade = st.number_input("Quantidade", value=default_quantidade, step=1, min_value=0)
             
         # Determina o índice de seleção atual (TRATAMENTO DE ERRO: Lida com valores inexistentes)
-        marca_index = MARCAS.index(produto.get("marca")) if produto.get("marca") in MARCAS else 0
-        estilo_index = ESTILOS.index(produto.get("estilo")) if produto.get("estilo") in ESTILOS else 0
-        tipo_index = TIPOS.index(produto.get("tipo")) if produto.get("tipo") in TIPOS else 0
-
-        marca = st.selectbox("Marca", MARCAS, index=marca_index)
-        estilo = st.selectbox("Estilo", ESTILOS, index=estilo_index)
-        tipo = st.selectbox("Tipo", TIPOS, index=tipo_index)
+        marcas, estilos, tipos = (get_nomes_categoria(c) for c in ("marca", "estilo", "tipo"))
+        marca_index = marcas.index(produto.get("marca")) if produto.get("marca") in marcas else 0
+        estilo_index = estilos.index(produto.get("estilo")) if produto.get("estilo") in estilos else 0
+        tipo_index = tipos.index(produto.get("tipo")) if produto.get("tipo") in tipos else 0
+
+        marca = st.selectbox("Marca", marcas, index=marca_index)
+        estilo = st.selectbox("Estilo", estilos, index=estilo_index)
+        tipo = st.selectbox("Tipo", tipos, index=tipo_index)
         
         data_validade = st.date_input("Data de Validade", value=default_date or date.today())
         uploaded = st.file_uploader("Alterar Foto", type=["jpg","png","jpeg"])
@@ -150,14 +162,16 @@ def show_edit_form():
             cancel = st.form_submit_button("Cancelar Edição")
 
         if save:
-            if not nome or preco <= 0 or quantidade < 0:
-                st.error("Nome, Preço (positivo) e Quantidade (não negativa) são obrigatórios.")
+            try:
+                validar_produto({"nome": nome, "preco": preco, "quantidade": quantidade})
+            except ValueError as e:
+                st.error(str(e))
                 return
 
             photo_name = produto.get("foto")
             if uploaded:
-                # Remove foto antiga se existir
-                if photo_name and os.path.exists(os.path.join(ASSETS_DIR, photo_name)):
+                # Remove foto antiga se existir (e se nenhum outro produto usar o mesmo arquivo)
+                if photo_name and os.path.exists(os.path.join(ASSETS_DIR, photo_name)) and not foto_em_uso(photo_name, exceto_id=produto_id):
                     try: 
                         os.remove(os.path.join(ASSETS_DIR, photo_name))
                     except Exception: 
@@ -165,17 +179,23 @@ def show_edit_form():
                 
                 # Salva nova foto (TRATAMENTO DE ERRO: Salvando a foto)
                 try:
-                    photo_name = f"{int(datetime.now().timestamp())}_{uploaded.name}"
-                    with open(os.path.join(ASSETS_DIR, photo_name), "wb") as f:
-                        f.write(uploaded.getbuffer())
+                    photo_name, _ = salvar_foto(uploaded)
                 except Exception as e:
                     st.error(f"Erro ao salvar a nova foto: {e}")
                     return
             
             validade_iso = data_validade.isoformat() if data_validade else None
 
+            novos = {
+                "nome": nome, "preco": preco, "quantidade": quantidade, "marca": marca,
+                "estilo": estilo, "tipo": tipo, "foto": photo_name, "data_validade": validade_iso,
+                "codigo_barras": normalizar_codigo(codigo_barras),
+            }
+            # Envia só o que mudou: não sobrescreve vendas feitas enquanto o formulário estava aberto
+            alterados = {campo: valor for campo, valor in novos.items() if valor != produto.get(campo)}
+
             try:
-                update_produto(produto_id, nome, preco, quantidade, marca, estilo, tipo, photo_name, validade_iso)
+                patch_produto(produto_id, **alterados)
                 st.success(f"Produto '{nome}' atualizado com sucesso!")
                 st.session_state["edit_mode"] = False
                 st.session_state["edit_product_id"] = None
@@ -188,7 +208,73 @@ def show_edit_form():
             st.session_state["edit_product_id"] = None
             st.rerun()
 
-def manage_products_list():
+def show_transfer_form(produto_id):
+    """Mostra o estoque do produto por local e permite transferir unidades entre locais."""
+    estoque = get_estoque_por_local(produto_id)
+    if not estoque:
+        return
+
+    st.markdown("##### Estoque por Local")
+    st.caption("Alterações de quantidade no formulário acima são aplicadas ao local padrão (Loja).")
+    cols = st.columns(len(estoque))
+    for col, e in zip(cols, estoque):
+        col.metric(e["nome"], e["quantidade"])
+
+    nomes = [e["nome"] for e in estoque]
+    ids = {e["nome"]: e["local_id"] for e in estoque}
+    with st.form(key=f"transfer_form_{produto_id}"):
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            origem = st.selectbox("De", nomes, key=f"transfer_origem_{produto_id}")
+        with col2:
+            destino = st.selectbox("Para", nomes, index=min(1, len(nomes) - 1), key=f"transfer_destino_{produto_id}")
+        with col3:
+            quantidade = st.number_input("Quantidade", min_value=1, step=1, value=1, key=f"transfer_qtd_{produto_id}")
+        if st.form_submit_button("Transferir"):
+            if origem == destino:
+                st.error("Escolha locais diferentes.")
+            elif transfer_estoque(produto_id, ids[origem], ids[destino], int(quantidade)):
+                st.success(f"{int(quantidade)} unidade(s) transferida(s) de {origem} para {destino}.")
+                st.rerun()
+            else:
+                st.error(f"Estoque insuficiente em {origem}.")
+
+def show_scan_sale():
+    """Venda rápida pelo leitor de código de barras: o leitor digita o código e envia o Enter."""
+    with st.form("scan_sale_form", clear_on_submit=True):
+        col1, col2 = st.columns([4, 1])
+        with col1:
+            codigo = st.text_input("Código de Barras", placeholder="Passe o leitor ou digite o código e tecle Enter",
+                                   label_visibility="collapsed")
+        with col2:
+            vender = st.form_submit_button("Vender 1")
+
+    if vender and normalizar_codigo(codigo):
+        # Busca só o produto do código (índice único), sem carregar a lista
+        produto = get_produto_by_codigo(codigo)
+        if produto is None:
+            st.error(f"Nenhum produto com o código '{codigo.strip()}'.")
+        elif produto["quantidade"] <= 0:
+            st.error(f"'{produto['nome']}' está fora de estoque.")
+        else:
+            try:
+                if mark_produto_as_sold(produto["id"], 1):
+                    st.success(f"1 unidade de '{produto['nome']}' vendida. Estoque restante: {produto['quantidade'] - 1}.")
+                else:
+                    st.error(f"'{produto['nome']}' está sem estoque no local padrão.")
+            except Exception as e:
+                st.error(f"Erro ao marcar venda: {e}")
+
+def manage_products_list(principal):
+    # Permissões resolvidas uma vez (e não a cada produto do loop)
+    pode_vender = principal.can("vender")
+    pode_editar = principal.can("editar_produto")
+    pode_remover = principal.can("remover_produto")
+
+    # Antes de carregar a lista: ela já aparece com o estoque atualizado pela venda
+    if pode_vender:
+        show_scan_sale()
+
     st.subheader("Lista de Produtos")
     produtos = get_all_produtos()
     
@@ -197,463 +283,439 @@ def manage_products_list():
     
     with col_a:
         # TRATAMENTO DE ERRO: Exportação CSV
+        csv_path = os.path.join('data','produtos_export.csv')
         if st.button('Exportar CSV', key='btn_export_csv'):
-            csv_path = os.path.join('data','produtos_export.csv')
             if not os.path.exists('data'): os.makedirs('data')
             try:
                 export_produtos_to_csv(csv_path)
-                st.success('Exportação CSV concluída (Simulação).')
-                # A função download_button do Streamlit precisa de dados reais (não simulação)
-                # Para uma simulação, é necessário gerar o conteúdo real do CSV no ambiente real
+                st.success('Exportação CSV concluída.')
             except Exception as e:
                 st.error('Erro ao exportar CSV: ' + str(e))
+        if os.path.exists(csv_path):
+            with open(csv_path, 'rb') as f:
+                st.download_button('Baixar produtos.csv', f, file_name='produtos.csv', mime='text/csv', key='dl_csv')
                 
     with col_b:
         # TRATAMENTO DE ERRO: Importação CSV
         uploaded_csv = st.file_uploader('Importar CSV', type=['csv'], key='import_csv')
         if uploaded_csv is not None and st.button('Processar Importação', key='btn_import'):
-            # Simulação: Em um DB real, aqui você processaria o uploaded_csv.getbuffer()
+            # import_produtos_from_csv lê de um caminho: o arquivo enviado vai para um temporário
+            tmp = tempfile.NamedTemporaryFile(suffix='.csv', delete=False)
             try:
-                # O Simulado fará uma adição fictícia, mas em um DB real processaria o arquivo
-                import_produtos_from_csv('simulacao_path') 
-                st.success('Produtos importados com sucesso (Simulação).')
+                with tmp:
+                    tmp.write(uploaded_csv.getbuffer())
+                importados = import_produtos_from_csv(tmp.name)
+                st.session_state['import_msg'] = f'{importados} produto(s) importado(s) de {uploaded_csv.name}.'
                 st.rerun()
             except Exception as e:
                 st.error('Erro ao importar CSV: ' + str(e))
+            finally:
+                os.remove(tmp.name)
+        if 'import_msg' in st.session_state:
+            st.success(st.session_state.pop('import_msg'))
                 
     with col_c:
         # TRATAMENTO DE ERRO: Geração de PDF
+        pdf_path = os.path.join('data','relatorio_estoque.pdf')
         if st.button('Gerar Relatório PDF', key='btn_pdf'):
-            pdf_path = os.path.join('data','relatorio_estoque.pdf')
             if not os.path.exists('data'): os.makedirs('data')
             try:
                 generate_stock_pdf(pdf_path)
-                st.success('PDF gerado (Simulação).')
+                st.success('PDF gerado.')
             except Exception as e:
                 st.error('Erro ao gerar PDF: ' + str(e))
+        if os.path.exists(pdf_path):
+            with open(pdf_path, 'rb') as f:
+                st.download_button('Baixar relatório PDF', f, file_name='relatorio_estoque.pdf', mime='application/pdf', key='dl_pdf')
     
     st.markdown("---")
 
+    # Resumo do estoque; os cards o atualizam após uma venda ou arquivamento
+    resumo = st.empty()
+    show_stock_summary(resumo)
+
     if not produtos:
         st.info("Nenhum produto cadastrado.")
         return
-        
+
+    # Produtos alterados pelos botões dos cards desde o último rerun completo
+    st.session_state['cards_atualizados'] = {}
     for p in produtos:
-        produto_id = p.get("id")
+        product_card(p, resumo, pode_vender, pode_editar, pode_remover)
+
+
+def show_stock_summary(resumo):
+    """Produtos, unidades e valor em estoque (calculados no SQL), desenhados no placeholder `resumo`."""
+    totais = get_totais_estoque()
+    with resumo.container():
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Produtos", totais["produtos"])
+        col2.metric("Unidades em Estoque", totais["unidades"])
+        col3.metric("Valor em Estoque", f"R$ {totais['valor']:,.2f}")
+
+
+def _atualizar_card(produto_id, tipo, mensagem):
+    """Guarda o produto relido (None se arquivado) e a mensagem para o próximo rerun do card."""
+    st.session_state['cards_atualizados'][produto_id] = (get_produto_by_id(produto_id), tipo, mensagem)
+
+
+def _vender_do_card(produto_id, nome):
+    # on_click: roda antes do rerun do fragmento, então o card já é desenhado com o estoque novo
+    try:
+        if mark_produto_as_sold(produto_id, 1):
+            _atualizar_card(produto_id, "success", f"1 unidade de '{nome}' foi vendida.")
+        else:
+            _atualizar_card(produto_id, "error", f"'{nome}' está sem estoque no local padrão.")
+    except Exception as e:
+        _atualizar_card(produto_id, "error", f"Erro ao marcar venda: {e}")
+
+
+def _arquivar_do_card(produto_id, nome):
+    try:
+        arquivar_produto(produto_id)
+        _atualizar_card(produto_id, "warning", f"Produto '{nome}' arquivado.")
+    except ValueError as e:
+        _atualizar_card(produto_id, "error", str(e))
+    except Exception as e:
+        _atualizar_card(produto_id, "error", f"Erro ao arquivar produto: {e}")
+
+
+@st.fragment
+def product_card(p, resumo, pode_vender, pode_editar, pode_remover):
+    """Card de um produto. Vender e Arquivar reexecutam só este fragmento (e o resumo), não a página.
+
+    Num rerun do fragmento os argumentos são os do último rerun completo; o produto atual
+    vem de st.session_state['cards_atualizados'], preenchido pelos callbacks dos botões.
+    """
+    produto_id = p.get("id")
+    atualizado = st.session_state.get('cards_atualizados', {}).get(produto_id)
+    # Só o rerun parcial entra na métrica do card; no rerun completo o tempo já conta na página
+    with page_timer("Gerenciar Produtos (card)") if atualizado else nullcontext():
+        mensagem = None
+        if atualizado:
+            p, tipo, mensagem = atualizado
+            show_stock_summary(resumo)
+        if p is None:
+            # Arquivado: o card some no próximo rerun completo
+            st.warning(mensagem)
+            return
+
         with st.container(border=True):
             cols = st.columns([3,1,1])
             with cols[0]:
                 st.markdown(f"### {p.get('nome')} <small style='color:gray'>ID: {produto_id}</small>", unsafe_allow_html=True)
                 
-                # TRATAMENTO DE ERRO: Exibição segura de preço/quantidade
-                try:
-                    preco_exibicao = f"R$ {float(p.get('preco')):,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.')
-                except (ValueError, TypeError):
-                    preco_exibicao = "R$ N/A"
+                # Preço, quantidade e validade já são válidos no banco (utils/validacao.py e triggers)
+                preco_exibicao = f"R$ {p['preco']:,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.')
 
-                st.write(f"**Preço:** {preco_exibicao} • **Quantidade:** {p.get('quantidade', 0)}")
+                st.write(f"**Preço:** {preco_exibicao} • **Quantidade:** {p['quantidade']}")
                 st.write(f"**Marca:** {p.get('marca')} • **Estilo:** {p.get('estilo')} • **Tipo:** {p.get('tipo')}")
+                if p.get('codigo_barras'):
+                    st.caption(f"Código: {p.get('codigo_barras')}")
                 
-                # TRATAMENTO DE ERRO: Exibição de Data de Validade
                 data_validade_str = p.get('data_validade')
-                if data_validade_str:
-                    try:
-                        validade_formatada = datetime.fromisoformat(data_validade_str).strftime('%d/%m/%Y')
-                    except (ValueError, TypeError):
-                        validade_formatada = 'Data Inválida'
-                else:
-                    validade_formatada = 'Sem Validade'
-                        
+                validade_formatada = date.fromisoformat(data_validade_str).strftime('%d/%m/%Y') if data_validade_str else 'Sem Validade'
                 st.write(f"**Validade:** {validade_formatada}")
+
+                if mensagem:
+                    getattr(st, tipo)(mensagem)
                 
                 # Botão de venda
-                quantidade_atual = int(p.get("quantidade", 0))
-                if quantidade_atual > 0:
-                    if st.button("Vender 1 Unidade", key=f'sell_{produto_id}'):
-                        try:
-                            mark_produto_as_sold(produto_id, 1)
-                            st.success(f"1 unidade de '{p.get('nome')}' foi vendida.")
-                            st.rerun()
-                        except Exception as e:
-                            st.error(f"Erro ao marcar venda: {e}")
+                if p["quantidade"] > 0:
+                    if pode_vender:
+                        st.button("Vender 1 Unidade", key=f'sell_{produto_id}',
+                                  on_click=_vender_do_card, args=(produto_id, p.get('nome')))
                 else:
                     st.info("Fora de estoque.")
 
             with cols[1]:
                 # TRATAMENTO DE ERRO: Exibição da foto
+                # Com ESTOQUE_FOTOS_URL, <img> lazy servido pela API (cache do navegador entre reruns)
                 photo_path = os.path.join(ASSETS_DIR, p.get('foto')) if p.get('foto') else None
-                if photo_path and os.path.exists(photo_path):
+                img_html = foto_html(p.get('foto'), 120)
+                if img_html:
+                    st.markdown(img_html, unsafe_allow_html=True)
+                elif photo_path and os.path.exists(photo_path):
                     st.image(photo_path, width=120)
                 else:
                     st.info('Sem foto')
                     
             with cols[2]:
-                role = st.session_state.get('role','staff')
-                if st.button('Editar', key=f'mod_{produto_id}'):
+                if pode_editar and st.button('Editar', key=f'mod_{produto_id}'):
                     st.session_state['edit_product_id'] = produto_id
                     st.session_state['edit_mode'] = True
-                    st.rerun() # Entra no modo de edição
-
-                # Botão de remover (apenas para Admin)
-                if role == 'admin':
-                    if st.button('Remover', key=f'rem_{produto_id}'):
-                        try:
-                            delete_produto(produto_id) # A função já tenta remover a foto no simulado
-                            st.warning(f"Produto '{p.get('nome')}' removido.")
-                            st.rerun()
-                        except Exception as e:
-                            st.error(f"Erro ao remover produto: {e}")
+                    st.rerun() # Entra no modo de edição (rerun da página inteira)
+
+                # Botão de arquivar (apenas para Admin); a exclusão definitiva fica em "Produtos Arquivados"
+                if pode_remover:
+                    st.button('Arquivar', key=f'rem_{produto_id}',
+                              on_click=_arquivar_do_card, args=(produto_id, p.get('nome')))
                 else:
-                    st.caption('Remover (admin)')
+                    st.caption('Arquivar (admin)')
                     
             st.markdown("---")
 
+def show_archived_products():
+    """Produtos arquivados: restaurar, excluir definitivamente e arquivar os esgotados sem movimento."""
+    st.subheader("Produtos Arquivados")
 
-# --- FLUXO PRINCIPAL DA PÁGINA ---
-
-if not st.session_state.get("logged_in"):
-    st.error("Acesso negado. Faça login na área administrativa para gerenciar produtos.")
-    st.info("Vá para a página 'Área Administrativa' para entrar ou criar um admin.")
-else:
-    st.sidebar.markdown(f"**Olá, {st.session_state.get('username')} ({st.session_state.get('role','staff')})**")
-    
-    # Se estiver no modo de edição, forçamos a exibição do formulário
-    if st.session_state.get('edit_mode'):
-        show_edit_form()
-    else:
-        # Caso contrário, mostra o fluxo normal
-        action = st.sidebar.selectbox("Ação", ["Visualizar / Modificar / Remover Produtos", "Adicionar Produto"],key='main_action_selector')
-        
-        if action == "Adicionar Produto":
-            add_product_form_com_colunas()
-        else:
-            manage_products_list()
-import os
-from datetime import datetime, date
-from utils.database import (
-    add_produto, get_all_produtos, update_produto, delete_produto, get_produto_by_id,
-    export_produtos_to_csv, import_produtos_from_csv, generate_stock_pdf,
-    mark_produto_as_sold,
-    MARCAS, ESTILOS, TIPOS, ASSETS_DIR
-)
-
-# --- Configurações Iniciais e CSS ---
-def load_css(file_name):
-    if not os.path.exists(file_name):
-        return
-    try:
-        with open(file_name, encoding='utf-8') as f: 
-            st.markdown(f'<style>{f.read()}</style>', unsafe_allow_html=True)
-    except Exception:
-        pass
-
-load_css("style.css")
-
-st.set_page_config(page_title="Gerenciar Produtos - Cores e Fragrâncias")
-
-# Inicialização de estado
-if 'logged_in' not in st.session_state: st.session_state['logged_in'] = False
-if 'edit_mode' not in st.session_state: st.session_state['edit_mode'] = False
-if 'edit_product_id' not in st.session_state: st.session_state['edit_product_id'] = None
-
-# -------------------------------------------------------------------
-# FUNÇÃO DE CADASTRO DE PRODUTO
-# -------------------------------------------------------------------
-def add_product_form_com_colunas():
-    st.subheader("Adicionar Novo Produto")
-    
-    # Garante que o diretório de assets exista
-    if not os.path.exists(ASSETS_DIR):
-        os.makedirs(ASSETS_DIR)
-    
-    with st.form("add_product_form", clear_on_submit=True):
-        nome = st.text_input("Nome do Produto", max_chars=150)
-        
-        col1, col2 = st.columns([3, 1]) 
-
-        with col1:
-            st.markdown("##### Detalhes Principais")
-            # Adicionei a opção 'Selecionar' para forçar a escolha
-            marca = st.selectbox("📝 Marca do Produto", options=['Selecionar'] + MARCAS, key="add_input_marca")
-            tipo = st.selectbox("🏷️ Tipo de Produto", options=['Selecionar'] + TIPOS, key="add_input_tipo")
-            estilo = st.selectbox("Estilo", ['Selecionar'] + ESTILOS, key="add_input_estilo")
-            
-            # VALIDAÇÃO: min_value 0.01 para garantir preço positivo
-            preco = st.number_input("Preço (R$)", min_value=0.01, format="%.2f", step=1.0)
-            quantidade = st.number_input("Quantidade", min_value=0, step=1, value=1)
-            
-        with col2:
-            st.markdown("##### Foto e Validade")
-            foto = st.file_uploader("🖼️ Foto do Produto", type=['png', 'jpg', 'jpeg'], key="add_input_foto")
-            data_validade = st.date_input(
-                "🗓️ Data de Validade", 
-                value=date.today(), 
-                key="add_input_validade"
-            )
-
-        submitted = st.form_submit_button("Adicionar Produto")
-
-        if submitted:
-            # TRATAMENTO DE ERRO: Validação de campos obrigatórios
-            if not nome or preco <= 0 or quantidade < 0 or marca == 'Selecionar' or tipo == 'Selecionar':
-                st.error("Nome, Preço (positivo), Quantidade (não negativa), Marca e Tipo são obrigatórios.")
-                return
-            
-            photo_name = None
-            if foto:
-                # TRATAMENTO DE ERRO: Salvando a foto
-                try:
-                    photo_name = f"{int(datetime.now().timestamp())}_{foto.name}"
-                    with open(os.path.join(ASSETS_DIR, photo_name), "wb") as f:
-                        f.write(foto.getbuffer())
-                except Exception as e:
-                    st.error(f"Erro ao salvar a foto: {e}. Tente novamente.")
-                    return
-            
-            try:
-                # Chamada do DB
-                add_produto(
-                    nome, preco, quantidade, marca, estilo, tipo, 
-                    photo_name, data_validade.isoformat()
-                )
-                st.success(f"Produto '{nome}' adicionado com sucesso!")
-                st.rerun()
-            except Exception as e:
-                st.error(f"Erro ao adicionar produto no banco de dados: {e}")
-
-
-# -------------------------------------------------------------------
-# FUNÇÕES DE EDIÇÃO E LISTAGEM
-# -------------------------------------------------------------------
-
-def show_edit_form():
-    """Exibe o formulário de edição para o produto selecionado."""
-    produto_id = st.session_state.get('edit_product_id')
-    produto = get_produto_by_id(produto_id)
-    
-    if not produto:
-        st.error("Produto não encontrado ou ID inválido.")
-        st.session_state["edit_mode"] = False
-        st.session_state["edit_product_id"] = None
-        return
-
-    st.subheader(f"Editar Produto: {produto.get('nome')}")
-
-    # TRATAMENTO DE ERRO: Conversão de data para o date_input
-    default_date = None
-    if produto.get("data_validade"):
-        try:
-            default_date = datetime.fromisoformat(produto.get("data_validade")).date()
-        except (ValueError, TypeError):
-            default_date = date.today() # Usa a data atual se a data armazenada for inválida
-            
-    # Garantir valores numéricos para o number_input
-    default_preco = float(produto.get("preco", 0.01))
-    default_quantidade = int(produto.get("quantidade", 0))
-
-    with st.form(key=f"edit_product_form_{produto_id}", clear_on_submit=False):
-        nome = st.text_input("Nome", value=produto.get("nome"))
-        
+    with st.form("archive_idle_form"):
+        meses = st.number_input("Arquivar produtos esgotados sem venda nem alteração há (meses)",
+                                min_value=1, value=ARQUIVAR_APOS_MESES, step=1)
         col1, col2 = st.columns(2)
         with col1:
-            preco = st.number_input("Preço (R$)", value=default_preco, format="%.2f", min_value=0.01)
+            simular = st.form_submit_button("Ver candidatos")
         with col2:
-            quantidade = st.number_input("Quantidade", value=default_quantidade, step=1, min_value=0)
-            
-        # Determina o índice de seleção atual (TRATAMENTO DE ERRO: Lida com valores inexistentes)
-        marca_index = MARCAS.index(produto.get("marca")) if produto.get("marca") in MARCAS else 0
-        estilo_index = ESTILOS.index(produto.get("estilo")) if produto.get("estilo") in ESTILOS else 0
-        tipo_index = TIPOS.index(produto.get("tipo")) if produto.get("tipo") in TIPOS else 0
-
-        marca = st.selectbox("Marca", MARCAS, index=marca_index)
-        estilo = st.selectbox("Estilo", ESTILOS, index=estilo_index)
-        tipo = st.selectbox("Tipo", TIPOS, index=tipo_index)
-        
-        data_validade = st.date_input("Data de Validade", value=default_date or date.today())
-        uploaded = st.file_uploader("Alterar Foto", type=["jpg","png","jpeg"])
-        
-        col_btn1, col_btn2 = st.columns(2)
-        with col_btn1:
-            save = st.form_submit_button("Salvar Alterações")
-        with col_btn2:
-            cancel = st.form_submit_button("Cancelar Edição")
-
-        if save:
-            if not nome or preco <= 0 or quantidade < 0:
-                st.error("Nome, Preço (positivo) e Quantidade (não negativa) são obrigatórios.")
-                return
-
-            photo_name = produto.get("foto")
-            if uploaded:
-                # Remove foto antiga se existir
-                if photo_name and os.path.exists(os.path.join(ASSETS_DIR, photo_name)):
-                    try: 
-                        os.remove(os.path.join(ASSETS_DIR, photo_name))
-                    except Exception: 
-                        st.warning("Não foi possível remover a foto antiga, mas a nova será salva.")
-                
-                # Salva nova foto (TRATAMENTO DE ERRO: Salvando a foto)
-                try:
-                    photo_name = f"{int(datetime.now().timestamp())}_{uploaded.name}"
-                    with open(os.path.join(ASSETS_DIR, photo_name), "wb") as f:
-                        f.write(uploaded.getbuffer())
-                except Exception as e:
-                    st.error(f"Erro ao salvar a nova foto: {e}")
-                    return
-            
-            validade_iso = data_validade.isoformat() if data_validade else None
-
-            try:
-                update_produto(produto_id, nome, preco, quantidade, marca, estilo, tipo, photo_name, validade_iso)
-                st.success(f"Produto '{nome}' atualizado com sucesso!")
-                st.session_state["edit_mode"] = False
-                st.session_state["edit_product_id"] = None
-                st.rerun()
-            except Exception as e:
-                st.error(f"Erro ao atualizar produto no banco de dados: {e}")
-                
-        if cancel:
-            st.session_state["edit_mode"] = False
-            st.session_state["edit_product_id"] = None
-            st.rerun()
+            arquivar = st.form_submit_button("Arquivar agora")
+    if simular or arquivar:
+        candidatos = arquivar_sem_movimento(int(meses), simular=simular)
+        if not candidatos:
+            st.info(f"Nenhum produto esgotado sem movimento há {int(meses)} mes(es).")
+        elif simular:
+            st.caption(f"{len(candidatos)} produto(s) seriam arquivados:")
+            st.dataframe(candidatos, use_container_width=True, hide_index=True)
+        else:
+            st.success(f"{len(candidatos)} produto(s) arquivado(s).")
 
-def manage_products_list():
-    st.subheader("Lista de Produtos")
-    produtos = get_all_produtos()
-    
-    # --- Ações de Arquivo (Import/Export/PDF) ---
-    col_a, col_b, col_c = st.columns(3)
-    
-    with col_a:
-        # TRATAMENTO DE ERRO: Exportação CSV
-        if st.button('Exportar CSV', key='btn_export_csv'):
-            csv_path = os.path.join('data','produtos_export.csv')
-            if not os.path.exists('data'): os.makedirs('data')
-            try:
-                export_produtos_to_csv(csv_path)
-                st.success('Exportação CSV concluída (Simulação).')
-                # A função download_button do Streamlit precisa de dados reais (não simulação)
-                # Para uma simulação, é necessário gerar o conteúdo real do CSV no ambiente real
-            except Exception as e:
-                st.error('Erro ao exportar CSV: ' + str(e))
-                
-    with col_b:
-        # TRATAMENTO DE ERRO: Importação CSV
-        uploaded_csv = st.file_uploader('Importar CSV', type=['csv'], key='import_csv')
-        if uploaded_csv is not None and st.button('Processar Importação', key='btn_import'):
-            # Simulação: Em um DB real, aqui você processaria o uploaded_csv.getbuffer()
-            try:
-                # O Simulado fará uma adição fictícia, mas em um DB real processaria o arquivo
-                import_produtos_from_csv('simulacao_path') 
-                st.success('Produtos importados com sucesso (Simulação).')
-                st.rerun()
-            except Exception as e:
-                st.error('Erro ao importar CSV: ' + str(e))
-                
-    with col_c:
-        # TRATAMENTO DE ERRO: Geração de PDF
-        if st.button('Gerar Relatório PDF', key='btn_pdf'):
-            pdf_path = os.path.join('data','relatorio_estoque.pdf')
-            if not os.path.exists('data'): os.makedirs('data')
-            try:
-                generate_stock_pdf(pdf_path)
-                st.success('PDF gerado (Simulação).')
-            except Exception as e:
-                st.error('Erro ao gerar PDF: ' + str(e))
-    
     st.markdown("---")
-
-    if not produtos:
-        st.info("Nenhum produto cadastrado.")
+    arquivados = get_produtos_arquivados()
+    if not arquivados:
+        st.info("Nenhum produto arquivado.")
         return
-        
-    for p in produtos:
+
+    st.caption(f"{len(arquivados)} produto(s) arquivado(s). Restaurados, voltam à lista com estoque zero, prontos para reposição.")
+    for p in arquivados:
         produto_id = p.get("id")
         with st.container(border=True):
-            cols = st.columns([3,1,1])
+            cols = st.columns([3, 1, 1])
             with cols[0]:
-                st.markdown(f"### {p.get('nome')} <small style='color:gray'>ID: {produto_id}</small>", unsafe_allow_html=True)
-                
-                # TRATAMENTO DE ERRO: Exibição segura de preço/quantidade
+                st.markdown(f"**{p.get('nome')}** <small style='color:gray'>ID: {produto_id}</small>", unsafe_allow_html=True)
                 try:
-                    preco_exibicao = f"R$ {float(p.get('preco')):,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.')
+                    arquivado_em = datetime.fromisoformat(p.get('arquivado_em')).strftime('%d/%m/%Y')
                 except (ValueError, TypeError):
-                    preco_exibicao = "R$ N/A"
-
-                st.write(f"**Preço:** {preco_exibicao} • **Quantidade:** {p.get('quantidade', 0)}")
-                st.write(f"**Marca:** {p.get('marca')} • **Estilo:** {p.get('estilo')} • **Tipo:** {p.get('tipo')}")
-                
-                # TRATAMENTO DE ERRO: Exibição de Data de Validade
-                data_validade_str = p.get('data_validade')
-                if data_validade_str:
-                    try:
-                        validade_formatada = datetime.fromisoformat(data_validade_str).strftime('%d/%m/%Y')
-                    except (ValueError, TypeError):
-                        validade_formatada = 'Data Inválida'
-                else:
-                    validade_formatada = 'Sem Validade'
-                        
-                st.write(f"**Validade:** {validade_formatada}")
-                
-                # Botão de venda
-                quantidade_atual = int(p.get("quantidade", 0))
-                if quantidade_atual > 0:
-                    if st.button("Vender 1 Unidade", key=f'sell_{produto_id}'):
-                        try:
-                            mark_produto_as_sold(produto_id, 1)
-                            st.success(f"1 unidade de '{p.get('nome')}' foi vendida.")
-                            st.rerun()
-                        except Exception as e:
-                            st.error(f"Erro ao marcar venda: {e}")
-                else:
-                    st.info("Fora de estoque.")
-
+                    arquivado_em = '-'
+                st.caption(f"{p.get('marca')} • {p.get('estilo')} • {p.get('tipo')} • Arquivado em {arquivado_em}")
             with cols[1]:
-                # TRATAMENTO DE ERRO: Exibição da foto
-                photo_path = os.path.join(ASSETS_DIR, p.get('foto')) if p.get('foto') else None
-                if photo_path and os.path.exists(photo_path):
-                    st.image(photo_path, width=120)
-                else:
-                    st.info('Sem foto')
-                    
+                if st.button('Restaurar', key=f'restore_{produto_id}'):
+                    restaurar_produto(produto_id)
+                    st.success(f"Produto '{p.get('nome')}' restaurado.")
+                    st.rerun()
             with cols[2]:
-                role = st.session_state.get('role','staff')
-                if st.button('Editar', key=f'mod_{produto_id}'):
-                    st.session_state['edit_product_id'] = produto_id
-                    st.session_state['edit_mode'] = True
-                    st.rerun() # Entra no modo de edição
-
-                # Botão de remover (apenas para Admin)
-                if role == 'admin':
-                    if st.button('Remover', key=f'rem_{produto_id}'):
-                        try:
-                            delete_produto(produto_id) # A função já tenta remover a foto no simulado
-                            st.warning(f"Produto '{p.get('nome')}' removido.")
-                            st.rerun()
-                        except Exception as e:
-                            st.error(f"Erro ao remover produto: {e}")
-                else:
-                    st.caption('Remover (admin)')
-                    
-            st.markdown("---")
+                if st.button('Excluir definitivamente', key=f'purge_{produto_id}'):
+                    try:
+                        delete_produto(produto_id) # Também remove a foto, se nenhum outro produto a usar
+                        st.warning(f"Produto '{p.get('nome')}' excluído.")
+                        st.rerun()
+                    except Exception as e:
+                        st.error(f"Erro ao excluir produto: {e}")
+
+
+def show_price_adjust_form():
+    """Reajuste percentual de preços por marca/estilo/tipo, aplicado com um único UPDATE."""
+    st.subheader("Reajustar Preços em Massa")
+    marcas, estilos, tipos = (get_nomes_categoria(c) for c in ("marca", "estilo", "tipo"))
+    with st.form("price_adjust_form"):
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            marca = st.selectbox("Marca", ['Todas'] + marcas)
+        with col2:
+            estilo = st.selectbox("Estilo", ['Todos'] + estilos)
+        with col3:
+            tipo = st.selectbox("Tipo", ['Todos'] + tipos)
+        percentual = st.number_input("Reajuste (%)", value=5.0, step=0.5, format="%.1f", help="Use valores negativos para reduzir.")
+        aplicar = st.form_submit_button("Aplicar Reajuste")
+
+    filtros = {}
+    if marca != 'Todas': filtros["marca"] = marca
+    if estilo != 'Todos': filtros["estilo"] = estilo
+    if tipo != 'Todos': filtros["tipo"] = tipo
+
+    if aplicar:
+        if not filtros:
+            st.error("Selecione ao menos uma marca, estilo ou tipo.")
+        elif percentual <= -100 or percentual == 0:
+            st.error("Informe um reajuste diferente de zero e maior que -100%.")
+        else:
+            try:
+                alterados = patch_many(filtros, percentual_preco=percentual)
+            except ValueError as e:
+                # Ex.: o reajuste deixaria algum preço zerado ou negativo (nada é alterado)
+                st.error(str(e))
+            else:
+                st.success(f"Preço de {alterados} produto(s) reajustado em {percentual:+.1f}%.")
+    elif filtros:
+        totais = get_totais_estoque(**filtros)
+        st.caption(f"{totais['produtos']} produto(s) serão reajustados.")
+
+
+COLUNAS_EM_MASSA = ["id", "nome", "preco", "quantidade", "marca", "estilo", "tipo", "codigo_barras"]
+
+def show_bulk_edit():
+    """Grade de edição em massa: só as células alteradas são gravadas, numa única transação."""
+    st.subheader("Edição em Massa")
+    if 'bulk_editor_versao' not in st.session_state: st.session_state['bulk_editor_versao'] = 0
+    if st.session_state.get('bulk_msg'):
+        st.success(st.session_state.pop('bulk_msg'))
+
+    marcas, estilos, tipos = (get_nomes_categoria(c) for c in ("marca", "estilo", "tipo"))
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        busca = st.text_input("Nome contém", key="bulk_busca")
+    with col2:
+        marca = st.selectbox("Marca", ['Todas'] + marcas, key="bulk_marca")
+    with col3:
+        estilo = st.selectbox("Estilo", ['Todos'] + estilos, key="bulk_estilo")
+    with col4:
+        tipo = st.selectbox("Tipo", ['Todos'] + tipos, key="bulk_tipo")
+
+    # Os originais ficam fixos enquanto a grade existir: a edição é comparada com o que foi exibido
+    chave = (st.session_state['bulk_editor_versao'], busca, marca, estilo, tipo)
+    if st.session_state.get('bulk_chave') != chave:
+        originais = [
+            {c: p.get(c) for c in COLUNAS_EM_MASSA} for p in get_all_produtos()
+            if (not busca or busca.lower() in (p.get('nome') or '').lower())
+            and marca in ('Todas', p.get('marca'))
+            and estilo in ('Todos', p.get('estilo'))
+            and tipo in ('Todos', p.get('tipo'))
+        ]
+        st.session_state['bulk_chave'] = chave
+        st.session_state['bulk_originais'] = originais
+    originais = st.session_state['bulk_originais']
+
+    if not originais:
+        st.info("Nenhum produto encontrado para os filtros selecionados.")
+        return
+
+    editado = st.data_editor(
+        pd.DataFrame(originais, columns=COLUNAS_EM_MASSA),
+        # Digest estável (hash() de texto muda a cada processo); uma grade nova por filtro/versão
+        key=f"bulk_editor_{hashlib.sha1(repr(chave).encode()).hexdigest()[:16]}",
+        hide_index=True,
+        num_rows="fixed",
+        disabled=["id"],
+        use_container_width=True,
+        column_config={
+            "id": st.column_config.NumberColumn("ID"),
+            "nome": st.column_config.TextColumn("Nome", required=True),
+            "preco": st.column_config.NumberColumn("Preço (R$)", min_value=0.01, format="%.2f", required=True),
+            "quantidade": st.column_config.NumberColumn("Quantidade", min_value=0, step=1, required=True),
+            "marca": st.column_config.SelectboxColumn("Marca", options=marcas, required=True),
+            "estilo": st.column_config.SelectboxColumn("Estilo", options=estilos, required=True),
+            "tipo": st.column_config.SelectboxColumn("Tipo", options=tipos, required=True),
+            "codigo_barras": st.column_config.TextColumn("Código de Barras", max_chars=64),
+        },
+    )
+
+    # Converte os tipos do pandas (numpy) para tipos Python aceitos pelo sqlite3
+    editados = [
+        {
+            "id": int(row["id"]), "nome": str(row["nome"]).strip(),
+            "preco": round(float(row["preco"]), 2), "quantidade": int(row["quantidade"]),
+            "marca": row["marca"], "estilo": row["estilo"], "tipo": row["tipo"],
+            # Célula vazia vem como None/NaN do pandas
+            "codigo_barras": normalizar_codigo(row["codigo_barras"]) if isinstance(row["codigo_barras"], str) else None,
+        }
+        for row in editado.to_dict("records")
+    ]
+    alteracoes = diff_produtos(originais, editados, campos=COLUNAS_EM_MASSA[1:])
+    if not alteracoes:
+        st.caption(f"{len(originais)} produto(s) na grade. Edite as células e confira as alterações antes de aplicar.")
+        return
+
+    invalidos = [pid for pid, mudou in alteracoes
+                 if not mudou.get("nome", (None, "x"))[1] or mudou.get("preco", (None, 1))[1] <= 0
+                 or mudou.get("quantidade", (None, 0))[1] < 0]
+    st.markdown(f"##### Pré-visualização: {len(alteracoes)} produto(s) alterado(s)")
+    st.dataframe(
+        [{"ID": pid, "Campo": campo, "Antes": antigo, "Depois": novo}
+         for pid, mudou in alteracoes for campo, (antigo, novo) in mudou.items()],
+        use_container_width=True, hide_index=True,
+    )
+    if invalidos:
+        st.error(f"Corrija os produtos {', '.join(map(str, invalidos))}: nome obrigatório, preço positivo e quantidade não negativa.")
+        return
+
+    if st.button(f"Aplicar {len(alteracoes)} alteração(ões)", type="primary"):
+        inicio = time.perf_counter()
+        try:
+            atualizados, sem_estoque = bulk_update_produtos(alteracoes)
+        except Exception as e:
+            st.error(f"Erro ao aplicar as alterações: {e}")
+            return
+        duracao_ms = (time.perf_counter() - inicio) * 1000
+        msg = f"{atualizados} produto(s) atualizado(s) em {duracao_ms:.1f} ms."
+        if sem_estoque:
+            msg += (f" Quantidade não alterada em {len(sem_estoque)} produto(s) "
+                    f"({', '.join(map(str, sem_estoque))}): estoque insuficiente no local padrão.")
+        st.session_state['bulk_msg'] = msg
+        st.session_state['bulk_editor_versao'] += 1
+        st.rerun()
+
+
+def show_reports():
+    """Folhas de estoque e etiquetas de preço/código por marca ou estilo, geradas em paralelo num .zip."""
+    st.subheader("Relatórios e Etiquetas")
+    with st.form("reports_form"):
+        tipos = st.multiselect("Documentos", list(TIPOS_RELATORIO), default=list(TIPOS_RELATORIO),
+                               format_func=lambda t: TIPOS_RELATORIO[t][0])
+        agrupar_por = st.radio("Um documento por", AGRUPAMENTOS_RELATORIO, horizontal=True, format_func=str.capitalize)
+        gerar = st.form_submit_button("Gerar")
+
+    zip_path = os.path.join('data', 'relatorios.zip')
+    if gerar and not tipos:
+        st.error("Selecione ao menos um documento.")
+    elif gerar:
+        # Clicar em Cancelar interrompe o script na próxima atualização do progresso;
+        # os documentos que ainda não começaram são descartados e o .zip anterior é mantido
+        st.button("Cancelar", key="cancel_reports")
+        barra = st.progress(0.0, text="Preparando documentos...")
+        try:
+            resumo = gerar_relatorios(
+                zip_path, tipos, agrupar_por,
+                progresso=lambda feitos, total, nome: barra.progress(feitos / total, text=f"{feitos}/{total}: {nome}"),
+            )
+            barra.empty()
+            st.success(f"{resumo['documentos']} documento(s) de {resumo['produtos']} produto(s) gerado(s) em "
+                       f"{resumo['segundos']:.1f}s com {resumo['processos']} processo(s).")
+        except Exception as e:
+            st.error(f"Erro ao gerar os relatórios: {e}")
+
+    if os.path.exists(zip_path):
+        with open(zip_path, "rb") as f:
+            st.download_button("Baixar relatorios.zip", f, file_name="relatorios.zip", mime="application/zip")
 
 
 # --- FLUXO PRINCIPAL DA PÁGINA ---
 
-if not st.session_state.get("logged_in"):
-    st.error("Acesso negado. Faça login na área administrativa para gerenciar produtos.")
-    st.info("Vá para a página 'Área Administrativa' para entrar ou criar um admin.")
-else:
-    st.sidebar.markdown(f"**Olá, {st.session_state.get('username')} ({st.session_state.get('role','staff')})**")
-    
-    # Se estiver no modo de edição, forçamos a exibição do formulário
-    if st.session_state.get('edit_mode'):
-        show_edit_form()
+with page_timer("Gerenciar Produtos"):
+    principal = get_principal(st.session_state)
+    if not principal.can("editar_produto"):
+        st.error("Acesso negado. Faça login na área administrativa para gerenciar produtos.")
+        st.info("Vá para a página 'Área Administrativa' para entrar ou criar um admin.")
     else:
-        # Caso contrário, mostra o fluxo normal
-        action = st.sidebar.selectbox("Ação", ["Visualizar / Modificar / Remover Produtos", "Adicionar Produto"])
-        
-        if action == "Adicionar Produto":
-            add_product_form_com_colunas()
+        st.sidebar.markdown(f"**Olá, {principal.username} ({principal.role})**")
+    
+        # Se estiver no modo de edição, forçamos a exibição do formulário
+        if st.session_state.get('edit_mode'):
+            show_edit_form()
+            if st.session_state.get('edit_mode'):
+                show_transfer_form(st.session_state.get('edit_product_id'))
         else:
-            manage_products_list()
\ No newline at end of file
+            # Caso contrário, mostra o fluxo normal
+            acoes = ["Visualizar / Modificar / Arquivar Produtos", "Adicionar Produto", "Edição em Massa", "Reajustar Preços em Massa", "Relatórios e Etiquetas"]
+            if principal.can("remover_produto"):
+                acoes.append("Produtos Arquivados")
+            action = st.sidebar.selectbox("Ação", acoes, key='main_action_selector')
+        
+            if action == "Adicionar Produto" and principal.can("adicionar_produto"):
+                add_product_form_com_colunas()
+            elif action == "Edição em Massa":
+                show_bulk_edit()
+            elif action == "Reajustar Preços em Massa":
+                show_price_adjust_form()
+            elif action == "Relatórios e Etiquetas":
+                show_reports()
+            elif action == "Produtos Arquivados":
+                show_archived_products()
+            else:
+                manage_products_list(principal)
\ No newline at end of file
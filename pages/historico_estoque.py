@@ -0,0 +1,86 @@
+import streamlit as st
+import pandas as pd
+from datetime import date, timedelta
+from utils.database import garantir_snapshot_do_dia, get_historico_valor, get_valor_estoque_em
+from utils.instrumentation import page_timer
+from utils.permissions import get_principal
+import os
+
+# --- Funções Auxiliares ---
+def load_css(file_name):
+    if not os.path.exists(file_name):
+        st.warning(f"O arquivo CSS '{file_name}' não foi encontrado.")
+        return
+    try:
+        with open(file_name, encoding='utf-8') as f: 
+            st.markdown(f'<style>{f.read()}</style>', unsafe_allow_html=True)
+    except Exception as e:
+        st.error(f"Erro ao carregar CSS: {e}")
+
+load_css("style.css")
+
+st.set_page_config(page_title="Histórico do Estoque - Cores e Fragrâncias")
+
+AGRUPAMENTOS = {"Total": None, "Marca": "marca", "Estilo": "estilo", "Tipo": "tipo"}
+
+with page_timer("Histórico do Estoque"):
+    st.title("📈 Histórico do Estoque")
+
+    if not get_principal(st.session_state).can("ver_estoque"):
+        st.error("Acesso negado. Faça login na área administrativa.")
+        st.stop()
+
+    # Sem agendador configurado, a fotografia do dia é feita no primeiro acesso
+    garantir_snapshot_do_dia()
+
+    # --- Valor em estoque numa data (ex.: fechamento do mês) ---
+    st.subheader("Valor em estoque numa data")
+    col1, col2 = st.columns(2)
+    with col1:
+        data_consulta = st.date_input("Data", value=date.today().replace(day=1) - timedelta(days=1), max_value=date.today())
+    with col2:
+        rotulo = st.selectbox("Detalhar por", list(AGRUPAMENTOS), index=1)
+
+    resultado = get_valor_estoque_em(data_consulta, agrupar_por=AGRUPAMENTOS[rotulo])
+    if resultado is None:
+        st.info("Não há fotografia do estoque até essa data. As fotografias começam a ser gravadas a partir do primeiro acesso.")
+    else:
+        if resultado["data"] != data_consulta.isoformat():
+            st.caption(f"Usando a fotografia mais recente até a data: {resultado['data']}.")
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Valor em estoque", f"R$ {resultado['valor']:,.2f}")
+        col2.metric("Unidades", resultado["unidades"])
+        col3.metric("Produtos", resultado["produtos"])
+        if resultado["grupos"]:
+            st.dataframe(
+                pd.DataFrame(resultado["grupos"]).rename(columns={
+                    "nome": rotulo, "produtos": "Produtos", "unidades": "Unidades", "valor": "Valor (R$)",
+                }),
+                use_container_width=True, hide_index=True,
+                column_config={"Valor (R$)": st.column_config.NumberColumn(format="%.2f")},
+            )
+
+    st.markdown("---")
+
+    # --- Evolução do valor em estoque ---
+    st.subheader("Evolução do valor em estoque")
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        desde = st.date_input("De", value=date.today() - timedelta(days=90), key="hist_desde")
+    with col2:
+        ate = st.date_input("Até", value=date.today(), key="hist_ate")
+    with col3:
+        rotulo_grafico = st.selectbox("Séries", list(AGRUPAMENTOS), key="hist_agrupar")
+
+    historico = get_historico_valor(desde, ate, agrupar_por=AGRUPAMENTOS[rotulo_grafico])
+    if not historico:
+        st.info("Nenhuma fotografia no período selecionado.")
+    else:
+        df = pd.DataFrame(historico)
+        df["data"] = pd.to_datetime(df["data"])
+        if AGRUPAMENTOS[rotulo_grafico] is None:
+            serie = df.set_index("data")[["valor"]].rename(columns={"valor": "Valor (R$)"})
+        else:
+            serie = df.pivot_table(index="data", columns="nome", values="valor", aggfunc="sum")
+        st.line_chart(serie)
+        st.caption(f"{df['data'].nunique()} fotografia(s) no período.")
@@ -0,0 +1,80 @@
+import streamlit as st
+import pandas as pd
+from utils.database import get_nomes_categoria
+from utils.instrumentation import page_timer
+from utils.permissions import get_principal
+from utils.previsao import (
+    get_previsoes, agendar_recalculo, calculo_em_andamento, CICLO_PEDIDO_DIAS, SEGURANCA_DIAS,
+)
+import os
+
+# --- Funções Auxiliares ---
+def load_css(file_name):
+    if not os.path.exists(file_name):
+        st.warning(f"O arquivo CSS '{file_name}' não foi encontrado.")
+        return
+    try:
+        with open(file_name, encoding='utf-8') as f: 
+            st.markdown(f'<style>{f.read()}</style>', unsafe_allow_html=True)
+    except Exception as e:
+        st.error(f"Erro ao carregar CSS: {e}")
+
+load_css("style.css")
+
+st.set_page_config(page_title="Previsão de Reposição - Cores e Fragrâncias")
+
+with page_timer("Previsão de Reposição"):
+    st.title("🔮 Previsão de Reposição")
+
+    if not get_principal(st.session_state).can("ver_previsao"):
+        st.error("Acesso negado. Faça login na área administrativa.")
+        st.stop()
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        ciclo = st.number_input("Dias até o próximo pedido", min_value=1, value=CICLO_PEDIDO_DIAS, step=1)
+    with col2:
+        seguranca = st.number_input("Estoque de segurança (dias)", min_value=0, value=SEGURANCA_DIAS, step=1)
+    with col3:
+        marca = st.selectbox("Marca", ["Todas"] + get_nomes_categoria("marca"))
+
+    # Lê as previsões pré-calculadas; se estiverem desatualizadas, o recálculo roda em segundo plano
+    previsoes, status = get_previsoes(ciclo, seguranca)
+    if status is None:
+        st.info("As previsões estão sendo calculadas pela primeira vez. Atualize a página em alguns segundos.")
+        st.stop()
+
+    legenda = f"Calculado em {status['calculado_em'][:16].replace('T', ' ')} com as vendas dos últimos {status['parametros']['historico_dias']} dias."
+    if calculo_em_andamento():
+        legenda += " Atualização em andamento."
+    st.caption(legenda)
+    if st.button("Recalcular agora"):
+        with st.spinner("Recalculando previsões..."):
+            agendar_recalculo().result()
+        st.rerun()
+
+    com_demanda = [p for p in previsoes if p["demanda_diaria"] > 0 and marca in ("Todas", p["marca"])]
+    if not com_demanda:
+        st.info("Nenhuma venda registrada no período para os filtros selecionados.")
+        st.stop()
+
+    em_risco = [p for p in com_demanda if p["dias_ate_ruptura"] < ciclo]
+    col1, col2 = st.columns(2)
+    col1.metric("Produtos que acabam antes do próximo pedido", len(em_risco))
+    col2.metric("Unidades sugeridas para o pedido", sum(p["sugestao"] for p in com_demanda))
+
+    apenas_risco = st.checkbox("Mostrar só os que acabam antes do próximo pedido", value=True)
+    linhas = em_risco if apenas_risco else com_demanda
+    st.dataframe(
+        pd.DataFrame([{
+            "Produto": p["nome"], "Marca": p["marca"], "Estoque": p["quantidade"],
+            "Média móvel (un./dia)": p["media_movel"], "Previsão (un./dia)": p["demanda_diaria"],
+            "Dias até acabar": p["dias_ate_ruptura"], "Sugestão de compra": p["sugestao"],
+        } for p in linhas]),
+        use_container_width=True, hide_index=True,
+        column_config={
+            "Média móvel (un./dia)": st.column_config.NumberColumn(format="%.2f"),
+            "Previsão (un./dia)": st.column_config.NumberColumn(format="%.2f"),
+            "Dias até acabar": st.column_config.NumberColumn(format="%.0f"),
+        },
+    )
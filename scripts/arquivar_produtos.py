@@ -0,0 +1,45 @@
+"""Arquiva os produtos esgotados sem venda nem alteração nos últimos meses.
+
+Produtos arquivados saem das listagens, do catálogo e da API, mas continuam no banco
+(foto, histórico e vendas) e podem ser restaurados em "Gerenciar Produtos" >
+"Produtos Arquivados". Feito para rodar periodicamente pelo agendador do sistema.
+
+Exemplos:
+    python scripts/arquivar_produtos.py --simular
+    python scripts/arquivar_produtos.py --meses 12
+
+    # crontab: todo dia 1º às 03:00
+    0 3 1 * * cd /caminho/do/projeto && python scripts/arquivar_produtos.py
+"""
+import argparse
+import logging
+import os
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default=os.path.join(ROOT_DIR, "data", "estoque.db"))
+    parser.add_argument("--meses", type=int, help="Meses sem movimento (padrão: ESTOQUE_ARQUIVAR_MESES ou 6)")
+    parser.add_argument("--simular", action="store_true", help="Só lista os produtos, sem arquivar")
+    args = parser.parse_args()
+    logging.getLogger("utils.instrumentation").setLevel(logging.ERROR)
+
+    # Precisa ser definido antes de importar utils.database
+    os.environ["ESTOQUE_DB_PATH"] = args.db
+    from utils import database as db
+
+    meses = args.meses if args.meses is not None else db.ARQUIVAR_APOS_MESES
+    produtos = db.arquivar_sem_movimento(meses, simular=args.simular)
+    acao = "seriam arquivados" if args.simular else "arquivados"
+    print(f"{len(produtos)} produto(s) esgotado(s) sem movimento há {meses} mes(es) {acao}.")
+    for p in produtos:
+        print(f"  {p['id']:>6}  {p['nome'][:50]:<52}última venda: {(p['data_ultima_venda'] or '-')[:10]}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,87 @@
+"""Benchmark da edição em massa: N produtos editados um a um x diff + executemany numa transação.
+
+Cria um banco temporário (o banco real não é usado).
+
+Exemplo:
+    python scripts/bench_bulk_edit.py --edicoes 1000
+"""
+import argparse
+import logging
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+
+def editar(produtos, rnd):
+    """Simula uma entrega de fornecedor: repõe quantidades e corrige alguns preços."""
+    editados = [dict(p) for p in produtos]
+    for p in editados:
+        p["quantidade"] += rnd.randint(1, 12)
+        if rnd.random() < 0.3:
+            p["preco"] = round(p["preco"] * 1.05, 2)
+    return editados
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--edicoes", type=int, default=1000, help="Produtos alterados por rodada")
+    args = parser.parse_args()
+    logging.getLogger("utils.instrumentation").setLevel(logging.ERROR)
+
+    tmp_dir = tempfile.mkdtemp(prefix="estoque_bench_")
+    os.environ["ESTOQUE_DB_PATH"] = os.path.join(tmp_dir, "estoque.db")
+    from utils import database as db
+
+    rnd = random.Random(1)
+    ids = {campo: [c["id"] for c in db.get_categorias(campo)] for campo in db.CATEGORIAS}
+    conn = db.get_db_connection()
+    conn.executemany(
+        "INSERT INTO produtos (nome, preco, quantidade, marca_id, estilo_id, tipo_id) VALUES (?, ?, ?, ?, ?, ?)",
+        ((f"Produto {i}", round(rnd.uniform(5, 300), 2), rnd.randint(0, 20),
+          rnd.choice(ids["marca"]), rnd.choice(ids["estilo"]), rnd.choice(ids["tipo"])) for i in range(args.edicoes))
+    )
+    conn.commit()
+    conn.close()
+    print(f"{args.edicoes} produtos editados por rodada (quantidade em todos, preço em ~30%)\n")
+
+    # 1. Como o formulário de edição: um UPDATE (e um commit) por produto
+    originais = db.get_all_produtos()
+    alteracoes = db.diff_produtos(originais, editar(originais, rnd))
+    inicio = time.perf_counter()
+    for product_id, mudou in alteracoes:
+        db.patch_produto(product_id, **{campo: novo for campo, (_, novo) in mudou.items()})
+    um_a_um = time.perf_counter() - inicio
+    print(f"  {'patch_produto por linha':<40}{um_a_um * 1000:10.1f} ms")
+
+    # 2. Grade de edição em massa: diff + executemany numa única transação
+    originais = db.get_all_produtos()
+    editados = editar(originais, rnd)
+    inicio = time.perf_counter()
+    alteracoes = db.diff_produtos(originais, editados)
+    diff = time.perf_counter() - inicio
+    atualizados, _ = db.bulk_update_produtos(alteracoes)
+    em_massa = time.perf_counter() - inicio
+    print(f"  {'diff_produtos':<40}{diff * 1000:10.1f} ms")
+    print(f"  {'diff + bulk_update_produtos':<40}{em_massa * 1000:10.1f} ms ({atualizados} produtos)")
+    print(f"\nGanho: {um_a_um / em_massa:.1f}x")
+
+    conn = db.get_db_connection()
+    consistente = conn.execute(
+        """
+        SELECT COUNT(*) FROM produtos p
+        WHERE quantidade != (SELECT COALESCE(SUM(quantidade), 0) FROM estoque_local WHERE produto_id = p.id)
+        """
+    ).fetchone()[0] == 0
+    conn.close()
+    print(f"Totais de produtos consistentes com estoque_local: {consistente}")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""Benchmark do estoque por local: totais e filtros com muitos produtos x locais.
+
+Cria um banco temporário (o banco real não é usado).
+
+Exemplo:
+    python scripts/bench_estoque_local.py --produtos 100000 --locais 10
+"""
+import argparse
+import logging
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+
+def cronometrar(descricao, func, repeticoes=5):
+    func()  # aquece o cache de páginas do SQLite
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        func()
+    print(f"  {descricao:<45}{(time.perf_counter() - inicio) / repeticoes * 1000:10.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--produtos", type=int, default=100_000)
+    parser.add_argument("--locais", type=int, default=10)
+    args = parser.parse_args()
+    logging.getLogger("utils.instrumentation").setLevel(logging.ERROR)
+
+    tmp_dir = tempfile.mkdtemp(prefix="estoque_bench_")
+    os.environ["ESTOQUE_DB_PATH"] = os.path.join(tmp_dir, "estoque.db")
+    from utils import database as db
+
+    rnd = random.Random(1)
+    ids = {campo: [c["id"] for c in db.get_categorias(campo)] for campo in db.CATEGORIAS}
+    conn = db.get_db_connection()
+    inicio = time.perf_counter()
+    for i in range(len(db.get_locais()), args.locais):
+        conn.execute("INSERT INTO locais (nome) VALUES (?)", (f"Local {i + 1}",))
+    conn.executemany(
+        "INSERT INTO produtos (nome, preco, quantidade, marca_id, estilo_id, tipo_id) VALUES (?, ?, ?, ?, ?, ?)",
+        ((f"Produto {i}", round(rnd.uniform(5, 300), 2), rnd.randint(0, 20),
+          rnd.choice(ids["marca"]), rnd.choice(ids["estilo"]), rnd.choice(ids["tipo"])) for i in range(args.produtos))
+    )
+    # Demais locais: os triggers recalculam o total de cada produto
+    conn.execute(
+        """
+        INSERT INTO estoque_local (produto_id, local_id, quantidade)
+        SELECT p.id, l.id, abs(random()) % 10 FROM produtos p CROSS JOIN locais l WHERE l.id != ?
+        """,
+        (db.LOCAL_PADRAO_ID,)
+    )
+    conn.commit()
+    linhas = conn.execute("SELECT COUNT(*) FROM estoque_local").fetchone()[0]
+    print(f"Carga: {args.produtos} produtos x {args.locais} locais = {linhas} linhas em {time.perf_counter() - inicio:.1f}s\n")
+
+    local = args.locais // 2 + 1
+    produto = args.produtos // 2
+    print("Consultas:")
+    cronometrar("get_totais_estoque() (total geral)", lambda: db.get_totais_estoque())
+    cronometrar("get_totais_estoque(marca='Natura')", lambda: db.get_totais_estoque(marca="Natura"))
+    cronometrar(f"get_totais_estoque(local_id={local})", lambda: db.get_totais_estoque(local_id=local))
+    cronometrar("get_totais_por_local()", lambda: db.get_totais_por_local())
+    cronometrar(f"get_all_produtos(local_id={local})", lambda: db.get_all_produtos(local_id=local), repeticoes=2)
+    cronometrar(f"get_estoque_por_local({produto})", lambda: db.get_estoque_por_local(produto), repeticoes=100)
+    cronometrar("transfer_estoque (1 unidade)", lambda: db.transfer_estoque(produto, 2, 3, 1), repeticoes=100)
+
+    consistente = conn.execute(
+        """
+        SELECT COUNT(*) FROM produtos p
+        WHERE quantidade != (SELECT COALESCE(SUM(quantidade), 0) FROM estoque_local WHERE produto_id = p.id)
+        """
+    ).fetchone()[0] == 0
+    print(f"\nTotais de produtos consistentes com estoque_local: {consistente}")
+
+    print("\nPlano de consulta (filtro por local):")
+    for linha in conn.execute(
+        "EXPLAIN QUERY PLAN SELECT SUM(e.quantidade) FROM estoque_local e WHERE e.local_id = ?", (local,)
+    ):
+        print(f"  {linha[-1]}")
+    conn.close()
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
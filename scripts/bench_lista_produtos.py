@@ -0,0 +1,105 @@
+"""Benchmark da lista de "Gerenciar Produtos": rerun da página inteira x rerun só do card.
+
+Antes, cada "Vender 1 Unidade" chamava st.rerun(): a página recarregava todos os produtos,
+relia todas as fotos e recalculava o resumo. Agora o card é um st.fragment: a venda relê
+só aquele produto, a foto dele e os totais do resumo. Este script mede essa parte do
+trabalho de cada rerun (banco + leitura das fotos) num banco temporário; o desenho dos
+elementos no navegador não entra na conta, e também cresce com o número de cards.
+Com a aplicação rodando, as métricas "Gerenciar Produtos" e "Gerenciar Produtos (card)"
+da Área Administrativa mostram os tempos reais dos dois reruns.
+
+Exemplo:
+    python scripts/bench_lista_produtos.py --produtos 1000
+"""
+import argparse
+import logging
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import date
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+
+def cronometrar(func, repeticoes):
+    func()  # aquece o cache de páginas do SQLite e do sistema de arquivos
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        func()
+    return (time.perf_counter() - inicio) / repeticoes * 1000
+
+
+def desenhar_card(p, fotos_dir):
+    """O que o card faz fora do Streamlit: formata os campos e lê a foto (como o st.image)."""
+    texto = f"R$ {p['preco']:,.2f} • {p['quantidade']} • {p['marca']} • {p['estilo']} • {p['tipo']}"
+    if p["data_validade"]:
+        texto += date.fromisoformat(p["data_validade"]).strftime("%d/%m/%Y")
+    if p["foto"]:
+        with open(os.path.join(fotos_dir, p["foto"]), "rb") as f:
+            f.read()
+    return texto
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--produtos", type=int, default=1000)
+    parser.add_argument("--foto-kb", type=int, default=60, help="Tamanho de cada foto de teste")
+    parser.add_argument("--repeticoes", type=int, default=10)
+    args = parser.parse_args()
+    logging.getLogger("utils.instrumentation").setLevel(logging.ERROR)
+
+    tmp_dir = tempfile.mkdtemp(prefix="estoque_bench_")
+    fotos_dir = os.path.join(tmp_dir, "assets")
+    os.makedirs(fotos_dir)
+    # Precisa ser definido antes de importar utils.database
+    os.environ["ESTOQUE_DB_PATH"] = os.path.join(tmp_dir, "estoque.db")
+    from utils import database as db
+
+    rnd = random.Random(1)
+    ids = {campo: [c["id"] for c in db.get_categorias(campo)] for campo in db.CATEGORIAS}
+    for i in range(args.produtos):
+        with open(os.path.join(fotos_dir, f"foto_{i}.jpg"), "wb") as f:
+            f.write(os.urandom(args.foto_kb * 1024))
+    conn = db.get_db_connection()
+    conn.executemany(
+        "INSERT INTO produtos (nome, preco, quantidade, marca_id, estilo_id, tipo_id, foto, data_validade) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        ((f"Produto {i}", round(rnd.uniform(5, 300), 2), 100_000, rnd.choice(ids["marca"]),
+          rnd.choice(ids["estilo"]), rnd.choice(ids["tipo"]), f"foto_{i}.jpg", "2027-01-31") for i in range(args.produtos))
+    )
+    conn.commit()
+    conn.close()
+    produto_ids = [p["id"] for p in db.get_all_produtos()]
+
+    def rerun_completo():
+        produto_id = rnd.choice(produto_ids)
+        db.mark_produto_as_sold(produto_id, 1)
+        db.get_totais_estoque()
+        for p in db.get_all_produtos():
+            desenhar_card(p, fotos_dir)
+
+    def rerun_card():
+        produto_id = rnd.choice(produto_ids)
+        db.mark_produto_as_sold(produto_id, 1)
+        db.get_totais_estoque()
+        desenhar_card(db.get_produto_by_id(produto_id), fotos_dir)
+
+    try:
+        completo = cronometrar(rerun_completo, args.repeticoes)
+        card = cronometrar(rerun_card, args.repeticoes * 10)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    print(f"Venda de 1 unidade com {args.produtos} produto(s) na lista (fotos de {args.foto_kb} KB):\n")
+    print(f"  {'rerun da página inteira':<30}{completo:10.2f} ms")
+    print(f"  {'rerun só do card (fragment)':<30}{card:10.2f} ms")
+    print(f"\n  {completo / card:.0f}x menos trabalho por venda")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,67 @@
+"""Benchmark do login: custo do hash, throughput de logins simultâneos e custo do token por rerun.
+
+Não acessa o banco; usa apenas utils/auth.py.
+
+Exemplo:
+    python scripts/bench_login.py --logins 200 --concurrency 1 4 16
+"""
+import argparse
+import hashlib
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from utils import auth  # noqa: E402
+
+
+def medir(func, repeticoes):
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        func()
+    return (time.perf_counter() - inicio) / repeticoes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=100, help="Logins por rodada")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16], help="Sessões simultâneas")
+    args = parser.parse_args()
+
+    senha = "senha-de-teste"
+    legado = hashlib.sha256(senha.encode()).hexdigest()
+    novo = auth.hash_password(senha)
+    usuario = {"username": "bench", "password": novo}
+
+    print(f"scrypt n={auth.SCRYPT_N} r={auth.SCRYPT_R} p={auth.SCRYPT_P} | verificações simultâneas: até {auth.AUTH_WORKERS}")
+    print(f"SHA256 legado:        {medir(lambda: auth.verify_password(senha, legado), 1000) * 1e6:10.1f} µs/verificação")
+    print(f"scrypt:               {medir(lambda: auth.verify_password(senha, novo), 20) * 1e3:10.1f} ms/verificação")
+
+    token = auth.issue_session_token("bench", "admin")
+    print(f"Token por rerun:      {medir(lambda: auth.read_session_token(token), 10000) * 1e6:10.1f} µs/validação")
+
+    print("\nLogins simultâneos (cada sessão espera a própria verificação, como na página de login):")
+    for concorrencia in args.concurrency:
+        with ThreadPoolExecutor(max_workers=concorrencia) as sessoes:
+            inicio = time.perf_counter()
+            resultados = list(sessoes.map(lambda _: auth.verify_user_password(usuario, senha), range(args.logins)))
+            duracao = time.perf_counter() - inicio
+        assert all(resultados)
+        print(f"  {concorrencia:>3} sessões: {args.logins / duracao:8.1f} logins/s ({duracao * 1000 / args.logins:.1f} ms/login em média)")
+
+    # Enquanto sessões calculam o scrypt, outras threads Python continuam rodando (o scrypt libera o GIL)
+    contador = 0
+    with ThreadPoolExecutor(max_workers=auth.AUTH_WORKERS) as sessoes:
+        futuros = [sessoes.submit(auth.verify_user_password, usuario, senha) for _ in range(auth.AUTH_WORKERS * 4)]
+        inicio = time.perf_counter()
+        while not all(f.done() for f in futuros):
+            contador += 1
+        duracao = time.perf_counter() - inicio
+    print(f"\nIterações de outra thread durante {len(futuros)} verificações: {contador / duracao:,.0f}/s")
+
+
+if __name__ == "__main__":
+    main()
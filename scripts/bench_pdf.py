@@ -0,0 +1,70 @@
+"""Benchmark do relatório PDF de estoque (generate_stock_pdf) com 5 mil a 50 mil linhas.
+
+Cria um banco temporário (o banco real não é usado) com nomes longos e acentuados e mede
+o tempo de geração em cada tamanho. O tempo por mil linhas deve ficar estável: as larguras
+das colunas são calculadas uma vez por relatório e a medida de cada texto usa a tabela de
+larguras por caractere de utils/pdf_layout.py.
+
+Exemplo:
+    python scripts/bench_pdf.py --linhas 5000 10000 25000 50000
+"""
+import argparse
+import logging
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+PALAVRAS = ["Colônia", "Loção", "Hidratante", "Açaí", "Maçã", "Pêssego", "Édition", "Fragrância",
+            "Cereja", "Avelã", "Desodorante", "Óleo", "Pitanga", "Castanha", "Noz Peča", "Ûnico"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--linhas", type=int, nargs="+", default=[5000, 10000, 25000, 50000])
+    args = parser.parse_args()
+    logging.getLogger("utils.instrumentation").setLevel(logging.ERROR)
+
+    tmp_dir = tempfile.mkdtemp(prefix="estoque_bench_")
+    # Precisa ser definido antes de importar utils.database
+    os.environ["ESTOQUE_DB_PATH"] = os.path.join(tmp_dir, "estoque.db")
+    from utils import database as db
+
+    rnd = random.Random(1)
+    ids = {campo: [c["id"] for c in db.get_categorias(campo)] for campo in db.CATEGORIAS}
+    print(f"  {'linhas':>8}{'tempo (s)':>11}{'ms/mil linhas':>15}{'páginas':>9}{'tamanho':>10}")
+    inseridas = 0
+    try:
+        for total in sorted(args.linhas):
+            conn = db.get_db_connection()
+            conn.executemany(
+                "INSERT INTO produtos (nome, preco, quantidade, marca_id, estilo_id, tipo_id, data_validade) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                ((" ".join(rnd.choices(PALAVRAS, k=rnd.randint(2, 8))) + f" {i}", round(rnd.uniform(5, 300), 2),
+                  rnd.randint(0, 20), rnd.choice(ids["marca"]), rnd.choice(ids["estilo"]), rnd.choice(ids["tipo"]),
+                  "2027-01-31") for i in range(inseridas, total))
+            )
+            conn.commit()
+            conn.close()
+            inseridas = total
+
+            destino = os.path.join(tmp_dir, f"estoque_{total}.pdf")
+            inicio = time.perf_counter()
+            db.generate_stock_pdf(destino)
+            segundos = time.perf_counter() - inicio
+            with open(destino, "rb") as f:
+                paginas = f.read().count(b"/Type /Page\n")
+            print(f"  {total:>8}{segundos:>11.2f}{segundos / total * 1e6:>15.1f}{paginas:>9}"
+                  f"{os.path.getsize(destino) / 1024 / 1024:>8.1f} MB")
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,73 @@
+"""Benchmark da geração de relatórios (folhas de estoque e etiquetas) com 1, 2, 4... processos.
+
+Cria um banco temporário com produtos de várias marcas (o banco real não é usado), gera o
+.zip completo com cada número de processos e mostra o tempo e o ganho em relação a um
+processo. O ganho depende dos núcleos livres: com um núcleo só, o pool só acrescenta custo.
+
+Exemplos:
+    python scripts/bench_relatorios.py --produtos 5000
+    python scripts/bench_relatorios.py --produtos 20000 --processos 1 2 4 8 --agrupar-por estilo
+"""
+import argparse
+import logging
+import os
+import random
+import shutil
+import sys
+import tempfile
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+
+def main():
+    nucleos = os.cpu_count() or 1
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--produtos", type=int, default=5000)
+    parser.add_argument("--marcas", type=int, default=24)
+    parser.add_argument("--processos", type=int, nargs="+",
+                        default=sorted({1, 2, 4, nucleos} - {n for n in (2, 4) if n > nucleos}))
+    parser.add_argument("--agrupar-por", default="marca", choices=("marca", "estilo"))
+    args = parser.parse_args()
+    logging.getLogger("utils.instrumentation").setLevel(logging.ERROR)
+
+    tmp_dir = tempfile.mkdtemp(prefix="estoque_bench_")
+    # Precisa ser definido antes de importar utils.database
+    os.environ["ESTOQUE_DB_PATH"] = os.path.join(tmp_dir, "estoque.db")
+    from utils import database as db
+    from utils.relatorios import gerar_relatorios
+
+    rnd = random.Random(1)
+    conn = db.get_db_connection()
+    for i in range(args.marcas):
+        conn.execute("INSERT OR IGNORE INTO marcas (nome) VALUES (?)", (f"Marca {i + 1}",))
+    conn.commit()
+    ids = {campo: [c["id"] for c in db.get_categorias(campo)] for campo in db.CATEGORIAS}
+    conn.executemany(
+        "INSERT INTO produtos (nome, preco, quantidade, marca_id, estilo_id, tipo_id, data_validade, codigo_barras) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        ((f"Produto de teste com nome comprido nº {i}", round(rnd.uniform(5, 300), 2), rnd.randint(0, 20),
+          rnd.choice(ids["marca"]), rnd.choice(ids["estilo"]), rnd.choice(ids["tipo"]), "2027-01-31",
+          f"789{i:010d}" if i % 2 == 0 else None) for i in range(args.produtos))
+    )
+    conn.commit()
+    conn.close()
+    produtos = db.get_all_produtos()
+
+    print(f"{len(produtos)} produto(s), agrupados por {args.agrupar_por}; {nucleos} núcleo(s) disponível(is)\n")
+    print(f"  {'processos':>9}{'documentos':>12}{'tempo (s)':>11}{'ganho':>8}{'tamanho do .zip':>18}")
+    base = None
+    try:
+        for processos in args.processos:
+            destino = os.path.join(tmp_dir, f"relatorios_{processos}.zip")
+            resumo = gerar_relatorios(destino, agrupar_por=args.agrupar_por, produtos=produtos, processos=processos)
+            base = base or resumo["segundos"]
+            print(f"  {resumo['processos']:>9}{resumo['documentos']:>12}{resumo['segundos']:>11.2f}"
+                  f"{base / resumo['segundos']:>7.1f}x{os.path.getsize(destino) / 1024 / 1024:>14.1f} MB")
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
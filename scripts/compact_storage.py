@@ -0,0 +1,214 @@
+"""Manutenção do armazenamento: fotos órfãs, fotos duplicadas, miniaturas antigas e compactação do banco.
+
+Por padrão apenas mostra o que seria feito; use --apply para remover arquivos e
+apontar produtos com fotos duplicadas para um único arquivo. Só fotos de produtos
+(nome de upload "<timestamp>_<nome>.<ext>" ou registradas na tabela 'fotos') são
+consideradas; os demais arquivos de assets (ex.: logo.png) nunca são removidos.
+Miniaturas (data/miniaturas, "<versão>_<px>.jpg") de versões que nenhum arquivo de
+assets tem mais são removidas.
+
+Exemplos:
+    python scripts/compact_storage.py
+    python scripts/compact_storage.py --apply
+"""
+import argparse
+import fnmatch
+import hashlib
+import logging
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+PREFIXO_TEMPORARIO = ".upload-"
+# Nome dado às fotos enviadas (utils/images.py:_nome_final): "<timestamp>_<nome>.<ext>"
+PADRAO_UPLOAD = re.compile(r"^\d+_.+\.\w+$")
+# Arquivos da própria aplicação em assets (ex.: a logo exibida em app.py): nunca são removidos
+PROTEGIDOS = ("logo*",)
+# Miniatura gerada pela rota /fotos (utils/images.py:arquivo_foto): versão = 16 primeiros dígitos do SHA-256
+PADRAO_MINIATURA = re.compile(r"^([0-9a-f]{16})_\d+\.jpg$")
+
+
+def hash_arquivo(caminho):
+    """SHA-256 do arquivo, lido em blocos (roda nos processos do pool)."""
+    h = hashlib.sha256()
+    with open(caminho, "rb") as f:
+        for bloco in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(bloco)
+    return h.hexdigest()
+
+
+def versao_miniatura(nome):
+    """Versão da foto no nome da miniatura, ou None se o arquivo não for uma miniatura."""
+    encontrado = PADRAO_MINIATURA.match(nome)
+    return encontrado.group(1) if encontrado else None
+
+
+def formatar_bytes(n):
+    for unidade in ("B", "KB", "MB", "GB"):
+        if abs(n) < 1024 or unidade == "GB":
+            return f"{n:.1f} {unidade}" if unidade != "B" else f"{n} B"
+        n /= 1024
+
+
+def escanear(assets_dir):
+    """Lista os arquivos de assets_dir com os.scandir: {nome: (tamanho, mtime)}."""
+    arquivos = {}
+    with os.scandir(assets_dir) as entradas:
+        for entrada in entradas:
+            if entrada.is_file(follow_symlinks=False):
+                info = entrada.stat()
+                arquivos[entrada.name] = (info.st_size, info.st_mtime)
+    return arquivos
+
+
+def candidatos_duplicados(arquivos):
+    """Arquivos com tamanho repetido: só eles podem ter conteúdo igual."""
+    por_tamanho = {}
+    for nome, (tamanho, _) in arquivos.items():
+        por_tamanho.setdefault(tamanho, []).append(nome)
+    return sorted(nome for nomes in por_tamanho.values() if len(nomes) > 1 for nome in nomes)
+
+
+def calcular_hashes(assets_dir, nomes, workers):
+    """{nome: SHA-256}, calculados em paralelo nos processos do pool."""
+    if not nomes:
+        return {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return dict(zip(nomes, pool.map(hash_arquivo, [os.path.join(assets_dir, n) for n in nomes], chunksize=8)))
+
+
+def agrupar_duplicadas(nomes, hashes):
+    """Agrupa os arquivos por conteúdo (só grupos com mais de um arquivo)."""
+    por_hash = {}
+    for nome in nomes:
+        por_hash.setdefault(hashes[nome], []).append(nome)
+    return [grupo for grupo in por_hash.values() if len(grupo) > 1]
+
+
+def remover(assets_dir, nomes):
+    removidos = []
+    for nome in nomes:
+        try:
+            os.remove(os.path.join(assets_dir, nome))
+            removidos.append(nome)
+        except FileNotFoundError:
+            pass
+    return removidos
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default=os.path.join(ROOT_DIR, "data", "estoque.db"))
+    parser.add_argument("--assets", default=os.path.join(ROOT_DIR, "assets"))
+    parser.add_argument("--miniaturas",
+                        default=os.path.join(ROOT_DIR, os.environ.get("ESTOQUE_MINIATURAS_DIR", os.path.join("data", "miniaturas"))))
+    parser.add_argument("--apply", action="store_true", help="Remove os arquivos e atualiza o banco (padrão: só relatório)")
+    parser.add_argument("--min-age", type=float, default=60,
+                        help="Ignora arquivos mais novos que N minutos (uploads ainda sendo salvos)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Processos para calcular os hashes")
+    parser.add_argument("--no-vacuum", action="store_true", help="Não executa VACUUM (só ANALYZE/optimize)")
+    parser.add_argument("--verbose", action="store_true", help="Lista todos os arquivos afetados")
+    args = parser.parse_args()
+    logging.getLogger("utils.instrumentation").setLevel(logging.ERROR)
+
+    # Precisa ser definido antes de importar utils.database
+    os.environ["ESTOQUE_DB_PATH"] = args.db
+    from utils import database as db
+
+    limite = time.time() - args.min_age * 60
+    referenciadas = db.get_fotos_referenciadas()
+    registradas = db.get_fotos_registradas()
+    arquivos = escanear(args.assets)
+
+    temporarios = [n for n, (_, mtime) in arquivos.items() if n.startswith(PREFIXO_TEMPORARIO) and mtime < limite]
+    # Só fotos de produtos (nome de upload, registradas ou em uso) entram na limpeza;
+    # qualquer outro arquivo de assets é da aplicação e fica como está
+    fotos = {
+        n: info for n, info in arquivos.items()
+        if not n.startswith(PREFIXO_TEMPORARIO) and not any(fnmatch.fnmatch(n, p) for p in PROTEGIDOS)
+        and (PADRAO_UPLOAD.match(n) or n in registradas or n in referenciadas)
+    }
+    outros = len(arquivos) - len(fotos) - sum(1 for n in arquivos if n.startswith(PREFIXO_TEMPORARIO))
+    orfas = sorted(n for n, (_, mtime) in fotos.items() if n not in referenciadas and mtime < limite)
+    ausentes = sorted(referenciadas - set(arquivos))
+
+    # Duplicadas: só entre as fotos que continuam (órfãs já serão removidas) e, como as órfãs,
+    # só as mais antigas que --min-age (um upload recente pode estar prestes a ser referenciado)
+    orfas_set = set(orfas)
+    restantes = {n: info for n, info in fotos.items() if n not in orfas_set and info[1] < limite}
+    candidatos = candidatos_duplicados(restantes)
+
+    # Miniaturas: as versões em uso são as de todos os arquivos que continuam em assets (a rota
+    # /fotos serve qualquer um deles), então só há hash de tudo quando existem miniaturas
+    miniaturas = escanear(args.miniaturas) if os.path.isdir(args.miniaturas) else {}
+    servidos = [n for n in arquivos if not n.startswith(PREFIXO_TEMPORARIO) and n not in orfas_set]
+    inicio = time.perf_counter()
+    hashes = calcular_hashes(args.assets, sorted(set(candidatos) | (set(servidos) if miniaturas else set())), args.workers)
+    tempo_hash = time.perf_counter() - inicio
+    grupos = agrupar_duplicadas(candidatos, hashes)
+    versoes = {hashes[n][:16] for n in servidos} if miniaturas else set()
+    miniaturas_antigas = sorted(
+        n for n, (_, mtime) in miniaturas.items()
+        if mtime < limite and (n.startswith(PREFIXO_TEMPORARIO) or versao_miniatura(n) not in versoes | {None})
+    )
+    bytes_miniaturas = sum(miniaturas[n][0] for n in miniaturas_antigas)
+
+    duplicadas = {}  # arquivo mantido -> cópias
+    for nomes in grupos:
+        # Mantém uma foto em uso (a mais antiga pelo nome, que começa com o timestamp do upload)
+        nomes.sort(key=lambda n: (n not in referenciadas, n))
+        duplicadas[nomes[0]] = nomes[1:]
+
+    bytes_orfas = sum(fotos[n][0] for n in orfas) + sum(arquivos[n][0] for n in temporarios)
+    bytes_duplicadas = sum(fotos[n][0] for copias in duplicadas.values() for n in copias)
+
+    print(f"Assets: {args.assets} ({len(fotos)} fotos, {formatar_bytes(sum(t for t, _ in fotos.values()))})")
+    print(f"Fotos referenciadas por produtos: {len(referenciadas)}")
+    print(f"Outros arquivos (da aplicação, mantidos): {outros}")
+    print(f"Órfãs: {len(orfas)} ({formatar_bytes(sum(fotos[n][0] for n in orfas))})")
+    print(f"Uploads temporários abandonados: {len(temporarios)}")
+    print(f"Duplicadas (mesmo conteúdo): {sum(len(c) for c in duplicadas.values())} cópias em {len(duplicadas)} grupos "
+          f"({formatar_bytes(bytes_duplicadas)}; hash em {tempo_hash * 1000:.0f} ms com {args.workers} processos)")
+    print(f"Miniaturas de versões que não existem mais: {len(miniaturas_antigas)} de {len(miniaturas)} "
+          f"({formatar_bytes(bytes_miniaturas)})")
+    if ausentes:
+        print(f"Atenção: {len(ausentes)} foto(s) usadas por produtos não existem em assets")
+    if args.verbose:
+        for nome in orfas:
+            print(f"  órfã: {nome}")
+        for mantida, copias in duplicadas.items():
+            print(f"  duplicada de {mantida}: {', '.join(copias)}")
+        for nome in ausentes:
+            print(f"  ausente: {nome}")
+        for nome in miniaturas_antigas:
+            print(f"  miniatura antiga: {nome}")
+
+    if not args.apply:
+        print(f"\nSimulação: {formatar_bytes(bytes_orfas + bytes_duplicadas)} seriam liberados em assets e "
+              f"{formatar_bytes(bytes_miniaturas)} em miniaturas. Use --apply para remover.")
+    else:
+        removidas = remover(args.assets, orfas + temporarios)
+        produtos_atualizados = 0
+        for mantida, copias in duplicadas.items():
+            # Primeiro os produtos passam a usar a foto mantida; só então as cópias são apagadas
+            produtos_atualizados += db.substituir_foto(copias, mantida)
+            removidas += remover(args.assets, copias)
+        db.remover_registro_fotos(removidas)
+        miniaturas_removidas = remover(args.miniaturas, miniaturas_antigas)
+        print(f"\nRemovidos {len(removidas)} arquivos ({formatar_bytes(bytes_orfas + bytes_duplicadas)}) e "
+              f"{len(miniaturas_removidas)} miniaturas ({formatar_bytes(bytes_miniaturas)}); "
+              f"{produtos_atualizados} produto(s) passaram a usar a cópia mantida.")
+
+    resultado = db.otimizar_banco(vacuum=not args.no_vacuum)
+    print(f"Banco: {formatar_bytes(resultado['antes'])} -> {formatar_bytes(resultado['depois'])} "
+          f"(recuperados {formatar_bytes(resultado['antes'] - resultado['depois'])})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,45 @@
+"""Gera o catálogo público estático (HTML + JSON, com miniaturas) dos produtos com estoque.
+
+Só as páginas cujos produtos mudaram desde a última geração são regravadas, então pode
+rodar com frequência (cron). A pasta gerada pode ser publicada por qualquer servidor de
+arquivos estáticos.
+
+Exemplos:
+    python scripts/gerar_catalogo.py
+    python scripts/gerar_catalogo.py --destino /var/www/catalogo --por-pagina 36
+    python -m http.server 8000 --directory catalogo
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default=os.path.join(ROOT_DIR, "data", "estoque.db"))
+    parser.add_argument("--destino", default=os.path.join(ROOT_DIR, "catalogo"))
+    parser.add_argument("--por-pagina", type=int, default=24, help="Produtos por página")
+    parser.add_argument("--forcar", action="store_true", help="Regrava todas as páginas")
+    args = parser.parse_args()
+    logging.getLogger("utils.instrumentation").setLevel(logging.ERROR)
+
+    # Precisa ser definido antes de importar utils.database; fotos são lidas de assets/ do projeto
+    os.environ["ESTOQUE_DB_PATH"] = args.db
+    os.chdir(ROOT_DIR)
+    from utils.catalogo import gerar_catalogo
+
+    inicio = time.perf_counter()
+    resultado = gerar_catalogo(args.destino, por_pagina=args.por_pagina, forcar=args.forcar)
+    print(f"Catálogo em {args.destino}: {resultado['gravadas']} arquivo(s) gravado(s), "
+          f"{resultado['mantidas']} sem alteração, {resultado['removidas']} removido(s), "
+          f"{resultado['miniaturas']} miniatura(s) gerada(s) em {(time.perf_counter() - inicio) * 1000:.0f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
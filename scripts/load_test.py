@@ -0,0 +1,238 @@
+"""Teste de carga: simula vários funcionários vendendo e editando ao mesmo tempo.
+
+Roda inteiramente local, sobre uma cópia temporária do banco (o banco real não é alterado).
+
+Exemplos:
+    python scripts/load_test.py --workers 8 --duration 20
+    python scripts/load_test.py --workers 4 --mode process --mix sell=60,update=10,add=5,list=15,chat=10
+"""
+import argparse
+import logging
+import os
+import pathlib
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+DEFAULT_MIX = "sell=50,update=15,add=5,list=20,chat=10"
+OPERACOES = ("sell", "update", "add", "list", "chat")
+
+
+def parse_mix(texto):
+    """Converte 'sell=50,list=20' em {'sell': 50, 'list': 20}."""
+    mix = {}
+    for parte in texto.split(","):
+        nome, _, peso = parte.partition("=")
+        nome = nome.strip()
+        if nome not in OPERACOES:
+            raise argparse.ArgumentTypeError(f"Operação desconhecida: {nome} (use {', '.join(OPERACOES)})")
+        mix[nome] = float(peso or 1)
+    return mix
+
+
+def percentil(valores_ordenados, p):
+    """Percentil pelo método nearest-rank (valores já ordenados)."""
+    if not valores_ordenados:
+        return 0.0
+    indice = max(0, min(len(valores_ordenados) - 1, int(round(p / 100 * len(valores_ordenados))) - 1))
+    return valores_ordenados[indice]
+
+
+# ====================================================================
+# OPERAÇÕES SIMULADAS (mesma sequência que a interface executa)
+# ====================================================================
+
+def _op_sell(db, chatbot, rnd, ids):
+    # Como na página de gerenciamento: lê o produto e só vende se houver estoque
+    produto = db.get_produto_by_id(rnd.choice(ids))
+    if produto and int(produto["quantidade"]) > 0:
+        db.mark_produto_as_sold(produto["id"], 1)
+
+
+def _op_update(db, chatbot, rnd, ids):
+    # Como no formulário de edição: lê tudo e reenvia todos os campos
+    produto = db.get_produto_by_id(rnd.choice(ids))
+    if produto:
+        db.update_produto(
+            produto["id"], produto["nome"], produto["preco"], int(produto["quantidade"]) + rnd.randint(0, 3),
+            produto["marca"], produto["estilo"], produto["tipo"], produto["foto"], produto["data_validade"]
+        )
+
+
+def _op_add(db, chatbot, rnd, ids):
+    db.add_produto(
+        f"Produto carga {rnd.randint(0, 10**9)}", round(rnd.uniform(5, 300), 2), rnd.randint(0, 10),
+        rnd.choice(db.get_nomes_categoria("marca")), rnd.choice(db.get_nomes_categoria("estilo")),
+        rnd.choice(db.get_nomes_categoria("tipo"))
+    )
+
+
+def _op_list(db, chatbot, rnd, ids):
+    db.get_all_produtos()
+
+
+def _op_chat(db, chatbot, rnd, ids):
+    state = chatbot.new_chat_state()
+    if rnd.random() < 0.7:
+        chatbot.process_command(f"vender {rnd.choice(ids)}", state)
+    else:
+        chatbot.process_command(f"estoque {rnd.choice(db.get_nomes_categoria('marca'))}", state)
+
+
+_FUNCOES = {
+    "sell": _op_sell, "update": _op_update, "add": _op_add, "list": _op_list, "chat": _op_chat,
+}
+
+
+def _novo_resultado():
+    return {"latencias": {op: [] for op in OPERACOES}, "locked": 0, "erros": 0, "exemplos_erro": []}
+
+
+def _executar(mix, duracao, semente, ids):
+    """Executa operações até esgotar `duracao` segundos e devolve latências e erros."""
+    from utils import database as db
+    from utils import chatbot
+
+    rnd = random.Random(semente)
+    nomes = list(mix)
+    pesos = [mix[n] for n in nomes]
+    resultado = _novo_resultado()
+    fim = time.perf_counter() + duracao
+
+    while time.perf_counter() < fim:
+        op = rnd.choices(nomes, pesos)[0]
+        inicio = time.perf_counter()
+        try:
+            _FUNCOES[op](db, chatbot, rnd, ids)
+        except sqlite3.OperationalError as e:
+            if "locked" in str(e):
+                resultado["locked"] += 1
+            else:
+                resultado["erros"] += 1
+                resultado["exemplos_erro"].append(f"{op}: {e}")
+            continue
+        except Exception as e:
+            resultado["erros"] += 1
+            resultado["exemplos_erro"].append(f"{op}: {e!r}")
+            continue
+        resultado["latencias"][op].append(time.perf_counter() - inicio)
+    return resultado
+
+
+def _worker_processo(args):
+    mix, duracao, semente, ids, threads = args
+    # Cada processo pode rodar várias threads (ex.: vários usuários atendidos pelo mesmo worker)
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        parciais = list(pool.map(lambda i: _executar(mix, duracao, semente * 1000 + i, ids), range(threads)))
+    return _juntar(parciais)
+
+
+def _juntar(resultados):
+    total = _novo_resultado()
+    for r in resultados:
+        for op in OPERACOES:
+            total["latencias"][op].extend(r["latencias"][op])
+        total["locked"] += r["locked"]
+        total["erros"] += r["erros"]
+        total["exemplos_erro"].extend(r["exemplos_erro"][:5])
+    return total
+
+
+# ====================================================================
+# RELATÓRIO
+# ====================================================================
+
+def verificar_invariantes(db_path):
+    conn = sqlite3.connect(db_path)
+    negativos = conn.execute("SELECT id, nome, quantidade FROM produtos WHERE quantidade < 0").fetchall()
+    conn.close()
+    return negativos
+
+
+def imprimir_relatorio(resultado, tempo_total, negativos):
+    print(f"\n{'operação':<10}{'n':>8}{'ops/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    total_ops = 0
+    for op in OPERACOES:
+        lat = sorted(resultado["latencias"][op])
+        if not lat:
+            continue
+        total_ops += len(lat)
+        print(f"{op:<10}{len(lat):>8}{len(lat) / tempo_total:>10.1f}"
+              f"{percentil(lat, 50) * 1000:>10.2f}{percentil(lat, 95) * 1000:>10.2f}"
+              f"{percentil(lat, 99) * 1000:>10.2f}{lat[-1] * 1000:>10.2f}")
+    print(f"\nThroughput total: {total_ops / tempo_total:.1f} ops/s em {tempo_total:.1f}s")
+    print(f"Erros 'database is locked': {resultado['locked']}")
+    print(f"Outros erros: {resultado['erros']}")
+    for exemplo in resultado["exemplos_erro"][:5]:
+        print(f"  - {exemplo}")
+    print(f"Produtos com quantidade negativa: {len(negativos)}")
+    for produto_id, nome, quantidade in negativos[:10]:
+        print(f"  - ID {produto_id} ({nome}): {quantidade}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default=os.path.join(ROOT_DIR, "data", "estoque.db"), help="Banco de origem (será copiado)")
+    parser.add_argument("--workers", type=int, default=8, help="Número de threads ou processos")
+    parser.add_argument("--threads-per-process", type=int, default=1, help="Threads por processo (modo process)")
+    parser.add_argument("--mode", choices=["thread", "process"], default="thread")
+    parser.add_argument("--duration", type=float, default=10.0, help="Duração em segundos")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX), help=f"Pesos das operações (padrão: {DEFAULT_MIX})")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--keep", action="store_true", help="Não apaga a cópia temporária do banco")
+    parser.add_argument("--verbose", action="store_true", help="Mostra o log de consultas lentas")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logging.getLogger("utils.instrumentation").setLevel(logging.ERROR)
+
+    tmp_dir = tempfile.mkdtemp(prefix="estoque_carga_")
+    db_path = os.path.join(tmp_dir, "estoque.db")
+    # backup() em vez de copiar o arquivo: no modo WAL parte dos dados confirmados ainda está no -wal
+    origem = sqlite3.connect(pathlib.Path(args.db).resolve().as_uri() + "?mode=ro", uri=True)
+    copia = sqlite3.connect(db_path)
+    origem.backup(copia)
+    copia.close()
+    origem.close()
+    # Precisa ser definido antes de importar utils.database (também herdado pelos processos filhos)
+    os.environ["ESTOQUE_DB_PATH"] = db_path
+
+    conn = sqlite3.connect(db_path)
+    ids = [row[0] for row in conn.execute("SELECT id FROM produtos")]
+    conn.close()
+    if not ids:
+        print("O banco de origem não tem produtos.")
+        return 1
+
+    print(f"Banco temporário: {db_path}")
+    print(f"Modo: {args.mode} | workers: {args.workers} | duração: {args.duration}s | mix: {args.mix}")
+
+    inicio = time.perf_counter()
+    if args.mode == "thread":
+        with ThreadPoolExecutor(max_workers=args.workers) as pool:
+            futuros = [pool.submit(_executar, args.mix, args.duration, args.seed + i, ids) for i in range(args.workers)]
+            resultado = _juntar([f.result() for f in futuros])
+    else:
+        tarefas = [(args.mix, args.duration, args.seed + i, ids, args.threads_per_process) for i in range(args.workers)]
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            resultado = _juntar(list(pool.map(_worker_processo, tarefas)))
+    tempo_total = time.perf_counter() - inicio
+
+    imprimir_relatorio(resultado, tempo_total, verificar_invariantes(db_path))
+
+    if args.keep:
+        print(f"\nCópia mantida em {db_path}")
+    else:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,52 @@
+"""Recalcula a previsão de demanda e mostra os produtos que devem acabar antes do próximo pedido.
+
+A página "Previsão de Reposição" já agenda o recálculo em segundo plano quando as previsões
+estão desatualizadas; este script permite fazê-lo pelo agendador do sistema (cron), por
+exemplo logo após a fotografia diária do estoque.
+
+Exemplos:
+    python scripts/previsao_demanda.py
+    python scripts/previsao_demanda.py --ciclo 30 --top 50
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default=os.path.join(ROOT_DIR, "data", "estoque.db"))
+    parser.add_argument("--ciclo", type=int, help="Dias até o próximo pedido (padrão: ESTOQUE_CICLO_PEDIDO_DIAS)")
+    parser.add_argument("--seguranca", type=int, help="Estoque de segurança em dias (padrão: ESTOQUE_SEGURANCA_DIAS)")
+    parser.add_argument("--top", type=int, default=20, help="Quantos produtos listar")
+    args = parser.parse_args()
+    logging.getLogger("utils.instrumentation").setLevel(logging.ERROR)
+
+    # Precisa ser definido antes de importar utils.database
+    os.environ["ESTOQUE_DB_PATH"] = args.db
+    from utils import previsao
+
+    ciclo = args.ciclo if args.ciclo is not None else previsao.CICLO_PEDIDO_DIAS
+    seguranca = args.seguranca if args.seguranca is not None else previsao.SEGURANCA_DIAS
+
+    inicio = time.perf_counter()
+    com_demanda = previsao.recalcular_previsoes()
+    print(f"Previsões recalculadas: {com_demanda} produtos com vendas ({(time.perf_counter() - inicio) * 1000:.0f} ms)")
+
+    previsoes, _ = previsao.get_previsoes(ciclo, seguranca)
+    em_risco = [p for p in previsoes if p["dias_ate_ruptura"] is not None and p["dias_ate_ruptura"] < ciclo]
+    print(f"{len(em_risco)} produto(s) devem acabar nos próximos {ciclo} dias:\n")
+    for p in em_risco[:args.top]:
+        print(f"  {p['nome'][:40]:<42}{p['marca'] or '-':<16}estoque {p['quantidade']:>4}  "
+              f"{p['demanda_diaria']:5.2f} un./dia  acaba em {p['dias_ate_ruptura']:5.1f} dias  "
+              f"comprar {p['sugestao']:>4}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,53 @@
+"""Grava a fotografia diária do estoque (quantidade e preço de cada produto) para o histórico.
+
+Feito para rodar uma vez por dia pelo agendador do sistema (cron / Agendador de Tarefas).
+A aplicação também cria a fotografia do dia ao ser aberta, caso ela ainda não exista.
+
+Exemplos:
+    python scripts/snapshot_estoque.py
+    python scripts/snapshot_estoque.py --valor-em 2025-01-31 --agrupar-por marca
+
+    # crontab: todo dia às 23:55
+    55 23 * * * cd /caminho/do/projeto && python scripts/snapshot_estoque.py
+"""
+import argparse
+import logging
+import os
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default=os.path.join(ROOT_DIR, "data", "estoque.db"))
+    parser.add_argument("--data", help="Data gravada na fotografia (AAAA-MM-DD, padrão: hoje)")
+    parser.add_argument("--valor-em", metavar="DATA", help="Só consulta o valor em estoque na data (não grava)")
+    parser.add_argument("--agrupar-por", choices=["marca", "estilo", "tipo"], help="Detalha o valor por categoria")
+    args = parser.parse_args()
+    logging.getLogger("utils.instrumentation").setLevel(logging.ERROR)
+
+    # Precisa ser definido antes de importar utils.database
+    os.environ["ESTOQUE_DB_PATH"] = args.db
+    from utils import database as db
+
+    if args.valor_em:
+        resultado = db.get_valor_estoque_em(args.valor_em, agrupar_por=args.agrupar_por)
+        if resultado is None:
+            print(f"Nenhuma fotografia do estoque até {args.valor_em}.")
+            return 1
+    else:
+        totais = db.criar_snapshot(args.data)
+        print(f"Fotografia de {totais['data']} gravada.")
+        resultado = db.get_valor_estoque_em(totais["data"], agrupar_por=args.agrupar_por)
+
+    print(f"Estoque em {resultado['data']}: {resultado['produtos']} produtos, "
+          f"{resultado['unidades']} unidades, R$ {resultado['valor']:,.2f}")
+    for g in resultado["grupos"]:
+        print(f"  {g['nome']:<35}{g['unidades']:>8} un.  R$ {g['valor']:>12,.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
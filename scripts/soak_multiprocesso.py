@@ -0,0 +1,217 @@
+"""Teste de resistência do modo com vários workers: N processos vendendo, repondo e lendo no mesmo banco.
+
+Simula vários processos do Streamlit (ou da API) atrás de um proxy reverso, cada um com o
+seu próprio cache, sobre uma cópia temporária do banco (o banco real não é alterado).
+Ao final verifica:
+  - nenhuma atualização perdida: para cada produto, quantidade final = inicial - vendas
+    confirmadas + reposições confirmadas pelos workers, e cada venda confirmada está em 'vendas';
+  - totais por local (mantidos por trigger) iguais à soma de estoque_local e nenhum estoque negativo;
+  - nenhum "database is locked" chegou ao código que chama utils.database;
+  - invalidação entre processos: os caches de usuários e facetas do processo principal,
+    preenchidos antes do teste, enxergam o que os workers gravaram.
+Termina com código 1 se alguma verificação falhar.
+
+Exemplos:
+    python scripts/soak_multiprocesso.py --processos 4 --duracao 30
+    python scripts/soak_multiprocesso.py --processos 8 --duracao 120 --busy-timeout-ms 2000
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import pathlib
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+
+# ====================================================================
+# WORKER (um processo, como um worker do Streamlit)
+# ====================================================================
+
+def _worker(args):
+    indice, duracao, semente, ids = args
+    logging.getLogger("utils.instrumentation").setLevel(logging.ERROR)
+    from utils import database as db
+
+    rnd = random.Random(semente)
+    vendidos, repostos = Counter(), Counter()
+    operacoes, erros = Counter(), []
+
+    # Escritas que os caches dos outros processos precisam enxergar
+    db.add_user(f"soak_{indice}", "senha-soak", "staff")
+    db.add_produto(f"Produto soak {indice}", 10.0, 0, "Natura", "Perfumaria", "Body splash")
+
+    fim = time.perf_counter() + duracao
+    while time.perf_counter() < fim:
+        produto_id = rnd.choice(ids)
+        sorteio = rnd.random()
+        try:
+            if sorteio < 0.35:
+                # Como na interface: lê o produto e só vende se houver estoque (a baixa confere de novo)
+                produto = db.get_produto_by_id(produto_id)
+                if produto and produto["quantidade"] > 0 and db.mark_produto_as_sold(produto_id, 1):
+                    vendidos[produto_id] += 1
+                operacao = "venda"
+            elif sorteio < 0.50:
+                unidades = rnd.randint(1, 3)
+                if db.restock(produto_id, unidades):
+                    repostos[produto_id] += unidades
+                operacao = "reposicao"
+            elif sorteio < 0.70:
+                db.listar_produtos(rnd.randint(1, 5), 20)
+                operacao = "listagem"
+            elif sorteio < 0.85:
+                db.get_facetas()
+                operacao = "facetas"
+            else:
+                db.get_totais_estoque()
+                operacao = "totais"
+        except Exception as e:
+            erros.append(f"{type(e).__name__}: {e}")
+            continue
+        operacoes[operacao] += 1
+    return {"vendidos": vendidos, "repostos": repostos, "operacoes": operacoes, "erros": erros}
+
+
+# ====================================================================
+# VERIFICAÇÕES
+# ====================================================================
+
+def verificar(db, permissions, db_path, iniciais, ultima_venda_id, resultados, processos):
+    falhas = []
+    vendidos, repostos = Counter(), Counter()
+    for r in resultados:
+        vendidos.update(r["vendidos"])
+        repostos.update(r["repostos"])
+
+    conn = sqlite3.connect(db_path)
+    finais = dict(conn.execute("SELECT id, quantidade FROM produtos"))
+    registradas = Counter(dict(conn.execute(
+        "SELECT produto_id, SUM(quantidade) FROM vendas WHERE id > ? GROUP BY produto_id", (ultima_venda_id,)
+    )))
+    locais = conn.execute(
+        """
+        SELECT l.nome, l.unidades, (SELECT COALESCE(SUM(quantidade), 0) FROM estoque_local e WHERE e.local_id = l.id)
+        FROM locais l
+        """
+    ).fetchall()
+    negativos = conn.execute("SELECT COUNT(*) FROM produtos WHERE quantidade < 0").fetchone()[0]
+    conn.close()
+
+    perdidas = [
+        (pid, esperado, finais.get(pid))
+        for pid, esperado in ((pid, qtd - vendidos[pid] + repostos[pid]) for pid, qtd in iniciais.items())
+        if finais.get(pid) != esperado
+    ]
+    if perdidas:
+        falhas.append(f"{len(perdidas)} produto(s) com atualização perdida, ex.: {perdidas[:5]} (id, esperado, final)")
+    if registradas != vendidos:
+        falhas.append(f"vendas registradas ({sum(registradas.values())}) != vendas confirmadas ({sum(vendidos.values())})")
+    for nome, unidades, soma in locais:
+        if unidades != soma:
+            falhas.append(f"total do local '{nome}' = {unidades}, soma de estoque_local = {soma}")
+    if negativos:
+        falhas.append(f"{negativos} produto(s) com estoque negativo")
+
+    usuarios = {u["username"] for u in permissions.list_users()}
+    faltando = [f"soak_{i}" for i in range(processos) if f"soak_{i}" not in usuarios]
+    if faltando:
+        falhas.append(f"cache de usuários desatualizado: faltam {faltando}")
+    if db.get_facetas() != db._calcular_facetas(None, {"marca": None, "estilo": None, "tipo": None}):
+        falhas.append("cache de facetas desatualizado")
+
+    erros = [e for r in resultados for e in r["erros"]]
+    bloqueios = sum("locked" in e or "busy" in e for e in erros)
+    if bloqueios:
+        falhas.append(f"{bloqueios} erro(s) de banco bloqueado chegaram ao chamador")
+    if len(erros) > bloqueios:
+        falhas.append(f"{len(erros) - bloqueios} outro(s) erro(s), ex.: {[e for e in erros if 'locked' not in e][:3]}")
+    return falhas, vendidos, repostos
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default=os.path.join(ROOT_DIR, "data", "estoque.db"), help="Banco de origem (será copiado)")
+    parser.add_argument("--processos", type=int, default=4, help="Número de processos (workers)")
+    parser.add_argument("--duracao", type=float, default=20.0, help="Duração em segundos")
+    parser.add_argument("--produtos", type=int, default=30, help="Quantos produtos disputar (menos = mais conflitos)")
+    parser.add_argument("--busy-timeout-ms", type=int, help="Sobrescreve ESTOQUE_BUSY_TIMEOUT_MS")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--keep", action="store_true", help="Não apaga a cópia temporária do banco")
+    args = parser.parse_args()
+    logging.getLogger("utils.instrumentation").setLevel(logging.ERROR)
+
+    tmp_dir = tempfile.mkdtemp(prefix="estoque_soak_")
+    db_path = os.path.join(tmp_dir, "estoque.db")
+    # backup() em vez de copiar o arquivo: no modo WAL parte dos dados confirmados ainda está no -wal
+    origem = sqlite3.connect(pathlib.Path(args.db).resolve().as_uri() + "?mode=ro", uri=True)
+    copia = sqlite3.connect(db_path)
+    origem.backup(copia)
+    copia.close()
+    origem.close()
+    # Precisam ser definidos antes de importar utils.database (também herdados pelos processos filhos)
+    os.environ["ESTOQUE_DB_PATH"] = db_path
+    os.environ["ESTOQUE_SECRET_KEY_FILE"] = os.path.join(tmp_dir, "secret.key")
+    if args.busy_timeout_ms is not None:
+        os.environ["ESTOQUE_BUSY_TIMEOUT_MS"] = str(args.busy_timeout_ms)
+    from utils import database as db
+    from utils import permissions
+
+    rnd = random.Random(args.seed)
+    ativos = [p["id"] for p in db.get_all_produtos()]
+    ids = rnd.sample(ativos, min(args.produtos, len(ativos)))
+    if not ids:
+        print("O banco de origem não tem produtos.")
+        return 1
+    iniciais = {p["id"]: p["quantidade"] for p in db.get_all_produtos() if p["id"] in ids}
+    ultima_venda_id = db.get_ultima_venda_id()
+    # Caches do processo principal preenchidos antes: precisam ser invalidados pelas escritas dos workers
+    permissions.list_users()
+    db.get_facetas()
+
+    print(f"Banco temporário: {db_path}")
+    print(f"{args.processos} processo(s), {len(ids)} produto(s) disputado(s), {args.duracao:.0f}s, "
+          f"busy timeout {db.BUSY_TIMEOUT_MS} ms, {db.TENTATIVAS_ESCRITA} tentativa(s)")
+
+    inicio = time.perf_counter()
+    tarefas = [(i, args.duracao, args.seed + i, ids) for i in range(args.processos)]
+    # spawn: processos independentes, como workers iniciados separadamente
+    with ProcessPoolExecutor(max_workers=args.processos, mp_context=multiprocessing.get_context("spawn")) as pool:
+        resultados = list(pool.map(_worker, tarefas))
+    tempo_total = time.perf_counter() - inicio
+
+    falhas, vendidos, repostos = verificar(
+        db, permissions, db_path, iniciais, ultima_venda_id, resultados, args.processos
+    )
+    operacoes = Counter()
+    for r in resultados:
+        operacoes.update(r["operacoes"])
+    print(f"\n{sum(operacoes.values())} operações em {tempo_total:.1f}s ({sum(operacoes.values()) / tempo_total:.0f} ops/s): "
+          + ", ".join(f"{nome} {n}" for nome, n in sorted(operacoes.items())))
+    print(f"Unidades vendidas: {sum(vendidos.values())} | repostas: {sum(repostos.values())}")
+
+    if falhas:
+        print("\nFALHOU:")
+        for falha in falhas:
+            print(f"  - {falha}")
+    else:
+        print("\nOK: nenhuma atualização perdida, totais consistentes e caches invalidados entre processos.")
+
+    if args.keep:
+        print(f"\nCópia mantida em {db_path}")
+    else:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return 1 if falhas else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,59 @@
+"""Procura (e opcionalmente corrige) produtos e estoques que violam as regras de integridade.
+
+Regras (as mesmas dos formulários, do chatbot, da importação e dos triggers do banco):
+nome preenchido, preço maior que zero, quantidade inteira não negativa (no produto e em
+cada local) e datas válidas. Com --reparar: estoque negativo vira 0, datas em outro formato
+são convertidas para AAAA-MM-DD (ilegíveis são apagadas) e preço em texto vira número.
+Nome vazio e preço zero são só listados, para correção em "Gerenciar Produtos".
+
+A correção já roda sozinha uma vez, quando o banco recebe as regras; use este script depois
+de alterar o banco por fora da aplicação. Termina com código 1 se restar algo para corrigir.
+
+Exemplos:
+    python scripts/verificar_integridade.py
+    python scripts/verificar_integridade.py --reparar
+"""
+import argparse
+import logging
+import os
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default=os.path.join(ROOT_DIR, "data", "estoque.db"))
+    parser.add_argument("--reparar", action="store_true", help="Corrige o que tem correção segura")
+    args = parser.parse_args()
+    logging.getLogger("utils.instrumentation").setLevel(logging.ERROR)
+
+    # Precisa ser definido antes de importar utils.database
+    os.environ["ESTOQUE_DB_PATH"] = args.db
+    from utils import database as db
+
+    invalidos = db.verificar_integridade(reparar=args.reparar)
+    if not invalidos:
+        print("Nenhum problema encontrado.")
+        return 0
+
+    for item in invalidos:
+        linha = f"produto {item['id']}" + (f", local {item['local_id']}" if item["local_id"] is not None else "")
+        if not item["reparavel"]:
+            acao = "corrigir manualmente"
+        else:
+            acao = f"{'corrigido' if args.reparar else 'correção'}: {item['correcao']!r}"
+        print(f"  {linha:<24}{item['campo']:<20}{item['valor']!r:<30}{acao}")
+
+    manuais = sum(not item["reparavel"] for item in invalidos)
+    reparaveis = len(invalidos) - manuais
+    if args.reparar:
+        print(f"\n{reparaveis} valor(es) corrigido(s), {manuais} para corrigir manualmente.")
+    else:
+        print(f"\n{len(invalidos)} problema(s): {reparaveis} com correção automática (use --reparar), {manuais} manual(is).")
+    return 1 if manuais or not args.reparar else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,14 @@
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+# Precisa ser definido antes de importar utils.database: os testes nunca usam data/estoque.db
+if "ESTOQUE_DB_PATH" not in os.environ:
+    _tmp_dir = tempfile.mkdtemp(prefix="estoque_testes_")
+    atexit.register(shutil.rmtree, _tmp_dir, ignore_errors=True)
+    os.environ["ESTOQUE_DB_PATH"] = os.path.join(_tmp_dir, "estoque.db")
@@ -0,0 +1,45 @@
+import hashlib
+import os
+import subprocess
+import sys
+
+from conftest import ROOT_DIR
+
+SCRIPT = os.path.join(ROOT_DIR, "scripts", "compact_storage.py")
+
+
+def test_apply_mantem_logo_e_remove_upload_orfao(tmp_path):
+    assets = tmp_path / "assets"
+    assets.mkdir()
+    (assets / "logo.png").write_bytes(b"logo")
+    (assets / "logo").write_bytes(b"logo")
+    (assets / "1757789413_foto.jpg").write_bytes(b"foto sem produto")
+
+    resultado = subprocess.run(
+        [sys.executable, SCRIPT, "--db", str(tmp_path / "estoque.db"), "--assets", str(assets),
+         "--miniaturas", str(tmp_path / "miniaturas"), "--apply", "--min-age", "0", "--no-vacuum", "--workers", "1"],
+        capture_output=True, text=True, cwd=tmp_path,
+    )
+
+    assert resultado.returncode == 0, resultado.stderr
+    assert sorted(os.listdir(assets)) == ["logo", "logo.png"]
+
+
+def test_apply_remove_miniaturas_de_versoes_antigas(tmp_path):
+    assets = tmp_path / "assets"
+    assets.mkdir()
+    (assets / "logo.png").write_bytes(b"logo")
+    miniaturas = tmp_path / "miniaturas"
+    miniaturas.mkdir()
+    atual = hashlib.sha256(b"logo").hexdigest()[:16]
+    (miniaturas / f"{atual}_240.jpg").write_bytes(b"atual")
+    (miniaturas / "0123456789abcdef_240.jpg").write_bytes(b"antiga")
+
+    resultado = subprocess.run(
+        [sys.executable, SCRIPT, "--db", str(tmp_path / "estoque.db"), "--assets", str(assets),
+         "--miniaturas", str(miniaturas), "--apply", "--min-age", "0", "--no-vacuum", "--workers", "1"],
+        capture_output=True, text=True, cwd=tmp_path,
+    )
+
+    assert resultado.returncode == 0, resultado.stderr
+    assert os.listdir(miniaturas) == [f"{atual}_240.jpg"]
@@ -0,0 +1,81 @@
+import pytest
+
+from utils import database as db
+
+
+def _pragma(nome):
+    conn = db.get_db_connection()
+    try:
+        return conn.execute(f"PRAGMA {nome}").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_create_tables_nao_altera_esquema_ja_migrado():
+    db.create_tables()
+    antes = _pragma("schema_version")
+    db.create_tables()
+    assert _pragma("schema_version") == antes
+    assert _pragma("user_version") == db.VERSAO_ESQUEMA
+
+
+def _novo_produto(codigo, quantidade):
+    db.add_produto(f"Produto {codigo}", 10.0, quantidade, None, None, None, codigo_barras=codigo)
+    return db.get_produto_by_codigo(codigo)["id"]
+
+
+def _estoque(produto_id):
+    return {e["local_id"]: e["quantidade"] for e in db.get_estoque_por_local(produto_id)}
+
+
+def test_transfer_para_local_inexistente_nao_move_estoque():
+    produto_id = _novo_produto("T-LOCAL", 3)
+
+    with pytest.raises(ValueError):
+        db.transfer_estoque(produto_id, db.LOCAL_PADRAO_ID, 999, 1)
+
+    assert _estoque(produto_id)[db.LOCAL_PADRAO_ID] == 3
+    assert 999 not in _estoque(produto_id)
+
+
+def test_transfer_de_produto_arquivado_e_recusada():
+    produto_id = _novo_produto("T-ARQ", 0)
+    assert db.arquivar_produto(produto_id)
+
+    assert db.transfer_estoque(produto_id, db.LOCAL_PADRAO_ID, 2, 1) is False
+
+
+def test_restock_em_local_inexistente_e_recusado():
+    produto_id = _novo_produto("R-LOCAL", 0)
+
+    with pytest.raises(ValueError):
+        db.restock(produto_id, 5, local_id=999)
+
+    assert sum(_estoque(produto_id).values()) == 0
+
+
+def test_restock_de_produto_arquivado_e_recusado():
+    produto_id = _novo_produto("R-ARQ", 0)
+    assert db.arquivar_produto(produto_id)
+
+    assert db.restock(produto_id, 5) is False
+    assert sum(_estoque(produto_id).values()) == 0
+
+
+def test_importacao_nao_cadastra_categorias_de_linhas_recusadas(tmp_path):
+    _novo_produto("CSV-DUP", 1)
+    csv_path = tmp_path / "produtos.csv"
+    csv_path.write_text(
+        "nome,preco,quantidade,marca,codigo_barras\n"
+        "Preço inválido,abc,1,Marca Inválida,\n"
+        "Código repetido,10,1,Marca Repetida,CSV-DUP\n"
+        "Válido,10,1,Marca Válida,CSV-NOVO\n",
+        encoding="utf-8",
+    )
+
+    assert db.import_produtos_from_csv(str(csv_path)) == 1
+
+    marcas = db.get_nomes_categoria("marca")
+    assert "Marca Válida" in marcas
+    assert "Marca Inválida" not in marcas
+    assert "Marca Repetida" not in marcas
@@ -0,0 +1,25 @@
+import zipfile
+
+from utils.relatorios import codigo128_valido, gerar_relatorios
+
+
+def _produto(nome, codigo):
+    return {"nome": nome, "preco": 10.0, "quantidade": 1, "marca": "Marca", "estilo": "Estilo",
+            "tipo": "Tipo", "data_validade": None, "codigo_barras": codigo}
+
+
+def test_codigo_com_acento_nao_e_code128():
+    assert codigo128_valido("7891234567890")
+    assert not codigo128_valido("AÇÃO-01")
+    assert not codigo128_valido("")
+
+
+def test_etiqueta_com_codigo_acentuado_nao_derruba_o_zip(tmp_path):
+    destino = tmp_path / "relatorios.zip"
+    produtos = [_produto("Batom", "7891234567890"), _produto("Perfume", "AÇÃO-01")]
+
+    resumo = gerar_relatorios(str(destino), tipos=("codigos",), produtos=produtos, processos=1)
+
+    assert resumo["documentos"] == 1
+    with zipfile.ZipFile(destino) as zf:
+        assert zf.namelist() == ["codigos/marca.pdf"]
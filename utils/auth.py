@@ -0,0 +1,174 @@
+import base64
+import hashlib
+import hmac
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+
+# ====================================================================
+# CONFIGURAÇÃO DO KDF (scrypt) E DO TOKEN DE SESSÃO
+# ====================================================================
+
+# Custo do scrypt (ajustável por ambiente). n=2**14, r=8 usa ~16 MB e ~50 ms por verificação.
+SCRYPT_N = int(os.environ.get("ESTOQUE_SCRYPT_N", 2 ** 14))
+SCRYPT_R = int(os.environ.get("ESTOQUE_SCRYPT_R", 8))
+SCRYPT_P = int(os.environ.get("ESTOQUE_SCRYPT_P", 1))
+SALT_BYTES = 16
+KEY_BYTES = 32
+
+# Limita quantas verificações rodam ao mesmo tempo (cada uma reserva memória do scrypt).
+# O scrypt libera o GIL, então as outras sessões do Streamlit continuam respondendo.
+AUTH_WORKERS = int(os.environ.get("ESTOQUE_AUTH_WORKERS", 4))
+
+SESSION_TTL_SECONDS = int(os.environ.get("ESTOQUE_SESSION_TTL", 12 * 60 * 60))
+SECRET_KEY_FILE = os.environ.get("ESTOQUE_SECRET_KEY_FILE", os.path.join("data", "secret.key"))
+
+_LEGACY_SHA256 = re.compile(r"^[0-9a-f]{64}$")
+_verificacoes = threading.BoundedSemaphore(AUTH_WORKERS)
+_secret_key = None
+
+
+# ====================================================================
+# HASH E VERIFICAÇÃO DE SENHAS
+# ====================================================================
+
+def _scrypt(password, salt, n, r, p):
+    # maxmem precisa cobrir 128 * n * r bytes (+ folga), senão o OpenSSL recusa custos maiores
+    return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p,
+                          maxmem=256 * n * r + 1024 * 1024, dklen=KEY_BYTES)
+
+
+def hash_password(password):
+    """Gera o hash da senha no formato 'scrypt$n$r$p$salt$hash' (salt aleatório)."""
+    salt = os.urandom(SALT_BYTES)
+    chave = _scrypt(password, salt, SCRYPT_N, SCRYPT_R, SCRYPT_P)
+    return f"scrypt${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}${salt.hex()}${chave.hex()}"
+
+
+def is_legacy_hash(stored):
+    """Indica se o hash armazenado é o SHA256 sem salt usado nas versões antigas."""
+    return bool(stored) and bool(_LEGACY_SHA256.match(stored))
+
+
+def needs_rehash(stored):
+    """Indica se o hash deve ser regerado (formato antigo ou custo diferente do atual)."""
+    if is_legacy_hash(stored):
+        return True
+    try:
+        _, n, r, p, _, _ = stored.split("$")
+        return (int(n), int(r), int(p)) != (SCRYPT_N, SCRYPT_R, SCRYPT_P)
+    except (ValueError, AttributeError):
+        return True
+
+
+def verify_password(password, stored):
+    """Confere a senha contra o hash armazenado (scrypt ou SHA256 legado), em tempo constante."""
+    if not stored:
+        return False
+    if is_legacy_hash(stored):
+        return hmac.compare_digest(hashlib.sha256(password.encode()).hexdigest(), stored)
+    try:
+        algoritmo, n, r, p, salt, chave = stored.split("$")
+        if algoritmo != "scrypt":
+            return False
+        calculada = _scrypt(password, bytes.fromhex(salt), int(n), int(r), int(p))
+    except ValueError:
+        return False
+    return hmac.compare_digest(calculada.hex(), chave)
+
+
+def verify_user_password(user, password):
+    """Verifica a senha de um usuário (dict de get_user).
+
+    Síncrona: quem chama espera o scrypt (~50 ms; a página de login mostra um spinner).
+    No máximo AUTH_WORKERS verificações rodam ao mesmo tempo; as demais esperam a vez.
+    Em caso de sucesso com hash legado (ou custo desatualizado), grava o novo hash scrypt.
+    """
+    if not user:
+        return False
+    with _verificacoes:
+        if not verify_password(password, user.get("password")):
+            return False
+        novo = hash_password(password) if needs_rehash(user.get("password")) else None
+    if novo:
+        from utils.database import update_user_password
+        update_user_password(user["username"], novo)
+    return True
+
+
+# ====================================================================
+# TOKEN DE SESSÃO ASSINADO (HMAC-SHA256)
+# ====================================================================
+
+def _get_secret_key():
+    global _secret_key
+    if _secret_key is None:
+        env = os.environ.get("ESTOQUE_SECRET_KEY")
+        if env:
+            _secret_key = env.encode()
+        elif os.path.exists(SECRET_KEY_FILE):
+            with open(SECRET_KEY_FILE, "rb") as f:
+                _secret_key = f.read()
+        else:
+            _secret_key = _criar_secret_key()
+    return _secret_key
+
+
+def _criar_secret_key():
+    """Grava uma chave nova em SECRET_KEY_FILE; se outro processo gravou antes, usa a dele.
+
+    A chave é escrita num arquivo temporário e publicada com os.link (atômico e falha se o
+    arquivo já existir), então vários workers iniciando juntos acabam com a mesma chave.
+    """
+    diretorio = os.path.dirname(SECRET_KEY_FILE) or "."
+    os.makedirs(diretorio, exist_ok=True)
+    chave = os.urandom(32)
+    fd, tmp = tempfile.mkstemp(dir=diretorio, prefix=".secret-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(chave)
+        os.link(tmp, SECRET_KEY_FILE)
+    except FileExistsError:
+        with open(SECRET_KEY_FILE, "rb") as f:
+            chave = f.read()
+    finally:
+        os.remove(tmp)
+    return chave
+
+
+def _b64(data):
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def _unb64(texto):
+    return base64.urlsafe_b64decode(texto + "=" * (-len(texto) % 4))
+
+
+def issue_session_token(username, role, ttl=SESSION_TTL_SECONDS):
+    """Emite um token assinado com usuário, papel e validade."""
+    payload = _b64(json.dumps({"u": username, "r": role, "exp": int(time.time()) + ttl}).encode())
+    assinatura = _b64(hmac.new(_get_secret_key(), payload.encode(), hashlib.sha256).digest())
+    return f"{payload}.{assinatura}"
+
+
+def read_session_token(token):
+    """Valida o token (assinatura e validade) e retorna {'username', 'role'} ou None.
+
+    Custa apenas um HMAC, então pode ser chamado a cada rerun sem refazer o hash da senha.
+    """
+    if not token or "." not in token:
+        return None
+    payload, assinatura = token.rsplit(".", 1)
+    esperada = _b64(hmac.new(_get_secret_key(), payload.encode(), hashlib.sha256).digest())
+    if not hmac.compare_digest(esperada, assinatura):
+        return None
+    try:
+        dados = json.loads(_unb64(payload))
+    except ValueError:
+        return None
+    if dados.get("exp", 0) < time.time():
+        return None
+    return {"username": dados.get("u"), "role": dados.get("r")}
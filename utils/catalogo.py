@@ -0,0 +1,254 @@
+import hashlib
+import html
+import json
+import os
+import re
+import shutil
+import tempfile
+import unicodedata
+from urllib.parse import quote
+
+from utils.database import ASSETS_DIR, get_all_produtos, get_versao_produtos
+from utils.images import para_jpeg
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Sem Pillow as fotos são copiadas sem reduzir
+    Image = None
+
+# ====================================================================
+# CONFIGURAÇÃO
+# ====================================================================
+
+CATALOGO_DIR = os.environ.get("ESTOQUE_CATALOGO_DIR", "catalogo")
+POR_PAGINA = 24
+MINIATURA_PX = 320
+MANIFESTO = ".manifesto.json"
+# Mude ao alterar o HTML/CSS gerado: força a reconstrução de todas as páginas
+VERSAO_MODELO = 1
+
+CSS = """\
+body { font-family: system-ui, sans-serif; margin: 0; background: #fdf6f9; color: #333; }
+header { background: #c2185b; color: #fff; padding: 1rem 1.5rem; }
+header a { color: #fff; }
+main { max-width: 1100px; margin: 0 auto; padding: 1rem; }
+.grade { display: grid; grid-template-columns: repeat(auto-fill, minmax(200px, 1fr)); gap: 1rem; }
+.produto { background: #fff; border-radius: 8px; padding: .75rem; box-shadow: 0 1px 3px rgba(0,0,0,.1); }
+.produto img { width: 100%; aspect-ratio: 1; object-fit: contain; background: #fafafa; }
+.produto h2 { font-size: 1rem; margin: .5rem 0 .25rem; }
+.preco { font-weight: bold; color: #c2185b; font-size: 1.1rem; }
+.detalhes { font-size: .85rem; color: #777; }
+nav.paginas { margin: 1.5rem 0; display: flex; gap: .5rem; flex-wrap: wrap; }
+nav.paginas a, nav.paginas span { padding: .25rem .6rem; border-radius: 4px; background: #fff; }
+nav.paginas span { background: #c2185b; color: #fff; }
+ul.marcas { list-style: none; padding: 0; display: grid; grid-template-columns: repeat(auto-fill, minmax(220px, 1fr)); gap: .75rem; }
+ul.marcas a { display: block; background: #fff; padding: 1rem; border-radius: 8px; text-decoration: none; color: inherit; }
+"""
+
+
+# ====================================================================
+# AUXILIARES
+# ====================================================================
+
+def _slug(texto):
+    texto = unicodedata.normalize("NFKD", texto or "sem-marca").encode("ascii", "ignore").decode()
+    return re.sub(r"[^a-z0-9]+", "-", texto.lower()).strip("-") or "sem-marca"
+
+
+def _preco(valor):
+    return "R$ " + f"{valor:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
+
+
+def _escrever(caminho, conteudo):
+    """Grava via arquivo temporário + os.replace: o servidor nunca entrega uma página pela metade."""
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(caminho), prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(conteudo.encode("utf-8") if isinstance(conteudo, str) else conteudo)
+        # mkstemp cria com 0600; o catálogo é servido por outro processo (servidor estático)
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, caminho)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def _hash(dados):
+    return hashlib.sha256(json.dumps(dados, sort_keys=True, ensure_ascii=False).encode()).hexdigest()
+
+
+def _ler_manifesto(destino):
+    try:
+        with open(os.path.join(destino, MANIFESTO), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+# ====================================================================
+# MINIATURAS
+# ====================================================================
+
+def _miniatura(foto, destino):
+    """Gera a miniatura da foto se ela faltar ou estiver desatualizada.
+
+    Retorna (caminho relativo ou None, True se a miniatura foi gerada agora).
+    """
+    origem = os.path.join(ASSETS_DIR, foto)
+    if not os.path.isfile(origem):
+        return None, False
+    nome = os.path.splitext(foto)[0] + (".jpg" if Image is not None else os.path.splitext(foto)[1])
+    relativo = "fotos/" + nome
+    caminho = os.path.join(destino, "fotos", nome)
+    if os.path.exists(caminho) and os.path.getmtime(caminho) >= os.path.getmtime(origem):
+        return relativo, False
+
+    if Image is None:
+        shutil.copy2(origem, caminho)
+        return relativo, True
+    try:
+        with Image.open(origem) as img:
+            img = ImageOps.exif_transpose(img)
+            img.thumbnail((MINIATURA_PX, MINIATURA_PX))
+            img = para_jpeg(img)
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(caminho), prefix=".tmp-", suffix=".jpg")
+            os.close(fd)
+            img.save(tmp, "JPEG", quality=80, optimize=True)
+            os.chmod(tmp, 0o644)
+            os.replace(tmp, caminho)
+    except OSError:
+        return None, False
+    return relativo, True
+
+
+# ====================================================================
+# RENDERIZAÇÃO
+# ====================================================================
+
+def _layout(titulo, corpo):
+    return (
+        "<!DOCTYPE html>\n<html lang=\"pt-BR\">\n<head>\n<meta charset=\"utf-8\">\n"
+        "<meta name=\"viewport\" content=\"width=device-width, initial-scale=1\">\n"
+        f"<title>{html.escape(titulo)} - Cores e Fragrâncias</title>\n"
+        "<link rel=\"stylesheet\" href=\"catalogo.css\">\n</head>\n<body>\n"
+        "<header><a href=\"index.html\"><strong>Cores e Fragrâncias by Berenice</strong></a> · Catálogo</header>\n"
+        f"<main>\n{corpo}\n</main>\n</body>\n</html>\n"
+    )
+
+
+def _html_pagina(marca, numero, total_paginas, itens, slug):
+    cartoes = []
+    for p in itens:
+        foto = f"<img src=\"{html.escape(quote(p['foto']))}\" alt=\"\" loading=\"lazy\">" if p["foto"] else ""
+        detalhes = " · ".join(html.escape(v) for v in (p["estilo"], p["tipo"]) if v)
+        cartoes.append(
+            f"<article class=\"produto\">{foto}<h2>{html.escape(p['nome'])}</h2>"
+            f"<div class=\"preco\">{_preco(p['preco'])}</div><div class=\"detalhes\">{detalhes}</div></article>"
+        )
+    links = "".join(
+        f"<span>{n}</span>" if n == numero else f"<a href=\"{slug}-{n}.html\">{n}</a>"
+        for n in range(1, total_paginas + 1)
+    )
+    corpo = (
+        f"<h1>{html.escape(marca)}</h1>\n<div class=\"grade\">\n" + "\n".join(cartoes) + "\n</div>\n"
+        + (f"<nav class=\"paginas\">{links}</nav>" if total_paginas > 1 else "")
+    )
+    return _layout(f"{marca} - página {numero}", corpo)
+
+
+def _html_indice(marcas):
+    itens = "".join(
+        f"<li><a href=\"{m['arquivo']}\"><strong>{html.escape(m['marca'])}</strong><br>{m['produtos']} produto(s)</a></li>"
+        for m in marcas
+    )
+    return _layout("Catálogo", f"<h1>Catálogo de produtos</h1>\n<ul class=\"marcas\">{itens}</ul>")
+
+
+# ====================================================================
+# GERAÇÃO INCREMENTAL
+# ====================================================================
+
+def gerar_catalogo(destino=CATALOGO_DIR, por_pagina=POR_PAGINA, forcar=False):
+    """Gera o catálogo estático (HTML + JSON) dos produtos com estoque, paginado por marca.
+
+    Incremental: se a versão dos produtos não mudou desde a última geração, nada é lido;
+    caso contrário, só são regravadas as páginas cujo conteúdo mudou (comparando o hash
+    dos dados de cada página com o manifesto) e as páginas que deixaram de existir são
+    removidas. Cada marca é paginada separadamente, então um produto novo só desloca as
+    páginas da própria marca. Retorna o nº de arquivos {'gravadas', 'mantidas', 'removidas',
+    'miniaturas'}.
+    """
+    os.makedirs(os.path.join(destino, "fotos"), exist_ok=True)
+    manifesto = {} if forcar else _ler_manifesto(destino)
+    versao = list(get_versao_produtos())
+    modelo = [VERSAO_MODELO, por_pagina]
+    if manifesto.get("versao") == versao and manifesto.get("modelo") == modelo:
+        return {"gravadas": 0, "mantidas": len(manifesto.get("arquivos", {})), "removidas": 0, "miniaturas": 0}
+    anteriores = manifesto.get("arquivos", {})
+    if manifesto.get("modelo") != modelo:
+        # Modelo ou paginação diferentes: regrava tudo (mas ainda remove os arquivos antigos)
+        anteriores = dict.fromkeys(anteriores)
+
+    # Produtos com estoque agrupados por marca (get_all_produtos já vem ordenado por nome)
+    por_marca = {}
+    miniaturas = 0
+    for p in get_all_produtos():
+        if (p.get("quantidade") or 0) <= 0:
+            continue
+        foto = None
+        if p.get("foto"):
+            foto, gerada = _miniatura(p["foto"], destino)
+            miniaturas += gerada
+        por_marca.setdefault(p.get("marca") or "Sem marca", []).append({
+            "id": p["id"], "nome": (p.get("nome") or "").strip(), "preco": p["preco"],
+            "marca": p.get("marca"), "estilo": p.get("estilo"), "tipo": p.get("tipo"), "foto": foto,
+        })
+
+    # Conteúdo de cada arquivo: nome -> (dados para o hash, função que gera o texto)
+    arquivos = {}
+    indice = []
+    for marca in sorted(por_marca, key=str.casefold):
+        produtos = por_marca[marca]
+        slug = _slug(marca)
+        paginas = [produtos[i:i + por_pagina] for i in range(0, len(produtos), por_pagina)]
+        for numero, itens in enumerate(paginas, start=1):
+            dados = {"marca": marca, "pagina": numero, "paginas": len(paginas), "itens": itens}
+            arquivos[f"{slug}-{numero}.html"] = (
+                dados, lambda m=marca, n=numero, t=len(paginas), i=itens, s=slug: _html_pagina(m, n, t, i, s)
+            )
+            arquivos[f"{slug}-{numero}.json"] = (
+                dados, lambda d=dados: json.dumps(d, ensure_ascii=False, indent=1)
+            )
+        indice.append({
+            "marca": marca, "produtos": len(produtos), "paginas": len(paginas),
+            "arquivo": f"{slug}-1.html", "json": [f"{slug}-{n}.json" for n in range(1, len(paginas) + 1)],
+        })
+    arquivos["index.html"] = (indice, lambda: _html_indice(indice))
+    arquivos["index.json"] = (indice, lambda: json.dumps({"marcas": indice}, ensure_ascii=False, indent=1))
+    arquivos["catalogo.css"] = (CSS, lambda: CSS)
+
+    gravadas = 0
+    hashes = {}
+    for nome, (dados, gerar) in arquivos.items():
+        hashes[nome] = _hash(dados)
+        if anteriores.get(nome) != hashes[nome] or not os.path.exists(os.path.join(destino, nome)):
+            _escrever(os.path.join(destino, nome), gerar())
+            gravadas += 1
+
+    # Páginas e miniaturas que não são mais usadas (marca sem estoque, produto esgotado...)
+    usadas = {p["foto"] for produtos in por_marca.values() for p in produtos if p["foto"]}
+    obsoletos = list(set(anteriores) - set(arquivos))
+    obsoletos += [f"fotos/{n}" for n in os.listdir(os.path.join(destino, "fotos")) if f"fotos/{n}" not in usadas]
+    removidas = 0
+    for nome in obsoletos:
+        try:
+            os.remove(os.path.join(destino, nome))
+            removidas += 1
+        except FileNotFoundError:
+            pass
+
+    _escrever(os.path.join(destino, MANIFESTO), json.dumps(
+        {"modelo": modelo, "versao": versao, "arquivos": hashes}, indent=1
+    ))
+    return {"gravadas": gravadas, "mantidas": len(arquivos) - gravadas, "removidas": removidas, "miniaturas": miniaturas}
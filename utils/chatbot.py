@@ -0,0 +1,192 @@
+from utils.database import (
+    add_produto, get_all_produtos, get_produto_by_id, get_produto_by_codigo, mark_produto_as_sold,
+    get_nomes_categoria,
+)
+from utils.validacao import validar_data, validar_nome, validar_preco, validar_quantidade
+
+# ====================================================================
+# CHATBOT DE ESTOQUE (lógica sem dependência do Streamlit)
+# ====================================================================
+
+def new_chat_state():
+    """Retorna o estado inicial de uma conversa."""
+    return {"step": "idle", "data": {}}
+
+
+def _buscar_categoria(campo, texto):
+    """Nome cadastrado da marca/estilo/tipo que corresponde ao texto (sem diferenciar maiúsculas), ou None."""
+    texto = texto.strip().casefold()
+    return next((nome for nome in get_nomes_categoria(campo) if nome.casefold() == texto), None)
+
+
+def process_command(user_input: str, state: dict):
+    """Processa um comando do chatbot e retorna a resposta.
+
+    `state` é o estado da conversa ({"step": ..., "data": {...}}), alterado no próprio dicionário.
+    """
+    entrada = user_input.strip()  # Sem converter para minúsculas: códigos SKU diferenciam letras
+    user_input = entrada.lower()
+    
+    # --- Lógica de Cancelamento Global ---
+    if user_input == "cancelar":
+        if state["step"] != "idle":
+            state["step"] = "idle"
+            state["data"] = {}
+            return "Operação cancelada. Digite 'ajuda' para ver os comandos."
+        return "Não há nenhuma operação em andamento para cancelar."
+
+    # --- Lógica do Estado (Adicionar Produto) ---
+    # Cada resposta é validada com as mesmas regras dos formulários e do banco (utils/validacao.py)
+    if state["step"] == "add_waiting_nome":
+        try:
+            state["data"]["nome"] = validar_nome(user_input).title()
+        except ValueError as e:
+            return f"{e} Qual é o **Nome** do produto?"
+        state["step"] = "add_waiting_preco"
+        return "Qual é o **Preço** (ex: 49.90)? OBS: Preço deve ser positivo."
+    
+    elif state["step"] == "add_waiting_preco":
+        try:
+            state["data"]["preco"] = validar_preco(user_input)
+            state["step"] = "add_waiting_qtd"
+            return "Qual é a **Quantidade** em estoque (somente número inteiro)? OBS: Quantidade não negativa."
+        except ValueError as e:
+            return f"{e} Por favor, digite o preço (ex: 49.90)."
+            
+    elif state["step"] == "add_waiting_qtd":
+        try:
+            state["data"]["quantidade"] = validar_quantidade(user_input)
+            state["step"] = "add_waiting_marca"
+            return f"De qual **Marca** é o produto? Opções (parcial): {', '.join(get_nomes_categoria('marca')[:5])}..."
+        except ValueError as e:
+            return f"{e} Por favor, digite um número inteiro."
+    
+    elif state["step"] == "add_waiting_marca":
+        nome = _buscar_categoria("marca", user_input)
+        if nome:
+            state["data"]["marca"] = nome
+            state["step"] = "add_waiting_estilo"
+            return f"Qual é o **Estilo**? (Opções: {', '.join(get_nomes_categoria('estilo')[:5])}...). "
+        else:
+            return "Marca não reconhecida. Tente novamente ou digite 'cancelar'."
+            
+    elif state["step"] == "add_waiting_estilo":
+        nome = _buscar_categoria("estilo", user_input)
+        if nome:
+            state["data"]["estilo"] = nome
+            state["step"] = "add_waiting_tipo"
+            return f"Qual é o **Tipo**? (Opções: {', '.join(get_nomes_categoria('tipo')[:5])}...). "
+        else:
+            return "Estilo não reconhecido. Tente novamente ou digite 'cancelar'."
+
+    elif state["step"] == "add_waiting_tipo":
+        nome = _buscar_categoria("tipo", user_input)
+        if nome:
+            state["data"]["tipo"] = nome
+            state["step"] = "add_waiting_validade"
+            return "Qual a **Data de Validade**? (Formato: DD/MM/AAAA ou 'nao')"
+        else:
+            return "Tipo não reconhecido. Tente novamente ou digite 'cancelar'."
+
+    elif state["step"] == "add_waiting_validade":
+        data_validade_iso = None
+        if user_input != 'nao':
+            try:
+                data_validade_iso = validar_data(user_input)
+            except ValueError:
+                return "Formato de data inválido. Use DD/MM/AAAA ou digite 'nao'."
+        
+        # Concluir a adição
+        try:
+            add_produto(
+                state["data"]["nome"], state["data"]["preco"], state["data"]["quantidade"], 
+                state["data"]["marca"], state["data"]["estilo"], state["data"]["tipo"], 
+                None, data_validade_iso
+            )
+            nome = state["data"]["nome"]
+            state["step"] = "idle"
+            state["data"] = {}
+            return f"🎉 Produto **'{nome}'** adicionado com sucesso! Mais alguma coisa? Digite 'ajuda'."
+        except Exception as e:
+            state["step"] = "idle"
+            state["data"] = {}
+            return f"❌ Erro ao adicionar produto: {str(e)}. Tente novamente ou digite 'ajuda'."
+            
+    # --- Lógica do Estado (Marcar como Vendido) ---
+    elif state["step"] == "sell_waiting_id":
+        # Código de barras/SKU primeiro (leitor), depois o ID: busca só o produto, sem carregar a lista
+        produto = get_produto_by_codigo(entrada)
+        if produto is None and entrada.isdigit():
+            produto = get_produto_by_id(int(entrada))
+        if produto is None:
+            if entrada.isdigit():
+                return "Produto não encontrado. Por favor, digite um ID ou código de barras válido ou 'cancelar'."
+            return "ID ou código inválido. Por favor, digite o ID, o código de barras ou 'cancelar'."
+
+        produto_id = produto['id']
+        state["step"] = "idle"
+        state["data"] = {}
+        if int(produto['quantidade']) <= 0:
+            return f"❌ Produto (ID: {produto_id}) já está fora de estoque."
+
+        if not mark_produto_as_sold(produto_id, 1): # Vende 1 unidade (outra venda pode ter levado a última)
+            return f"❌ Produto (ID: {produto_id}) sem estoque no local padrão para vender."
+        estoque_restante = int(produto['quantidade']) - 1
+        if estoque_restante == 0:
+            return f"✅ Produto **{produto['nome']}** (ID: {produto_id}) marcado como **VENDIDO** e fora de estoque."
+        return f"✅ 1 unidade de **{produto['nome']}** (ID: {produto_id}) vendida. Estoque restante: {estoque_restante}."
+            
+    # --- Comandos de Ação (Apenas se em estado 'idle') ---
+    if state["step"] == "idle":
+        if user_input == "ajuda":
+            # ... (Comandos inalterados) ...
+            return ("**Comandos disponíveis:**\n"
+                    "- `adicionar produto`: Inicia o formulário de cadastro.\n"
+                    "- `estoque`: Mostra todos os produtos.\n"
+                    "- `estoque [marca]`: Filtra o estoque por uma marca (ex: `estoque eudora`).\n"
+                    "- `vender [ID ou código de barras]`: Marca 1 unidade de um produto como vendido. Ou digite `vender` para ser guiado.\n"
+                    "- `cancelar`: Cancela a operação atual.\n"
+                    "- `ajuda`: Mostra esta lista.")
+
+        elif user_input == "adicionar produto":
+            state["step"] = "add_waiting_nome"
+            state["data"] = {}
+            return "Ok, vamos adicionar um produto. Qual é o **Nome** dele?"
+            
+        elif user_input.startswith("vender"):
+            parts = entrada.split()
+            if len(parts) == 2: # Tenta vender diretamente pelo ID ou código de barras
+                state["step"] = "sell_waiting_id" # Reusa a lógica de verificação
+                return process_command(parts[1], state)
+            else:
+                state["step"] = "sell_waiting_id"
+                state["data"] = {}
+                return "Certo. Qual é o **ID** ou **código de barras** do produto que você vendeu?"
+
+        elif user_input.startswith("estoque"):
+            produtos = get_all_produtos() # Pega os dados mais frescos
+            if len(user_input.split()) == 1:
+                if not produtos:
+                    return "Nenhum produto cadastrado no estoque."
+                
+                response = "**Produtos em Estoque:**\n"
+                for p in produtos:
+                    response += f"- **{p['nome']}** (ID: {p['id']}) - R$ {p['preco']:.2f}, Qtd: {p['quantidade']}, Marca: {p['marca']}\n"
+                return response
+                
+            else:
+                target_marca = user_input.split("estoque ", 1)[1].strip().title()
+                produtos_filtrados = [p for p in produtos if p.get("marca") == target_marca]
+                
+                if not produtos_filtrados:
+                    return f"Nenhum produto encontrado para a marca **{target_marca}**."
+                    
+                response = f"**Produtos da marca {target_marca} em Estoque:**\n"
+                for p in produtos_filtrados:
+                    response += f"- **{p['nome']}** (ID: {p['id']}) - R$ {p['preco']:.2f}, Qtd: {p['quantidade']}, Estilo: {p['estilo']}\n"
+                return response
+
+        else:
+            return "Desculpe, não entendi o comando. Digite 'ajuda' para ver os comandos disponíveis."
+            
+    return "Resposta não esperada. Por favor, siga as instruções ou digite 'cancelar' para abortar."
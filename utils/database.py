@@ -1,40 +1,82 @@
 import sqlite3
 import os
-import hashlib
 import csv
+import functools
+import json
+import logging
+import queue
+import random
+import threading
+import time
 from reportlab.lib.pagesizes import A4
 from reportlab.pdfgen import canvas
 from reportlab.lib.units import cm
 from datetime import datetime, date
+from utils.instrumentation import InstrumentedConnection, instrumented, registrar_conexao
+from utils.pdf_layout import desenhar_tabela, registrar_fontes
+from utils.auth import hash_password
+from utils.validacao import (
+    ERRO_DATA_VENDA, ERRO_ESTOQUE_LOCAL, ERRO_NOME, ERRO_PRECO, ERRO_QUANTIDADE, ERRO_VALIDADE,
+    validar_data, validar_data_hora, validar_preco, validar_produto,
+)
+
+logger = logging.getLogger(__name__)
 
 # ====================================================================
 # CONFIGURAÇÃO DE DIRETÓRIOS E CONSTANTES
 # ====================================================================
 
 DATABASE_DIR = "data"
-DATABASE = os.path.join(DATABASE_DIR, "estoque.db")
+# ESTOQUE_DB_PATH permite apontar para outra cópia do banco (ex.: testes de carga)
+DATABASE = os.environ.get("ESTOQUE_DB_PATH", os.path.join(DATABASE_DIR, "estoque.db"))
 ASSETS_DIR = "assets"
 
+# Vários processos (workers do Streamlit, API, scripts) no mesmo banco: quanto tempo uma escrita
+# espera pelo bloqueio de outro processo e quantas vezes é repetida se a espera se esgotar
+BUSY_TIMEOUT_MS = int(os.environ.get("ESTOQUE_BUSY_TIMEOUT_MS", 5000))
+TENTATIVAS_ESCRITA = int(os.environ.get("ESTOQUE_TENTATIVAS_ESCRITA", 5))
+
+# Versão do esquema gravada em PRAGMA user_version. Incremente ao mudar tabelas, índices, views,
+# triggers ou COLUNAS_AUDITADAS: create_tables só refaz as migrações quando a versão do banco difere
+VERSAO_ESQUEMA = 1
+
+# Local que recebe vendas/ajustes feitos sem informar o local (ex.: "Vender 1 Unidade")
+LOCAL_PADRAO_ID = 1
+
+# Categorias: campo usado pela aplicação -> tabela de lookup (produtos guarda <campo>_id)
+CATEGORIAS = {"marca": "marcas", "estilo": "estilos", "tipo": "tipos"}
+
+# Colunas de 'produtos' registradas no log de alterações (produtos_changes);
+# categorias são registradas pelo nome
+COLUNAS_AUDITADAS = [
+    "nome", "preco", "quantidade", "marca", "estilo", "tipo", "foto",
+    "data_validade", "vendido", "data_ultima_venda", "codigo_barras", "arquivado_em",
+]
+
+# Produtos esgotados e sem movimento há este número de meses são arquivados por arquivar_sem_movimento()
+ARQUIVAR_APOS_MESES = int(os.environ.get("ESTOQUE_ARQUIVAR_MESES", 6))
+
 # Assegura que os diretórios existam
 if not os.path.exists(DATABASE_DIR):
     os.makedirs(DATABASE_DIR)
 if not os.path.exists(ASSETS_DIR):
     os.makedirs(ASSETS_DIR)
 
-# Listas de categorias atualizadas (usadas nos seus códigos de exemplo)
-MARCAS = [
+# Categorias iniciais, usadas só para popular as tabelas marcas/estilos/tipos num banco novo.
+# Depois disso as categorias são gerenciadas na Área Administrativa (get_nomes_categoria).
+MARCAS_INICIAIS = [
     "Eudora", "O Boticário", "Jequiti", "Avon", "Mary Kay", "Natura",
     "Oui-Original-Unique-Individuel", "Pierre Alexander", "Tupperware", "Outra"
 ]
 
-ESTILOS = [
+ESTILOS_INICIAIS = [
     "Perfumaria", "Skincare", "Cabelo", "Corpo e Banho", "Make", "Masculinos", "Femininos Nina Secrets",
     "Marcas", "Infantil", "Casa", "Solar", "Maquiage", "Teen", "Kits e Presentes",
     "Cuidados com o Corpo", "Lançamentos",
     "Acessórios de Casa", "Outro"
 ]
 
-TIPOS = [
+TIPOS_INICIAIS = [
     "Perfumaria masculina", "Perfumaria feminina", "Body splash", "Body spray", "Eau de parfum",
     "Desodorantes", "Perfumaria infantil", "Perfumaria vegana", "Familia olfativa",
     "Clareador de manchas", "Anti-idade", "Protetor solar facial", "Rosto",
@@ -42,7 +84,7 @@ TIPOS = [
     "Kits de tratamento", "Tratamento para cabelos", "Shampoo", "Condicionador",
     "Leave-in e Creme para Pentear", "Finalizador", "Modelador", "Acessórios",
     "Kits e looks", "Boca", "Olhos", "Pincéis", "Paleta", "Unhas", "Sobrancelhas",
-    "Kits de tratamento", "Hidratante", "Cuidados pós-banho", "Cuidados para o banho",
+    "Hidratante", "Cuidados pós-banho", "Cuidados para o banho",
     "Barba", "Óleo corporal", "Cuidados íntimos", "Unissex", "Bronzeamento",
     "Protetor solar", "Depilação", "Mãos", "Lábios", "Pés", "Pós sol",
     "Protetor solar corporal", "Colônias", "Estojo", "Sabonetes",
@@ -61,21 +103,108 @@ TIPOS = [
 # FUNÇÕES DE UTILIDADE E CONEXÃO
 # ====================================================================
 
+class ConexaoReutilizavel(InstrumentedConnection):
+    """Conexão do pool: close() desfaz a transação pendente e devolve a conexão ao pool."""
+
+    def close(self):
+        if self.in_transaction:
+            self.rollback()
+        pool = _pool
+        if pool is not None:
+            try:
+                pool.put_nowait(self)
+                return
+            except queue.Full:
+                pass
+        super().close()
+
+# Pool de conexões (desativado por padrão; a API HTTP ativa com ativar_pool_conexoes).
+# Conexões reaproveitadas evitam abrir o arquivo e mantêm o cache de páginas do SQLite.
+_pool = None
+
+def ativar_pool_conexoes(tamanho):
+    """Passa a reaproveitar até `tamanho` conexões ociosas (compartilhadas entre threads)."""
+    global _pool
+    _pool = queue.LifoQueue(maxsize=tamanho)
+
 def get_db_connection():
     """Retorna um objeto de conexão com o banco de dados SQLite."""
-    conn = sqlite3.connect(DATABASE)
+    pool = _pool
+    if pool is not None:
+        try:
+            return pool.get_nowait()
+        except queue.Empty:
+            pass
+        # Usada por uma thread de cada vez, mas não necessariamente pela que a criou
+        conn = sqlite3.connect(DATABASE, factory=ConexaoReutilizavel, check_same_thread=False,
+                               timeout=BUSY_TIMEOUT_MS / 1000, isolation_level="IMMEDIATE")
+    else:
+        # IMMEDIATE: a transação pega o bloqueio de escrita já na primeira escrita (esperando até o
+        # busy timeout), então leituras feitas antes dela nunca ficam desatualizadas no meio da transação
+        conn = sqlite3.connect(DATABASE, factory=InstrumentedConnection,
+                               timeout=BUSY_TIMEOUT_MS / 1000, isolation_level="IMMEDIATE")
+    registrar_conexao()
     # Define o row_factory para retornar linhas como dicionários (acessíveis por nome de coluna)
     conn.row_factory = sqlite3.Row
+    # Usado pelos triggers de auditoria para registrar quem fez a alteração
+    conn.create_function("usuario_atual", 0, get_usuario_atual)
     return conn
 
-def hash_password(password):
-    """Gera o hash SHA256 da senha."""
-    return hashlib.sha256(password.encode()).hexdigest()
+def _banco_ocupado(erro):
+    return isinstance(erro, sqlite3.OperationalError) and ("locked" in str(erro) or "busy" in str(erro))
+
+def repetir_se_ocupado(func):
+    """Repete a escrita se o banco continuar bloqueado por outro processo depois do busy timeout.
+
+    Até TENTATIVAS_ESCRITA tentativas, com espera exponencial e aleatória (jitter) para os
+    processos não voltarem todos ao mesmo tempo. É seguro repetir: com BEGIN IMMEDIATE o
+    bloqueio falha antes de qualquer alteração, e a transação não confirmada é descartada.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        for tentativa in range(TENTATIVAS_ESCRITA):
+            try:
+                return func(*args, **kwargs)
+            except sqlite3.OperationalError as e:
+                if not _banco_ocupado(e) or tentativa == TENTATIVAS_ESCRITA - 1:
+                    raise
+            time.sleep(random.uniform(0, 0.05 * 2 ** tentativa))
+    return wrapper
+
+# Usuário da requisição atual (cada sessão do Streamlit roda o script em uma thread própria)
+_contexto = threading.local()
+
+def set_usuario_atual(username):
+    """Define o usuário registrado no log de alterações pelas escritas desta thread."""
+    _contexto.usuario = username
+
+def get_usuario_atual():
+    """Retorna o usuário definido para a thread atual (ou None)."""
+    return getattr(_contexto, "usuario", None)
 
+@instrumented
+@repetir_se_ocupado
 def create_tables():
-    """Cria as tabelas 'produtos' e 'users' se não existirem, e cria um usuário 'admin' padrão."""
+    """Cria as tabelas 'produtos' e 'users' se não existirem, e cria um usuário 'admin' padrão.
+
+    Com o banco já em VERSAO_ESQUEMA só lê PRAGMA user_version: não pega o bloqueio de escrita
+    nem recria triggers/views (o que invalidaria as instruções preparadas das outras conexões).
+    """
     conn = get_db_connection()
     cursor = conn.cursor()
+    if cursor.execute("PRAGMA user_version").fetchone()[0] == VERSAO_ESQUEMA:
+        conn.close()
+        return
+
+    # WAL: leitores não bloqueiam o escritor (e vice-versa) entre processos; a configuração fica no arquivo
+    cursor.execute("PRAGMA journal_mode = WAL")
+    # Vários workers iniciando juntos: as migrações abaixo rodam uma de cada vez
+    cursor.execute("BEGIN IMMEDIATE")
+    # Outro processo pode ter migrado o banco enquanto este esperava o bloqueio
+    if cursor.execute("PRAGMA user_version").fetchone()[0] == VERSAO_ESQUEMA:
+        conn.rollback()
+        conn.close()
+        return
 
     # 1. Cria a tabela 'produtos'
     cursor.execute("""
@@ -84,15 +213,22 @@ def create_tables():
             nome TEXT NOT NULL,
             preco REAL NOT NULL,
             quantidade INTEGER NOT NULL,
-            marca TEXT,
-            estilo TEXT,
-            tipo TEXT,
+            marca_id INTEGER REFERENCES marcas(id),
+            estilo_id INTEGER REFERENCES estilos(id),
+            tipo_id INTEGER REFERENCES tipos(id),
             foto TEXT,
             data_validade TEXT,
             vendido INTEGER DEFAULT 0,
-            data_ultima_venda TEXT
+            data_ultima_venda TEXT,
+            codigo_barras TEXT,
+            arquivado_em TEXT
         );
     """)
+    # Colunas criadas depois da tabela (bancos antigos): código de barras/SKU e arquivamento
+    existentes = {row[1] for row in cursor.execute("PRAGMA table_info(produtos)").fetchall()}
+    for coluna in ("codigo_barras", "arquivado_em"):
+        if coluna not in existentes:
+            cursor.execute(f"ALTER TABLE produtos ADD COLUMN {coluna} TEXT")
 
     # 2. Cria a tabela 'users'
     cursor.execute("""
@@ -105,16 +241,583 @@ def create_tables():
     """)
     
     # 3. Cria um usuário admin padrão se ele não existir
-    try:
-        cursor.execute("INSERT INTO users (username, password, role) VALUES (?, ?, ?)",
-                       ("admin", hash_password("123"), "admin"))
-    except sqlite3.IntegrityError:
-        # admin já existe
-        pass 
+    # (consulta antes para não pagar o custo do hash da senha a cada inicialização)
+    cursor.execute("SELECT 1 FROM users WHERE username = ?", ("admin",))
+    if cursor.fetchone() is None:
+        try:
+            cursor.execute("INSERT INTO users (username, password, role) VALUES (?, ?, ?)",
+                           ("admin", hash_password("123"), "admin"))
+        except sqlite3.IntegrityError:
+            # admin criado por outro processo
+            pass
+
+    # 4. Categorias normalizadas (marcas, estilos, tipos) e a view com os nomes
+    _create_categorias(cursor)
+
+    # 5. Estoque por local (loja, banca, estoque em casa...)
+    _create_estoque_local(cursor)
+
+    # 6. Log de alterações de produtos (auditoria e atualização incremental de caches)
+    _create_produtos_changes(cursor)
 
+    # 7. Metadados das fotos gravadas em ASSETS_DIR (dimensões e tamanho após normalização)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS fotos (
+            nome TEXT PRIMARY KEY,
+            largura INTEGER,
+            altura INTEGER,
+            bytes INTEGER NOT NULL,
+            criado_em TEXT NOT NULL
+        );
+    """)
+
+    # 8. Versões de tabelas (invalidam caches entre processos) e índices das categorias
+    #    (facetas, filtros e verificação de uso antes de remover uma categoria)
+    _create_versoes_tabelas(cursor)
+    # arquivado_em no fim: as facetas (só produtos ativos) continuam usando índice de cobertura
+    for indice, colunas in (
+        ("idx_produtos_categorias", ("marca_id", "estilo_id", "tipo_id", "arquivado_em")),
+        ("idx_produtos_estilo", ("estilo_id", "tipo_id", "arquivado_em")),
+        ("idx_produtos_tipo", ("tipo_id", "arquivado_em")),
+    ):
+        atuais = tuple(row[2] for row in cursor.execute(f"PRAGMA index_info({indice})").fetchall())
+        if atuais != colunas:
+            # Bancos antigos: índice sem arquivado_em é recriado
+            cursor.execute(f"DROP INDEX IF EXISTS {indice}")
+            cursor.execute(f"CREATE INDEX {indice} ON produtos ({', '.join(colunas)})")
+    # Listagem por nome só dos produtos ativos: os arquivados não entram no índice nem nas varreduras
+    cursor.execute("DROP INDEX IF EXISTS idx_produtos_nome")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_produtos_ativos_nome ON produtos (nome, id) WHERE arquivado_em IS NULL")
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_produtos_arquivados ON produtos (arquivado_em) WHERE arquivado_em IS NOT NULL"
+    )
+    # Código de barras/SKU: único entre os produtos que têm código (busca do leitor em O(log n))
+    cursor.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_produtos_codigo_barras ON produtos (codigo_barras) "
+        "WHERE codigo_barras IS NOT NULL"
+    )
+
+    # 9. Fotografias diárias do estoque (valor em estoque numa data passada)
+    _create_stock_snapshots(cursor)
+
+    # 10. Histórico de vendas e previsões de demanda calculadas a partir dele
+    _create_vendas(cursor)
+
+    # 11. Regras de integridade (preço, quantidade, datas) garantidas pelo próprio banco
+    _create_validacoes(cursor)
+
+    cursor.execute(f"PRAGMA user_version = {VERSAO_ESQUEMA}")
     conn.commit()
     conn.close()
 
+def _create_categorias(cursor):
+    """Cria marcas/estilos/tipos, migra as colunas de texto antigas de 'produtos' e cria a view vw_produtos.
+
+    Bancos antigos guardavam o nome da categoria em produtos.marca/estilo/tipo; os nomes
+    são cadastrados nas tabelas, os produtos passam a apontar para o id e as colunas de
+    texto são removidas.
+    """
+    iniciais = {"marca": MARCAS_INICIAIS, "estilo": ESTILOS_INICIAIS, "tipo": TIPOS_INICIAIS}
+    for campo, tabela in CATEGORIAS.items():
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {tabela} (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                nome TEXT NOT NULL UNIQUE
+            );
+        """)
+        cursor.execute(f"SELECT 1 FROM {tabela} LIMIT 1")
+        if cursor.fetchone() is None:
+            cursor.executemany(f"INSERT OR IGNORE INTO {tabela} (nome) VALUES (?)", [(n,) for n in iniciais[campo]])
+
+    colunas = {row[1] for row in cursor.execute("PRAGMA table_info(produtos)").fetchall()}
+    if "marca" in colunas:
+        # Objetos que referenciam as colunas antigas impedem o DROP COLUMN (são recriados adiante)
+        cursor.execute("DROP INDEX IF EXISTS idx_produtos_facetas")
+        for nome in ("insert", "update", "delete"):
+            cursor.execute(f"DROP TRIGGER IF EXISTS produtos_changes_{nome}")
+        for campo, tabela in CATEGORIAS.items():
+            cursor.execute(
+                f"INSERT OR IGNORE INTO {tabela} (nome) SELECT DISTINCT TRIM({campo}) FROM produtos "
+                f"WHERE {campo} IS NOT NULL AND TRIM({campo}) != ''"
+            )
+            if f"{campo}_id" not in colunas:
+                cursor.execute(f"ALTER TABLE produtos ADD COLUMN {campo}_id INTEGER REFERENCES {tabela}(id)")
+            cursor.execute(f"UPDATE produtos SET {campo}_id = (SELECT id FROM {tabela} WHERE nome = TRIM(produtos.{campo}))")
+        for campo in CATEGORIAS:
+            cursor.execute(f"ALTER TABLE produtos DROP COLUMN {campo}")
+
+    # Leitura com os nomes das categorias (mesmo formato de linha usado pelas páginas).
+    # vw_produtos traz só os produtos ativos; os arquivados ficam em vw_produtos_arquivados.
+    selecao = """
+        SELECT p.id, p.nome, p.preco, p.quantidade, m.nome AS marca, e.nome AS estilo, t.nome AS tipo,
+               p.foto, p.data_validade, p.vendido, p.data_ultima_venda, p.codigo_barras{extra}
+        FROM produtos p
+        LEFT JOIN marcas m ON m.id = p.marca_id
+        LEFT JOIN estilos e ON e.id = p.estilo_id
+        LEFT JOIN tipos t ON t.id = p.tipo_id
+    """
+    cursor.execute("DROP VIEW IF EXISTS vw_produtos")
+    cursor.execute("DROP VIEW IF EXISTS vw_produtos_arquivados")
+    cursor.execute("CREATE VIEW vw_produtos AS" + selecao.format(extra="") + "WHERE p.arquivado_em IS NULL")
+    cursor.execute(
+        "CREATE VIEW vw_produtos_arquivados AS" + selecao.format(extra=", p.arquivado_em")
+        + "WHERE p.arquivado_em IS NOT NULL"
+    )
+
+def _create_estoque_local(cursor):
+    """Cria 'locais' e 'estoque_local' e os triggers que mantêm os totais.
+
+    estoque_local é a fonte da verdade por local. Os triggers mantêm:
+    - produtos.quantidade = soma do produto em todos os locais;
+    - locais.unidades / locais.valor = totais de cada local (sem agregar estoque_local na leitura).
+    Escritas que alteram produtos.quantidade diretamente (venda, edição, importação) são
+    aplicadas ao local padrão.
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS locais (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            nome TEXT NOT NULL UNIQUE,
+            unidades INTEGER NOT NULL DEFAULT 0,
+            valor REAL NOT NULL DEFAULT 0
+        );
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS estoque_local (
+            produto_id INTEGER NOT NULL,
+            local_id INTEGER NOT NULL,
+            quantidade INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (produto_id, local_id)
+        ) WITHOUT ROWID;
+    """)
+    # Índice de cobertura para filtros e totais por local (não precisa ler a tabela)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_estoque_local_local ON estoque_local (local_id, produto_id, quantidade)")
+
+    cursor.execute("SELECT COUNT(*) FROM locais")
+    if cursor.fetchone()[0] == 0:
+        cursor.executemany("INSERT INTO locais (id, nome) VALUES (?, ?)",
+                           [(LOCAL_PADRAO_ID, "Loja"), (2, "Banca"), (3, "Estoque em Casa")])
+
+    # Triggers anteriores somavam o valor sem arredondar (o REAL acumulava resíduos, ex.: 8510.56999999998):
+    # são recriados e o valor dos locais é recalculado uma vez
+    triggers_valor = ("estoque_local_insert_total", "estoque_local_update_total", "estoque_local_delete_total",
+                      "produtos_preco_locais", "produtos_update_estoque_local")
+    antigos = [
+        nome for nome, sql in cursor.execute(
+            f"SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND name IN ({', '.join('?' * len(triggers_valor))})",
+            triggers_valor
+        ).fetchall()
+        if "round(" not in sql
+    ]
+    for nome in antigos:
+        cursor.execute(f"DROP TRIGGER {nome}")
+
+    preco = "COALESCE((SELECT preco FROM produtos WHERE id = {0}.produto_id), 0)"
+    for evento, delta, linha in (("INSERT", "NEW.quantidade", "NEW"),
+                                 ("UPDATE OF quantidade", "NEW.quantidade - OLD.quantidade", "NEW"),
+                                 ("DELETE", "-OLD.quantidade", "OLD")):
+        nome = evento.split()[0].lower()
+        # Total do produto = soma dos locais (recalculado, então é idempotente)
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS estoque_local_{nome}_total AFTER {evento} ON estoque_local
+            BEGIN
+                UPDATE produtos
+                SET quantidade = (SELECT COALESCE(SUM(quantidade), 0) FROM estoque_local WHERE produto_id = {linha}.produto_id)
+                WHERE id = {linha}.produto_id;
+                UPDATE locais
+                SET unidades = unidades + ({delta}), valor = round(valor + ({delta}) * {preco.format(linha)}, 2)
+                WHERE id = {linha}.local_id;
+            END;
+        """)
+
+    # Mudança de preço: corrige o valor dos locais com as quantidades anteriores
+    ajuste_preco = """
+        UPDATE locais
+        SET valor = round(valor + (NEW.preco - OLD.preco) *
+            (SELECT e.quantidade FROM estoque_local e WHERE e.produto_id = NEW.id AND e.local_id = locais.id), 2)
+        WHERE NEW.preco IS NOT OLD.preco AND id IN (SELECT local_id FROM estoque_local WHERE produto_id = NEW.id);
+    """
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS produtos_preco_locais AFTER UPDATE OF preco ON produtos
+        WHEN NEW.quantidade IS OLD.quantidade
+        BEGIN
+            {ajuste_preco}
+        END;
+    """)
+    # Produto novo: todo o estoque informado vai para o local padrão
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS produtos_insert_estoque_local AFTER INSERT ON produtos
+        BEGIN
+            INSERT INTO estoque_local (produto_id, local_id, quantidade) VALUES (NEW.id, {LOCAL_PADRAO_ID}, NEW.quantidade)
+            ON CONFLICT (produto_id, local_id) DO UPDATE SET quantidade = excluded.quantidade;
+        END;
+    """)
+    # Alteração direta do total (venda/edição sem local): a diferença é aplicada ao local padrão.
+    # Se o preço mudou no mesmo UPDATE, o valor dos locais é corrigido antes (ainda com as quantidades antigas).
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS produtos_update_estoque_local AFTER UPDATE OF quantidade ON produtos
+        WHEN NEW.quantidade IS NOT (SELECT COALESCE(SUM(quantidade), 0) FROM estoque_local WHERE produto_id = NEW.id)
+        BEGIN
+            {ajuste_preco}
+            INSERT INTO estoque_local (produto_id, local_id, quantidade)
+            VALUES (NEW.id, {LOCAL_PADRAO_ID}, NEW.quantidade - (SELECT COALESCE(SUM(quantidade), 0) FROM estoque_local WHERE produto_id = NEW.id))
+            ON CONFLICT (produto_id, local_id) DO UPDATE SET quantidade = quantidade + excluded.quantidade;
+        END;
+    """)
+    # BEFORE: o preço ainda está disponível para descontar o valor dos locais
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS produtos_delete_estoque_local BEFORE DELETE ON produtos
+        BEGIN
+            DELETE FROM estoque_local WHERE produto_id = OLD.id;
+        END;
+    """)
+
+    # Migração: produtos anteriores ao estoque por local ficam no local padrão
+    cursor.execute(f"""
+        INSERT INTO estoque_local (produto_id, local_id, quantidade)
+        SELECT id, {LOCAL_PADRAO_ID}, quantidade FROM produtos
+        WHERE NOT EXISTS (SELECT 1 FROM estoque_local e WHERE e.produto_id = produtos.id)
+    """)
+    if antigos:
+        cursor.execute(_RECALCULAR_LOCAIS)
+
+_RECALCULAR_LOCAIS = """
+    UPDATE locais SET
+        unidades = (SELECT COALESCE(SUM(quantidade), 0) FROM estoque_local WHERE local_id = locais.id),
+        valor = (SELECT round(COALESCE(SUM(e.quantidade * p.preco), 0), 2)
+                 FROM estoque_local e JOIN produtos p ON p.id = e.produto_id
+                 WHERE e.local_id = locais.id)
+"""
+
+def _create_produtos_changes(cursor):
+    """Cria o log append-only 'produtos_changes', alimentado por triggers em 'produtos'.
+
+    Os triggers são recriados a cada migração (mude VERSAO_ESQUEMA ao alterar COLUNAS_AUDITADAS).
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS produtos_changes (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            op TEXT NOT NULL,
+            produto_id INTEGER NOT NULL,
+            changed_columns TEXT,
+            old_values TEXT,
+            new_values TEXT,
+            usuario TEXT,
+            ts TEXT NOT NULL
+        );
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_produtos_changes_produto ON produtos_changes (produto_id, ts)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_produtos_changes_ts ON produtos_changes (ts)")
+
+    agora = "strftime('%Y-%m-%dT%H:%M:%f', 'now', 'localtime')"
+    todas = ", ".join(COLUNAS_AUDITADAS)
+
+    def valor(linha, coluna):
+        if coluna in CATEGORIAS:
+            return f"(SELECT nome FROM {CATEGORIAS[coluna]} WHERE id = {linha}.{coluna}_id)"
+        return f"{linha}.{coluna}"
+
+    def objeto(linha):
+        return "json_object(" + ", ".join(f"'{c}', {valor(linha, c)}" for c in COLUNAS_AUDITADAS) + ")"
+
+    colunas_alteradas = " UNION ALL ".join(
+        f"SELECT '{c}' AS coluna, {valor('OLD', c)} AS antigo, {valor('NEW', c)} AS novo" for c in COLUNAS_AUDITADAS
+    )
+    for nome in ("insert", "update", "delete"):
+        cursor.execute(f"DROP TRIGGER IF EXISTS produtos_changes_{nome}")
+    cursor.execute(f"""
+        CREATE TRIGGER produtos_changes_insert AFTER INSERT ON produtos
+        BEGIN
+            INSERT INTO produtos_changes (op, produto_id, changed_columns, old_values, new_values, usuario, ts)
+            VALUES ('INSERT', NEW.id, '{todas.replace(" ", "")}', NULL, {objeto("NEW")}, usuario_atual(), {agora});
+        END;
+    """)
+    # Só as colunas que realmente mudaram; UPDATEs sem mudança (ex.: recálculo de total) não geram registro
+    cursor.execute(f"""
+        CREATE TRIGGER produtos_changes_update AFTER UPDATE ON produtos
+        BEGIN
+            INSERT INTO produtos_changes (op, produto_id, changed_columns, old_values, new_values, usuario, ts)
+            SELECT 'UPDATE', NEW.id, group_concat(coluna, ','), json_group_object(coluna, antigo),
+                   json_group_object(coluna, novo), usuario_atual(), {agora}
+            FROM ({colunas_alteradas})
+            WHERE antigo IS NOT novo
+            HAVING COUNT(*) > 0;
+        END;
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER produtos_changes_delete AFTER DELETE ON produtos
+        BEGIN
+            INSERT INTO produtos_changes (op, produto_id, changed_columns, old_values, new_values, usuario, ts)
+            VALUES ('DELETE', OLD.id, NULL, {objeto("OLD")}, NULL, usuario_atual(), {agora});
+        END;
+    """)
+
+def _create_versoes_tabelas(cursor):
+    """Contadores de versão mantidos por triggers, para tabelas sem log de alterações próprio.
+
+    estoque_local só muda de versão quando um produto entra ou sai de um local (INSERT/DELETE);
+    mudanças de quantidade não alteram as facetas nem a lista de produtos do local.
+    'estoque_local_quantidade' muda quando a quantidade de um produto num local muda.
+    'categorias' muda com qualquer escrita em marcas/estilos/tipos.
+    'users' muda com qualquer escrita em users (invalida o cache de permissões de todos os processos).
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS versoes_tabelas (
+            tabela TEXT PRIMARY KEY,
+            versao INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID;
+    """)
+    cursor.execute(
+        """
+        INSERT OR IGNORE INTO versoes_tabelas (tabela, versao)
+        VALUES ('estoque_local', 0), ('estoque_local_quantidade', 0), ('categorias', 0), ('users', 0)
+        """
+    )
+    for operacao in ("INSERT", "DELETE"):
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS estoque_local_versao_{operacao.lower()} AFTER {operacao} ON estoque_local
+            BEGIN
+                UPDATE versoes_tabelas SET versao = versao + 1 WHERE tabela = 'estoque_local';
+            END;
+        """)
+    # Quantidades por local (transferências não mudam o total em 'produtos'); usada pelos ETags da API
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS estoque_local_versao_update AFTER UPDATE OF quantidade ON estoque_local
+        BEGIN
+            UPDATE versoes_tabelas SET versao = versao + 1 WHERE tabela = 'estoque_local_quantidade';
+        END;
+    """)
+    # Renomear/remover uma categoria muda os nomes exibidos sem alterar 'produtos'
+    for tabela in CATEGORIAS.values():
+        for operacao in ("INSERT", "UPDATE", "DELETE"):
+            cursor.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS {tabela}_versao_{operacao.lower()} AFTER {operacao} ON {tabela}
+                BEGIN
+                    UPDATE versoes_tabelas SET versao = versao + 1 WHERE tabela = 'categorias';
+                END;
+            """)
+    for operacao in ("INSERT", "UPDATE", "DELETE"):
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS users_versao_{operacao.lower()} AFTER {operacao} ON users
+            BEGIN
+                UPDATE versoes_tabelas SET versao = versao + 1 WHERE tabela = 'users';
+            END;
+        """)
+
+def _create_stock_snapshots(cursor):
+    """Tabelas das fotografias diárias do estoque.
+
+    stock_snapshots guarda uma linha compacta por produto com estoque no dia (ids das
+    categorias em vez de nomes, produtos zerados omitidos); stock_snapshot_dias guarda os
+    totais de cada dia, usados pelo gráfico sem agregar as linhas.
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS stock_snapshots (
+            data TEXT NOT NULL,
+            produto_id INTEGER NOT NULL,
+            quantidade INTEGER NOT NULL,
+            preco REAL NOT NULL,
+            marca_id INTEGER,
+            estilo_id INTEGER,
+            tipo_id INTEGER,
+            PRIMARY KEY (data, produto_id)
+        ) WITHOUT ROWID;
+    """)
+    # Cobre "valor por marca na data X" e o histórico por marca sem ler a tabela
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_stock_snapshots_marca ON stock_snapshots (data, marca_id, preco, quantidade)"
+    )
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS stock_snapshot_dias (
+            data TEXT PRIMARY KEY,
+            produtos INTEGER NOT NULL,
+            unidades INTEGER NOT NULL,
+            valor REAL NOT NULL,
+            criado_em TEXT NOT NULL
+        ) WITHOUT ROWID;
+    """)
+
+def _create_vendas(cursor):
+    """Uma linha por venda (base da previsão de demanda) e as previsões pré-calculadas.
+
+    Num banco existente, as vendas já registradas no log de alterações são copiadas para
+    'vendas' na criação da tabela (o preço usado é o atual do produto).
+    """
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'vendas'")
+    nova = cursor.fetchone() is None
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS vendas (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            produto_id INTEGER NOT NULL,
+            local_id INTEGER,
+            quantidade INTEGER NOT NULL,
+            preco REAL,
+            data TEXT NOT NULL
+        );
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_vendas_data ON vendas (data, produto_id, quantidade)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_vendas_produto ON vendas (produto_id, data)")
+    if nova:
+        # Venda sem local: um UPDATE com quantidade e data_ultima_venda. Venda num local: o trigger
+        # de estoque_local registra a quantidade e, em seguida (seq anterior), vem data_ultima_venda.
+        cursor.execute("""
+            INSERT INTO vendas (produto_id, quantidade, preco, data)
+            SELECT produto_id, quantidade, preco, data FROM (
+                SELECT b.produto_id,
+                       COALESCE(
+                           json_extract(b.old_values, '$.quantidade') - json_extract(b.new_values, '$.quantidade'),
+                           json_extract(a.old_values, '$.quantidade') - json_extract(a.new_values, '$.quantidade')
+                       ) AS quantidade,
+                       p.preco,
+                       json_extract(b.new_values, '$.data_ultima_venda') AS data
+                FROM produtos_changes b
+                LEFT JOIN produtos_changes a
+                       ON a.seq = b.seq - 1 AND a.produto_id = b.produto_id AND a.op = 'UPDATE'
+                LEFT JOIN produtos p ON p.id = b.produto_id
+                WHERE b.op = 'UPDATE' AND json_extract(b.new_values, '$.data_ultima_venda') IS NOT NULL
+                ORDER BY b.seq
+            ) WHERE quantidade > 0
+        """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS previsoes_demanda (
+            produto_id INTEGER PRIMARY KEY,
+            media_movel REAL NOT NULL,
+            demanda_diaria REAL NOT NULL
+        );
+    """)
+    # Uma única linha: quando e com quais vendas/parâmetros as previsões foram calculadas
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS previsoes_demanda_status (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            calculado_em TEXT NOT NULL,
+            ultima_venda_id INTEGER NOT NULL,
+            parametros TEXT NOT NULL
+        );
+    """)
+
+# Regras de 'produtos': (coluna, condição que torna NEW inválido, mensagem). São as mesmas de
+# utils/validacao.py, para o banco recusar o que escapar da validação em Python.
+REGRAS_PRODUTOS = (
+    ("nome", "NEW.nome IS NULL OR trim(NEW.nome) = ''", ERRO_NOME),
+    ("preco", "typeof(NEW.preco) NOT IN ('integer', 'real') OR NEW.preco <= 0", ERRO_PRECO),
+    ("quantidade", "typeof(NEW.quantidade) != 'integer' OR NEW.quantidade < 0", ERRO_QUANTIDADE),
+    # date(x, '+0 days') normaliza o dia (30/02 vira 02/03), então só datas reais voltam iguais
+    ("data_validade", "NEW.data_validade IS NOT NULL AND date(NEW.data_validade, '+0 days') IS NOT NEW.data_validade",
+     ERRO_VALIDADE),
+    ("data_ultima_venda", "NEW.data_ultima_venda IS NOT NULL AND datetime(NEW.data_ultima_venda) IS NULL",
+     ERRO_DATA_VENDA),
+)
+MENSAGENS_INTEGRIDADE = {mensagem for _, _, mensagem in REGRAS_PRODUTOS} | {ERRO_ESTOQUE_LOCAL}
+
+def _create_validacoes(cursor):
+    """Triggers que recusam produtos e estoques inválidos (o papel de CHECK nas tabelas existentes).
+
+    O SQLite não acrescenta CHECK a uma tabela sem recriá-la, e recriar 'produtos' exigiria
+    refazer as views e os triggers que dependem dela. Os triggers abortam a instrução com
+    sqlite3.IntegrityError e a mensagem da regra. Na alteração só os valores que mudaram são
+    verificados, e uma quantidade negativa antiga pode subir (ser corrigida aos poucos).
+    Na primeira criação, as linhas antigas inválidas são corrigidas antes (veja verificar_integridade).
+    """
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = 'produtos_validar_insert'")
+    if cursor.fetchone() is None:
+        _reparar_invalidos(cursor, _encontrar_invalidos(cursor))
+
+    raise_ = "SELECT RAISE(ABORT, '{0}') WHERE {1};"
+    na_insercao = [raise_.format(msg.replace("'", "''"), cond) for _, cond, msg in REGRAS_PRODUTOS]
+    na_alteracao = [
+        raise_.format(
+            msg.replace("'", "''"),
+            "NEW.quantidade < min(OLD.quantidade, 0) OR (NEW.quantidade IS NOT OLD.quantidade AND typeof(NEW.quantidade) != 'integer')"
+            if coluna == "quantidade" else f"NEW.{coluna} IS NOT OLD.{coluna} AND ({cond})"
+        )
+        for coluna, cond, msg in REGRAS_PRODUTOS
+    ]
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS produtos_validar_insert BEFORE INSERT ON produtos
+        BEGIN
+            {" ".join(na_insercao)}
+        END;
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS produtos_validar_update
+        BEFORE UPDATE OF {", ".join(coluna for coluna, _, _ in REGRAS_PRODUTOS)} ON produtos
+        BEGIN
+            {" ".join(na_alteracao)}
+        END;
+    """)
+    # AFTER: no INSERT ... ON CONFLICT DO UPDATE o valor inserido é a diferença (pode ser negativa);
+    # só a linha resultante precisa ser verificada
+    mensagem = ERRO_ESTOQUE_LOCAL.replace("'", "''")
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS estoque_local_validar_insert AFTER INSERT ON estoque_local
+        WHEN NEW.quantidade < 0
+        BEGIN
+            SELECT RAISE(ABORT, '{mensagem}');
+        END;
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS estoque_local_validar_update AFTER UPDATE OF quantidade ON estoque_local
+        WHEN NEW.quantidade < min(OLD.quantidade, 0)
+        BEGIN
+            SELECT RAISE(ABORT, '{mensagem}');
+        END;
+    """)
+
+def _corrigir(campo, valor):
+    """Valor válido para um campo inválido de produto, ou levanta ValueError se não há correção segura."""
+    if campo == "quantidade":
+        try:
+            return max(int(float(valor)), 0)
+        except (TypeError, ValueError):
+            return 0
+    if campo == "preco":
+        return validar_preco(valor)  # ex.: texto "49,90"; preço zero ou ausente precisa de correção manual
+    if campo == "data_validade":
+        try:
+            return validar_data(valor)
+        except ValueError:
+            return None  # data ilegível: o produto fica sem validade
+    if campo == "data_ultima_venda":
+        try:
+            return validar_data_hora(valor)
+        except ValueError:
+            return None
+    raise ValueError(campo)
+
+def _encontrar_invalidos(cursor):
+    """Linhas que violam REGRAS_PRODUTOS ou têm estoque negativo num local (incluindo arquivados).
+
+    Cada item: {'tabela', 'id', 'local_id', 'campo', 'valor', 'correcao', 'reparavel'}.
+    """
+    invalidos = []
+    cursor.execute("SELECT produto_id, local_id, quantidade FROM estoque_local WHERE quantidade < 0")
+    for produto_id, local_id, quantidade in cursor.fetchall():
+        invalidos.append({"tabela": "estoque_local", "id": produto_id, "local_id": local_id, "campo": "quantidade",
+                          "valor": quantidade, "correcao": 0, "reparavel": True})
+    for campo, condicao, _ in REGRAS_PRODUTOS:
+        cursor.execute(f"SELECT id, {campo} FROM produtos WHERE {condicao.replace('NEW.', '')} ORDER BY id")
+        for produto_id, valor in cursor.fetchall():
+            try:
+                correcao, reparavel = _corrigir(campo, valor), True
+            except ValueError:
+                correcao, reparavel = None, False
+            invalidos.append({"tabela": "produtos", "id": produto_id, "local_id": None, "campo": campo,
+                              "valor": valor, "correcao": correcao, "reparavel": reparavel})
+    return invalidos
+
+def _reparar_invalidos(cursor, invalidos):
+    """Aplica as correções (estoques por local primeiro: os triggers recalculam o total do produto)."""
+    for item in sorted(invalidos, key=lambda i: i["tabela"] != "estoque_local"):
+        if not item["reparavel"]:
+            continue
+        if item["tabela"] == "estoque_local":
+            cursor.execute("UPDATE estoque_local SET quantidade = 0 WHERE produto_id = ? AND local_id = ? AND quantidade < 0",
+                           (item["id"], item["local_id"]))
+        else:
+            # Só se o valor não mudou desde a verificação (ex.: total já corrigido pelo estoque do local)
+            cursor.execute(f"UPDATE produtos SET {item['campo']} = ? WHERE id = ? AND {item['campo']} IS ?",
+                           (item["correcao"], item["id"], item["valor"]))
+
 # Garante que as tabelas sejam criadas na inicialização
 create_tables()
 
@@ -123,267 +826,1538 @@ create_tables()
 # FUNÇÕES CRUD DE PRODUTOS
 # ====================================================================
 
-def add_produto(nome, preco, quantidade, marca, estilo, tipo, foto=None, data_validade=None):
-    """Adiciona um novo produto ao DB."""
+def _categoria_id(cursor, campo, nome):
+    """Retorna o id da categoria pelo nome, cadastrando-a se ainda não existir (None para vazio)."""
+    if nome is None or not str(nome).strip():
+        return None
+    tabela = CATEGORIAS[campo]
+    nome = str(nome).strip()
+    cursor.execute(f"SELECT id FROM {tabela} WHERE nome = ?", (nome,))
+    row = cursor.fetchone()
+    if row is None:
+        cursor.execute(f"INSERT OR IGNORE INTO {tabela} (nome) VALUES (?)", (nome,))
+        cursor.execute(f"SELECT id FROM {tabela} WHERE nome = ?", (nome,))
+        row = cursor.fetchone()
+    return row[0]
+
+def normalizar_codigo(codigo):
+    """Código de barras/SKU sem espaços nas pontas; vazio vira None (produto sem código)."""
+    codigo = str(codigo).strip() if codigo is not None else ""
+    return codigo or None
+
+def _erro_integridade(erro):
+    """Converte violações conhecidas em ValueError (outros erros seguem).
+
+    Código de barras duplicado (índice único) e as regras dos triggers de _create_validacoes.
+    """
+    if "codigo_barras" in str(erro):
+        return ValueError("Código de barras já cadastrado em outro produto.")
+    if str(erro) in MENSAGENS_INTEGRIDADE:
+        return ValueError(str(erro))
+    return erro
+
+def _colunas_produto(cursor, fields):
+    """Converte {'marca': 'Natura', 'preco': 10} em {'marca_id': 3, 'preco': 10}."""
+    return {
+        (f"{campo}_id" if campo in CATEGORIAS else campo):
+            (_categoria_id(cursor, campo, valor) if campo in CATEGORIAS
+             else normalizar_codigo(valor) if campo == "codigo_barras" else valor)
+        for campo, valor in fields.items()
+    }
+
+@instrumented
+@repetir_se_ocupado
+def add_produto(nome, preco, quantidade, marca, estilo, tipo, foto=None, data_validade=None, codigo_barras=None):
+    """Adiciona um novo produto ao DB.
+
+    Levanta ValueError se algum campo for inválido (utils/validacao.py) ou se o código de barras já existir.
+    """
+    campos = validar_produto({"nome": nome, "preco": preco, "quantidade": quantidade, "data_validade": data_validade})
+    nome, preco, quantidade, data_validade = (campos[c] for c in ("nome", "preco", "quantidade", "data_validade"))
     conn = get_db_connection()
     cursor = conn.cursor()
-    cursor.execute(
-        "INSERT INTO produtos (nome, preco, quantidade, marca, estilo, tipo, foto, data_validade) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
-        (nome, preco, quantidade, marca, estilo, tipo, foto, data_validade)
-    )
-    conn.commit()
-    conn.close()
+    try:
+        cursor.execute(
+            """
+            INSERT INTO produtos (nome, preco, quantidade, marca_id, estilo_id, tipo_id, foto, data_validade, codigo_barras)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (nome, preco, quantidade, _categoria_id(cursor, "marca", marca), _categoria_id(cursor, "estilo", estilo),
+             _categoria_id(cursor, "tipo", tipo), foto, data_validade, normalizar_codigo(codigo_barras))
+        )
+        conn.commit()
+    except sqlite3.IntegrityError as e:
+        raise _erro_integridade(e)
+    finally:
+        conn.close()
+
+@instrumented
+def get_all_produtos(local_id=None):
+    """Retorna todos os produtos, ordenados por nome.
 
-def get_all_produtos():
-    """Retorna todos os produtos, ordenados por nome."""
+    Com `local_id`, retorna só os produtos presentes no local, com `quantidade` daquele local.
+    """
     conn = get_db_connection()
     cursor = conn.cursor()
-    # Ordem por nome para facilitar visualização, pode mudar para ID/mais recente se preferir
-    cursor.execute("SELECT * FROM produtos ORDER BY nome ASC") 
+    if local_id is None:
+        # Ordem por nome para facilitar visualização, pode mudar para ID/mais recente se preferir
+        cursor.execute("SELECT * FROM vw_produtos ORDER BY nome ASC") 
+    else:
+        cursor.execute(
+            """
+            SELECT p.id, p.nome, p.preco, e.quantidade, p.marca, p.estilo, p.tipo, p.foto,
+                   p.data_validade, p.vendido, p.data_ultima_venda, p.codigo_barras
+            FROM estoque_local e JOIN vw_produtos p ON p.id = e.produto_id
+            WHERE e.local_id = ?
+            ORDER BY p.nome ASC
+            """,
+            (local_id,)
+        )
     produtos = [dict(row) for row in cursor.fetchall()]
     conn.close()
     return produtos
 
-def get_produto_by_id(product_id):
-    """Busca um produto pelo ID."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM produtos WHERE id = ?", (product_id,))
-    produto = cursor.fetchone()
-    conn.close()
-    return dict(produto) if produto else None
+@instrumented
+def listar_produtos(pagina=1, por_pagina=50, local_id=None, busca=None, marca=None, estilo=None, tipo=None):
+    """Uma página de produtos ordenados por nome: {'total': nº de produtos filtrados, 'itens': [...]}.
+
+    `busca` procura no nome (sem diferenciar maiúsculas). Com `local_id`, como em
+    get_all_produtos, só produtos presentes no local, com a quantidade daquele local.
+    """
+    filtros, params = _filtros_categoria({"marca": marca, "estilo": estilo, "tipo": tipo})
+    filtros.insert(0, "p.arquivado_em IS NULL")
+    if busca:
+        escapada = busca.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        filtros.append("p.nome LIKE ? ESCAPE '\\'")
+        params.append(f"%{escapada}%")
+    if local_id is not None:
+        origem, quantidade = "produtos p JOIN estoque_local e ON e.produto_id = p.id", "e.quantidade"
+        filtros.insert(0, "e.local_id = ?")
+        params.insert(0, local_id)
+    else:
+        origem, quantidade = "produtos p", "p.quantidade"
+    where = " AND ".join(filtros)
 
-def update_produto(product_id, nome, preco, quantidade, marca, estilo, tipo, foto, data_validade):
-    """Atualiza um produto existente."""
     conn = get_db_connection()
     cursor = conn.cursor()
+    cursor.execute(f"SELECT COUNT(*) FROM {origem} WHERE {where}", params)
+    total = cursor.fetchone()[0]
     cursor.execute(
-        """
-        UPDATE produtos SET nome=?, preco=?, quantidade=?, marca=?, estilo=?, tipo=?, foto=?, data_validade=?
-        WHERE id=?
+        f"""
+        SELECT v.id, v.nome, v.preco, {quantidade} AS quantidade, v.marca, v.estilo, v.tipo, v.foto,
+               v.data_validade, v.vendido, v.data_ultima_venda, v.codigo_barras
+        FROM {origem} JOIN vw_produtos v ON v.id = p.id
+        WHERE {where}
+        ORDER BY p.nome, p.id
+        LIMIT ? OFFSET ?
         """,
-        (nome, preco, quantidade, marca, estilo, tipo, foto, data_validade, product_id)
+        params + [por_pagina, (pagina - 1) * por_pagina]
     )
-    conn.commit()
+    itens = [dict(row) for row in cursor.fetchall()]
     conn.close()
+    return {"total": total, "itens": itens}
 
-def delete_produto(product_id):
-    """Remove um produto e sua foto associada."""
+@instrumented
+def get_produto_by_id(product_id):
+    """Busca um produto pelo ID."""
     conn = get_db_connection()
     cursor = conn.cursor()
-    
-    # 1. Recupera o produto para apagar a foto
-    produto = get_produto_by_id(product_id)
-    if produto and produto.get('foto'):
-        try:
-            os.remove(os.path.join(ASSETS_DIR, produto['foto']))
-        except FileNotFoundError:
-            pass # Ignora se a foto já não existir
-
-    # 2. Deleta do banco de dados
-    cursor.execute("DELETE FROM produtos WHERE id = ?", (product_id,))
-    conn.commit()
+    cursor.execute("SELECT * FROM vw_produtos WHERE id = ?", (product_id,))
+    produto = cursor.fetchone()
     conn.close()
+    return dict(produto) if produto else None
 
-def mark_produto_as_sold(product_id, quantity_sold=1):
-    """Atualiza a quantidade e registra a última venda."""
+@instrumented
+def get_produto_by_codigo(codigo):
+    """Busca um produto pelo código de barras/SKU (índice único; None se não houver)."""
+    codigo = normalizar_codigo(codigo)
+    if codigo is None:
+        return None
     conn = get_db_connection()
     cursor = conn.cursor()
-    
-    # Usa ISO format para facilitar a conversão de volta
-    cursor.execute(
-        "UPDATE produtos SET quantidade = quantidade - ?, vendido = 1, data_ultima_venda = ? WHERE id = ?",
-        (quantity_sold, datetime.now().isoformat(), product_id)
-    )
-    conn.commit()
+    cursor.execute("SELECT * FROM vw_produtos WHERE codigo_barras = ?", (codigo,))
+    produto = cursor.fetchone()
     conn.close()
+    return dict(produto) if produto else None
 
-# ====================================================================
-# FUNÇÕES DE USUÁRIOS (LOGIN/ADMIN)
-# ====================================================================
-
-def add_user(username, password, role="staff"):
-    """Adiciona um novo usuário (admin ou staff) ao banco de dados."""
-    hashed_pass = hash_password(password)
+@instrumented
+@repetir_se_ocupado
+def update_produto(product_id, nome, preco, quantidade, marca, estilo, tipo, foto, data_validade):
+    """Atualiza um produto existente (ValueError se algum campo for inválido)."""
+    campos = validar_produto({"nome": nome, "preco": preco, "quantidade": quantidade, "data_validade": data_validade})
     conn = get_db_connection()
     cursor = conn.cursor()
     try:
         cursor.execute(
-            "INSERT INTO users (username, password, role) VALUES (?, ?, ?)",
-            (username, hashed_pass, role)
+            """
+            UPDATE produtos SET nome=?, preco=?, quantidade=?, marca_id=?, estilo_id=?, tipo_id=?, foto=?, data_validade=?
+            WHERE id=?
+            """,
+            (campos["nome"], campos["preco"], campos["quantidade"], _categoria_id(cursor, "marca", marca),
+             _categoria_id(cursor, "estilo", estilo), _categoria_id(cursor, "tipo", tipo), foto,
+             campos["data_validade"], product_id)
         )
         conn.commit()
-        return True
-    except sqlite3.IntegrityError:
-        # Usuário já existe (campo username é UNIQUE)
-        return False
+    except sqlite3.IntegrityError as e:
+        raise _erro_integridade(e)
     finally:
         conn.close()
 
-def get_user(username):
-    """Busca um usuário pelo nome de usuário."""
+# Colunas que podem ser alteradas por patch_produto/patch_many
+CAMPOS_EDITAVEIS = ("nome", "preco", "quantidade", "marca", "estilo", "tipo", "foto", "data_validade", "codigo_barras")
+FILTROS_EM_MASSA = ("marca", "estilo", "tipo")
+
+def _validar_campos(fields):
+    invalidos = set(fields) - set(CAMPOS_EDITAVEIS)
+    if invalidos:
+        raise ValueError(f"Campos não editáveis: {', '.join(sorted(invalidos))}")
+
+@instrumented
+@repetir_se_ocupado
+def patch_produto(product_id, **fields):
+    """Atualiza só as colunas informadas (ex.: patch_produto(3, preco=49.9)).
+
+    Colunas que já têm o valor informado não são reescritas. Retorna True se algo mudou.
+    Levanta ValueError se algum valor for inválido.
+    """
+    _validar_campos(fields)
+    if not fields:
+        return False
+    fields = validar_produto(fields)
+
     conn = get_db_connection()
     cursor = conn.cursor()
-    cursor.execute("SELECT * FROM users WHERE username = ?", (username,))
-    user = cursor.fetchone()
-    conn.close()
-    return dict(user) if user else None
+    colunas = _colunas_produto(cursor, fields)
+    sets = ", ".join(f"{coluna} = ?" for coluna in colunas)
+    mudou = " OR ".join(f"{coluna} IS NOT ?" for coluna in colunas)
+    valores = list(colunas.values())
+    try:
+        cursor.execute(f"UPDATE produtos SET {sets} WHERE id = ? AND ({mudou})", valores + [product_id] + valores)
+        alterado = cursor.rowcount > 0
+        conn.commit()
+    except sqlite3.IntegrityError as e:
+        raise _erro_integridade(e)
+    finally:
+        conn.close()
+    return alterado
 
-def get_all_users():
-    """Retorna todos os usuários cadastrados (sem senhas)."""
+def _validar_locais(cursor, *local_ids):
+    """Levanta ValueError se algum dos locais não existir (o estoque iria para um local fantasma)."""
+    cursor.execute(f"SELECT id FROM locais WHERE id IN ({', '.join('?' * len(local_ids))})", local_ids)
+    existentes = {row[0] for row in cursor.fetchall()}
+    faltando = [str(i) for i in local_ids if i not in existentes]
+    if faltando:
+        raise ValueError(f"Local inexistente: {', '.join(faltando)}.")
+
+@instrumented
+@repetir_se_ocupado
+def restock(product_id, delta, local_id=None):
+    """Soma `delta` unidades ao estoque (negativo para baixa) com um UPDATE atômico.
+
+    Sem `local_id` o ajuste vai para o local padrão. Retorna False (sem alterar nada)
+    se o produto não existir, estiver arquivado ou se a baixa deixaria o estoque negativo.
+    Levanta ValueError se o local não existir.
+    """
+    if delta == 0:
+        return False
+    if local_id is None:
+        local_id = LOCAL_PADRAO_ID
     conn = get_db_connection()
     cursor = conn.cursor()
-    cursor.execute("SELECT username, role FROM users ORDER BY role DESC, username ASC")
-    users = [dict(row) for row in cursor.fetchall()]
-    conn.close()
-    return users
+    try:
+        _validar_locais(cursor, local_id)
+        # Sempre pelo estoque do local: os triggers recalculam o total do produto
+        if delta < 0:
+            cursor.execute(
+                "UPDATE estoque_local SET quantidade = quantidade + ? WHERE produto_id = ? AND local_id = ? AND quantidade + ? >= 0",
+                (delta, product_id, local_id, delta)
+            )
+        else:
+            # Produto arquivado não recebe estoque (precisa ser restaurado antes)
+            cursor.execute(
+                """
+                INSERT INTO estoque_local (produto_id, local_id, quantidade)
+                SELECT id, ?, ? FROM produtos WHERE id = ? AND arquivado_em IS NULL
+                ON CONFLICT (produto_id, local_id) DO UPDATE SET quantidade = quantidade + excluded.quantidade
+                """,
+                (local_id, delta, product_id)
+            )
+        alterado = cursor.rowcount > 0
+        conn.commit()
+        return alterado
+    finally:
+        conn.close()
 
-# ====================================================================
-# FUNÇÕES DE EXPORTAÇÃO/IMPORTAÇÃO (CSV/PDF)
-# ====================================================================
+@instrumented
+@repetir_se_ocupado
+def patch_many(filtros, percentual_preco=None, **fields):
+    """Atualiza vários produtos com um único UPDATE.
 
-def export_produtos_to_csv(filepath):
-    """Exporta todos os produtos para um arquivo CSV."""
-    produtos = get_all_produtos()
-    if not produtos:
-        return
-        
-    fieldnames = list(produtos[0].keys())
-    with open(filepath, 'w', newline='', encoding='utf-8') as csvfile:
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames, extrasaction='ignore')
-        writer.writeheader()
-        writer.writerows(produtos)
+    `filtros` seleciona os produtos por marca/estilo/tipo e/ou lista de 'ids'
+    (ex.: {"marca": "Natura"}); `percentual_preco` reajusta o preço (5 = +5%, -10 = -10%,
+    arredondado em centavos) e `fields` define valores fixos. Retorna o número de produtos alterados.
+    """
+    _validar_campos(fields)
+    if percentual_preco is None and not fields:
+        return 0
+    fields = validar_produto(fields)
+
+    where, filtro_params = [], []
+    for coluna, valor in filtros.items():
+        if coluna == "ids":
+            ids = list(valor)
+            if not ids:
+                return 0
+            where.append(f"id IN ({', '.join('?' * len(ids))})")
+            filtro_params.extend(ids)
+        elif coluna in FILTROS_EM_MASSA:
+            # Comparação por id (inteiro, indexado)
+            where.append(f"{coluna}_id = (SELECT id FROM {CATEGORIAS[coluna]} WHERE nome = ?)")
+            filtro_params.append(valor)
+        else:
+            raise ValueError(f"Filtro inválido: {coluna}")
+    if not where:
+        # Evita reajustar o estoque inteiro por engano
+        raise ValueError("Informe ao menos um filtro (marca, estilo, tipo ou ids).")
 
-def import_produtos_from_csv(filepath):
-    """Importa produtos de um arquivo CSV (apenas adiciona novos)."""
     conn = get_db_connection()
     cursor = conn.cursor()
-    count = 0
-    
-    with open(filepath, 'r', encoding='utf-8') as csvfile:
-        reader = csv.DictReader(csvfile)
-        for row in reader:
-            # Tenta converter campos para o tipo correto, usa None/0 se falhar
-            try:
-                # Garante que os campos cruciais não sejam nulos ou inválidos
-                nome = row.get('nome')
-                if not nome: continue 
-                
-                preco = float(row.get('preco', 0))
-                quantidade = int(row.get('quantidade', 0))
-                vendido = int(row.get('vendido', 0))
-            except ValueError:
-                # Pula a linha se os campos numéricos estiverem inválidos
-                continue 
+    sets, params = [], []
+    if percentual_preco is not None:
+        sets.append("preco = round(preco * ?, 2)")
+        params.append(1 + percentual_preco / 100)
+    for coluna, valor in _colunas_produto(cursor, fields).items():
+        sets.append(f"{coluna} = ?")
+        params.append(valor)
+    # Produtos arquivados não são reajustados
+    where.append("arquivado_em IS NULL")
+    try:
+        cursor.execute(f"UPDATE produtos SET {', '.join(sets)} WHERE {' AND '.join(where)}", params + filtro_params)
+        alterados = cursor.rowcount
+        conn.commit()
+    except sqlite3.IntegrityError as e:
+        # Ex.: reajuste de -100% (preço zero): nenhum produto é alterado
+        raise _erro_integridade(e)
+    finally:
+        conn.close()
+    return alterados
 
-            # Insere um NOVO produto (ID será AUTOINCREMENT)
-            try:
-                cursor.execute(
-                    """
-                    INSERT INTO produtos (nome, preco, quantidade, marca, estilo, tipo, foto, data_validade, vendido, data_ultima_venda)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    """,
-                    (
-                        nome, preco, quantidade, row.get('marca'), row.get('estilo'), 
-                        row.get('tipo'), row.get('foto'), row.get('data_validade'), vendido, 
-                        row.get('data_ultima_venda')
-                    )
-                )
-                count += 1
-            except Exception as e:
-                # Em caso de erro de DB, apenas registra e continua
-                print(f"Erro ao inserir linha: {e}")
-                
-    conn.commit()
-    conn.close()
-    return count
+def diff_produtos(originais, editados, campos=CAMPOS_EDITAVEIS):
+    """Compara duas listas de produtos (dicts com 'id') e retorna [(id, {campo: (antigo, novo)})].
 
+    Só entram os produtos e campos que realmente mudaram.
+    """
+    por_id = {p["id"]: p for p in originais}
+    alteracoes = []
+    for editado in editados:
+        original = por_id.get(editado.get("id"))
+        if original is None:
+            continue
+        mudou = {
+            campo: (original.get(campo), editado.get(campo))
+            for campo in campos
+            if campo in editado and editado.get(campo) != original.get(campo)
+        }
+        if mudou:
+            alteracoes.append((original["id"], mudou))
+    return alteracoes
 
-def generate_stock_pdf(filepath):
-    """Gera um relatório PDF com a lista de produtos."""
-    produtos = get_all_produtos()
+@instrumented
+@repetir_se_ocupado
+def bulk_update_produtos(alteracoes):
+    """Aplica o resultado de diff_produtos numa única transação.
+
+    As colunas que não são quantidade são agrupadas pelo conjunto alterado e cada grupo
+    vira um executemany. Quantidades são aplicadas à parte, como diferença (novo - antigo)
+    no local padrão, preservando vendas feitas durante a edição; uma baixa maior que o
+    estoque do local padrão não é aplicada, mas as outras colunas da linha são.
+    Retorna (produtos atualizados, ids cuja quantidade não foi alterada por estoque
+    insuficiente no local padrão). Levanta ValueError se algum valor novo for inválido,
+    sem alterar nenhum produto.
+    """
+    validadas, erros = [], []
+    for product_id, mudou in alteracoes:
+        _validar_campos(mudou)
+        try:
+            novos = validar_produto({campo: novo for campo, (_, novo) in mudou.items()})
+        except ValueError as e:
+            erros.append(f"Produto {product_id}: {e}")
+            continue
+        validadas.append((product_id, {campo: (antigo, novos[campo]) for campo, (antigo, _) in mudou.items()}))
+    if erros:
+        raise ValueError(" ".join(erros))
+    alteracoes = validadas
+    if not alteracoes:
+        return 0, []
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("BEGIN IMMEDIATE")
+        grupos, diferencas = {}, []
+        for product_id, mudou in alteracoes:
+            if "quantidade" in mudou:
+                diferencas.append((product_id, mudou["quantidade"][1] - mudou["quantidade"][0]))
+            colunas = tuple(sorted(c for c in mudou if c != "quantidade"))
+            if not colunas:
+                continue
+            valores = [
+                _categoria_id(cursor, c, mudou[c][1]) if c in CATEGORIAS
+                else normalizar_codigo(mudou[c][1]) if c == "codigo_barras"
+                else mudou[c][1]
+                for c in colunas
+            ]
+            grupos.setdefault(colunas, []).append(valores + [product_id])
+
+        atualizados = 0
+        for colunas, linhas in grupos.items():
+            sets = ", ".join(f"{c}_id = ?" if c in CATEGORIAS else f"{c} = ?" for c in colunas)
+            cursor.executemany(f"UPDATE produtos SET {sets} WHERE id = ?", linhas)
+            atualizados += cursor.rowcount
+
+        # Uma baixa maior que o estoque do local padrão (vendas no meio da edição, ou unidades
+        # guardadas em outros locais) não é aplicada. A diferença vai para o local padrão,
+        # então é o estoque dele que limita a baixa.
+        sem_estoque = []
+        so_quantidade = {product_id for product_id, mudou in alteracoes if len(mudou) == 1}
+        for product_id, diferenca in diferencas:
+            cursor.execute(
+                "UPDATE produtos SET quantidade = quantidade + ? WHERE id = ?"
+                " AND COALESCE((SELECT e.quantidade FROM estoque_local e"
+                f" WHERE e.produto_id = produtos.id AND e.local_id = {LOCAL_PADRAO_ID}), 0) + ? >= 0",
+                (diferenca, product_id, diferenca)
+            )
+            if cursor.rowcount == 0:
+                sem_estoque.append(product_id)
+            elif product_id in so_quantidade:
+                atualizados += 1
+        conn.commit()
+        return atualizados, sem_estoque
+    except sqlite3.IntegrityError as e:
+        conn.rollback()
+        raise _erro_integridade(e)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+@instrumented
+@repetir_se_ocupado
+def delete_produto(product_id):
+    """Remove definitivamente um produto e sua foto associada (para tirar da lista, use arquivar_produto)."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
     
+    # 1. Foto do produto (ativo ou arquivado), apagada se nenhum outro produto usar o mesmo arquivo
+    cursor.execute("SELECT foto FROM produtos WHERE id = ?", (product_id,))
+    row = cursor.fetchone()
+    foto = row["foto"] if row else None
+    remover_foto = bool(foto) and not foto_em_uso(foto, exceto_id=product_id)
+
+    # 2. Deleta do banco de dados
+    cursor.execute("DELETE FROM produtos WHERE id = ?", (product_id,))
+    if remover_foto:
+        cursor.execute("DELETE FROM fotos WHERE nome = ?", (foto,))
+    conn.commit()
+    conn.close()
+
+    # 3. O arquivo só é apagado depois da exclusão confirmada (se a escrita falhar, a foto continua lá)
+    if remover_foto:
+        try:
+            os.remove(os.path.join(ASSETS_DIR, foto))
+        except FileNotFoundError:
+            pass # Ignora se a foto já não existir
+
+@instrumented
+@repetir_se_ocupado
+def mark_produto_as_sold(product_id, quantity_sold=1, local_id=None):
+    """Registra a venda e a data da última venda (do local padrão se `local_id` não for informado).
+
+    A verificação do estoque e a baixa são o mesmo UPDATE condicional, então duas vendas
+    simultâneas do último item não deixam o estoque negativo. Retorna False (sem alterar
+    nada) se o local não tiver `quantity_sold` unidades.
+    """
+    if quantity_sold <= 0:
+        return False
+    if local_id is None:
+        local_id = LOCAL_PADRAO_ID
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    # Usa ISO format para facilitar a conversão de volta
+    agora = datetime.now().isoformat()
+
+    try:
+        # O trigger de estoque_local recalcula o total em produtos
+        cursor.execute(
+            "UPDATE estoque_local SET quantidade = quantidade - ? WHERE produto_id = ? AND local_id = ? AND quantidade >= ?",
+            (quantity_sold, product_id, local_id, quantity_sold)
+        )
+        if cursor.rowcount == 0:
+            return False
+        cursor.execute(
+            "UPDATE produtos SET vendido = 1, data_ultima_venda = ? WHERE id = ?",
+            (agora, product_id)
+        )
+        # Histórico de vendas usado pela previsão de demanda
+        cursor.execute(
+            "INSERT INTO vendas (produto_id, local_id, quantidade, preco, data) SELECT id, ?, ?, preco, ? FROM produtos WHERE id = ?",
+            (local_id, quantity_sold, agora, product_id)
+        )
+        conn.commit()
+        return True
+    finally:
+        # Sem commit (estoque insuficiente ou erro), a transação é desfeita
+        conn.close()
+
+# ====================================================================
+# ARQUIVO (EXCLUSÃO LÓGICA)
+# ====================================================================
+
+@instrumented
+@repetir_se_ocupado
+def arquivar_produto(product_id):
+    """Arquiva um produto esgotado: some das listagens e do catálogo, mas mantém foto, histórico e vendas.
+
+    Retorna False se o produto não existir ou já estiver arquivado. Levanta ValueError se
+    ainda houver estoque (as unidades precisam ser vendidas, transferidas ou baixadas antes).
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        "UPDATE produtos SET arquivado_em = ? WHERE id = ? AND arquivado_em IS NULL AND quantidade = 0",
+        (datetime.now().isoformat(), product_id)
+    )
+    arquivado = cursor.rowcount > 0
+    if not arquivado:
+        cursor.execute("SELECT quantidade FROM produtos WHERE id = ? AND arquivado_em IS NULL", (product_id,))
+        row = cursor.fetchone()
+        if row is not None:
+            conn.close()
+            raise ValueError(f"O produto ainda tem {row['quantidade']} unidade(s) em estoque; zere o estoque antes de arquivar.")
+    conn.commit()
+    conn.close()
+    return arquivado
+
+@instrumented
+@repetir_se_ocupado
+def restaurar_produto(product_id):
+    """Devolve um produto arquivado às listagens (com estoque zero, pronto para reposição)."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("UPDATE produtos SET arquivado_em = NULL WHERE id = ? AND arquivado_em IS NOT NULL", (product_id,))
+    restaurado = cursor.rowcount > 0
+    conn.commit()
+    conn.close()
+    return restaurado
+
+@instrumented
+def get_produtos_arquivados():
+    """Produtos arquivados, os mais recentes primeiro (com a data em 'arquivado_em')."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT * FROM vw_produtos_arquivados ORDER BY arquivado_em DESC, id DESC")
+    produtos = [dict(row) for row in cursor.fetchall()]
+    conn.close()
+    return produtos
+
+@instrumented
+@repetir_se_ocupado
+def arquivar_sem_movimento(meses=ARQUIVAR_APOS_MESES, simular=False):
+    """Arquiva os produtos esgotados sem venda nem alteração nos últimos `meses` meses.
+
+    "Sem movimento" = nenhuma venda (data_ultima_venda) e nenhum registro no log de
+    alterações desde a data de corte, então produtos recém-cadastrados ou repostos ficam.
+    Com `simular=True` só lista os candidatos. Retorna [{'id', 'nome', 'data_ultima_venda'}].
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("BEGIN IMMEDIATE")
+        cursor.execute("SELECT strftime('%Y-%m-%dT%H:%M:%f', 'now', 'localtime', ?)", (f"-{int(meses)} months",))
+        corte = cursor.fetchone()[0]
+        cursor.execute(
+            """
+            SELECT p.id, p.nome, p.data_ultima_venda FROM produtos p
+            WHERE p.arquivado_em IS NULL AND p.quantidade = 0
+              AND COALESCE(p.data_ultima_venda, '') < ?
+              AND NOT EXISTS (SELECT 1 FROM produtos_changes c WHERE c.produto_id = p.id AND c.ts >= ?)
+            ORDER BY p.nome
+            """,
+            (corte, corte)
+        )
+        candidatos = [dict(row) for row in cursor.fetchall()]
+        if candidatos and not simular:
+            cursor.executemany(
+                "UPDATE produtos SET arquivado_em = ? WHERE id = ? AND arquivado_em IS NULL AND quantidade = 0",
+                [(datetime.now().isoformat(), p["id"]) for p in candidatos]
+            )
+        conn.commit()
+        return candidatos
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+# ====================================================================
+# INTEGRIDADE DOS DADOS
+# ====================================================================
+
+@instrumented
+@repetir_se_ocupado
+def verificar_integridade(reparar=False):
+    """Procura produtos e estoques que violam as regras de integridade (REGRAS_PRODUTOS).
+
+    Com `reparar`, corrige numa única transação o que tem correção segura: estoque negativo
+    vira 0, datas em outro formato são convertidas (ilegíveis são apagadas) e preço em texto
+    vira número. Nome vazio e preço zero são só listados ('reparavel' False), para correção
+    na edição do produto. Retorna a lista encontrada (veja _encontrar_invalidos).
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        if reparar:
+            cursor.execute("BEGIN IMMEDIATE")
+        invalidos = _encontrar_invalidos(cursor)
+        if reparar:
+            _reparar_invalidos(cursor, invalidos)
+            conn.commit()
+    finally:
+        conn.close()
+    return invalidos
+
+# ====================================================================
+# ESTOQUE POR LOCAL
+# ====================================================================
+
+@instrumented
+def get_locais():
+    """Retorna os locais de estoque cadastrados."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT id, nome FROM locais ORDER BY id ASC")
+    locais = [dict(row) for row in cursor.fetchall()]
+    conn.close()
+    return locais
+
+@instrumented
+@repetir_se_ocupado
+def add_local(nome):
+    """Cadastra um novo local de estoque. Retorna False se o nome já existir."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("INSERT INTO locais (nome) VALUES (?)", (nome,))
+        conn.commit()
+        return True
+    except sqlite3.IntegrityError:
+        return False
+    finally:
+        conn.close()
+
+@instrumented
+def get_estoque_por_local(product_id):
+    """Retorna a quantidade do produto em cada local (locais sem estoque aparecem com 0)."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        """
+        SELECT l.id AS local_id, l.nome, COALESCE(e.quantidade, 0) AS quantidade
+        FROM locais l LEFT JOIN estoque_local e ON e.local_id = l.id AND e.produto_id = ?
+        ORDER BY l.id ASC
+        """,
+        (product_id,)
+    )
+    estoque = [dict(row) for row in cursor.fetchall()]
+    conn.close()
+    return estoque
+
+@instrumented
+@repetir_se_ocupado
+def transfer_estoque(product_id, origem_id, destino_id, quantidade):
+    """Transfere unidades entre dois locais numa única transação.
+
+    Retorna False (sem alterar nada) se a origem não tiver unidades suficientes ou se o
+    produto estiver arquivado. Levanta ValueError se algum dos locais não existir.
+    """
+    if quantidade <= 0 or origem_id == destino_id:
+        return False
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("BEGIN IMMEDIATE")
+        _validar_locais(cursor, origem_id, destino_id)
+        cursor.execute(
+            """
+            UPDATE estoque_local SET quantidade = quantidade - ?
+            WHERE produto_id = ? AND local_id = ? AND quantidade >= ?
+              AND produto_id IN (SELECT id FROM produtos WHERE arquivado_em IS NULL)
+            """,
+            (quantidade, product_id, origem_id, quantidade)
+        )
+        if cursor.rowcount == 0:
+            conn.rollback()
+            return False
+        cursor.execute(
+            """
+            INSERT INTO estoque_local (produto_id, local_id, quantidade) VALUES (?, ?, ?)
+            ON CONFLICT (produto_id, local_id) DO UPDATE SET quantidade = quantidade + excluded.quantidade
+            """,
+            (product_id, destino_id, quantidade)
+        )
+        conn.commit()
+        return True
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+def _filtros_categoria(valores, exceto=None):
+    """Condições SQL (sobre o alias p) para filtrar categorias pelo nome, comparando ids."""
+    filtros, params = [], []
+    for campo, valor in valores.items():
+        if campo != exceto and valor is not None:
+            filtros.append(f"p.{campo}_id = (SELECT id FROM {CATEGORIAS[campo]} WHERE nome = ?)")
+            params.append(valor)
+    return filtros, params
+
+@instrumented
+def get_totais_estoque(local_id=None, marca=None, estilo=None, tipo=None):
+    """Calcula no SQL o número de produtos, unidades e valor (preço x quantidade) do estoque filtrado.
+
+    Produtos arquivados não são contados (sempre têm estoque zero, então não mudam unidades nem valor).
+    """
+    filtros, params = _filtros_categoria({"marca": marca, "estilo": estilo, "tipo": tipo})
+    where = "".join(f" AND {f}" for f in ["p.arquivado_em IS NULL"] + filtros)
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    if local_id is None:
+        cursor.execute(
+            f"""
+            SELECT COUNT(*) AS produtos, COALESCE(SUM(p.quantidade), 0) AS unidades,
+                   COALESCE(SUM(p.preco * p.quantidade), 0) AS valor
+            FROM produtos p WHERE 1 = 1{where}
+            """,
+            params
+        )
+    else:
+        cursor.execute(
+            f"""
+            SELECT COUNT(*) AS produtos, COALESCE(SUM(e.quantidade), 0) AS unidades,
+                   COALESCE(SUM(p.preco * e.quantidade), 0) AS valor
+            FROM estoque_local e JOIN produtos p ON p.id = e.produto_id
+            WHERE e.local_id = ?{where}
+            """,
+            [local_id] + params
+        )
+    totais = dict(cursor.fetchone())
+    conn.close()
+    return totais
+
+@instrumented
+def get_totais_por_local():
+    """Retorna unidades e valor em estoque de cada local (mantidos por trigger, sem agregar na leitura)."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT id AS local_id, nome, unidades, valor FROM locais ORDER BY id ASC")
+    totais = [dict(row) for row in cursor.fetchall()]
+    conn.close()
+    return totais
+
+@instrumented
+@repetir_se_ocupado
+def recalcular_totais_locais():
+    """Recalcula locais.unidades/valor a partir de estoque_local (corrige arredondamentos acumulados)."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(_RECALCULAR_LOCAIS)
+    conn.commit()
+    conn.close()
+
+# ====================================================================
+# FOTOS
+# ====================================================================
+
+@instrumented
+@repetir_se_ocupado
+def registrar_foto(nome, largura, altura, bytes):
+    """Registra (ou atualiza) dimensões e tamanho de uma foto de ASSETS_DIR."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        """
+        INSERT INTO fotos (nome, largura, altura, bytes, criado_em) VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT (nome) DO UPDATE SET largura = excluded.largura, altura = excluded.altura, bytes = excluded.bytes
+        """,
+        (nome, largura, altura, bytes, datetime.now().isoformat())
+    )
+    conn.commit()
+    conn.close()
+
+@instrumented
+def foto_em_uso(nome, exceto_id=None):
+    """Indica se algum produto (além de `exceto_id`) usa o arquivo de foto."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT 1 FROM produtos WHERE foto = ? AND id IS NOT ? LIMIT 1", (nome, exceto_id))
+    em_uso = cursor.fetchone() is not None
+    conn.close()
+    return em_uso
+
+@instrumented
+def get_fotos_referenciadas():
+    """Retorna o conjunto de nomes de arquivo referenciados por produtos (uma consulta)."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT DISTINCT foto FROM produtos WHERE foto IS NOT NULL AND foto != ''")
+    fotos = {row[0] for row in cursor.fetchall()}
+    conn.close()
+    return fotos
+
+@instrumented
+def get_fotos_registradas():
+    """Retorna o conjunto de nomes registrados na tabela 'fotos' (fotos enviadas pelo app)."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT nome FROM fotos")
+    fotos = {row[0] for row in cursor.fetchall()}
+    conn.close()
+    return fotos
+
+@instrumented
+@repetir_se_ocupado
+def substituir_foto(nomes_antigos, nome_novo):
+    """Aponta os produtos que usam qualquer um de `nomes_antigos` para `nome_novo`. Retorna o nº de produtos."""
+    nomes_antigos = list(nomes_antigos)
+    if not nomes_antigos:
+        return 0
+    marcadores = ", ".join("?" * len(nomes_antigos))
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(f"UPDATE produtos SET foto = ? WHERE foto IN ({marcadores})", [nome_novo] + nomes_antigos)
+    alterados = cursor.rowcount
+    cursor.execute(f"DELETE FROM fotos WHERE nome IN ({marcadores})", nomes_antigos)
+    conn.commit()
+    conn.close()
+    return alterados
+
+@instrumented
+@repetir_se_ocupado
+def remover_registro_fotos(nomes):
+    """Apaga da tabela 'fotos' os registros de arquivos removidos."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.executemany("DELETE FROM fotos WHERE nome = ?", [(nome,) for nome in nomes])
+    conn.commit()
+    conn.close()
+
+@instrumented
+def get_foto_info(nome):
+    """Retorna {'nome', 'largura', 'altura', 'bytes', 'criado_em'} da foto, ou None se não registrada."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT * FROM fotos WHERE nome = ?", (nome,))
+    row = cursor.fetchone()
+    conn.close()
+    return dict(row) if row else None
+
+# ====================================================================
+# CATEGORIAS (MARCAS, ESTILOS, TIPOS)
+# ====================================================================
+
+def _tabela_categoria(campo):
+    if campo not in CATEGORIAS:
+        raise ValueError(f"Categoria inválida: {campo} (use {', '.join(CATEGORIAS)})")
+    return CATEGORIAS[campo]
+
+@instrumented
+def get_nomes_categoria(campo):
+    """Retorna os nomes cadastrados para 'marca', 'estilo' ou 'tipo', em ordem alfabética."""
+    tabela = _tabela_categoria(campo)
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT nome FROM {tabela} ORDER BY nome COLLATE NOCASE")
+    nomes = [row[0] for row in cursor.fetchall()]
+    conn.close()
+    return nomes
+
+@instrumented
+def get_categorias(campo):
+    """Retorna [{'id', 'nome', 'produtos'}] da categoria, com o número de produtos que a usam."""
+    tabela = _tabela_categoria(campo)
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        f"""
+        SELECT c.id, c.nome, (SELECT COUNT(*) FROM produtos p WHERE p.{campo}_id = c.id) AS produtos
+        FROM {tabela} c ORDER BY c.nome COLLATE NOCASE
+        """
+    )
+    categorias = [dict(row) for row in cursor.fetchall()]
+    conn.close()
+    return categorias
+
+@instrumented
+@repetir_se_ocupado
+def add_categoria(campo, nome):
+    """Cadastra uma categoria. Retorna False se o nome for vazio ou já existir."""
+    tabela = _tabela_categoria(campo)
+    nome = (nome or "").strip()
+    if not nome:
+        return False
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"INSERT INTO {tabela} (nome) VALUES (?)", (nome,))
+        conn.commit()
+        return True
+    except sqlite3.IntegrityError:
+        return False
+    finally:
+        conn.close()
+
+@instrumented
+@repetir_se_ocupado
+def rename_categoria(campo, categoria_id, novo_nome):
+    """Renomeia a categoria (todos os produtos passam a exibir o novo nome). Retorna False se o nome já existir."""
+    tabela = _tabela_categoria(campo)
+    novo_nome = (novo_nome or "").strip()
+    if not novo_nome:
+        return False
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"UPDATE {tabela} SET nome = ? WHERE id = ?", (novo_nome, categoria_id))
+        conn.commit()
+        return cursor.rowcount > 0
+    except sqlite3.IntegrityError:
+        return False
+    finally:
+        conn.close()
+
+@instrumented
+@repetir_se_ocupado
+def delete_categoria(campo, categoria_id):
+    """Remove a categoria se nenhum produto a usar. Retorna True se removida."""
+    tabela = _tabela_categoria(campo)
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        f"DELETE FROM {tabela} WHERE id = ? AND NOT EXISTS (SELECT 1 FROM produtos WHERE {campo}_id = ?)",
+        (categoria_id, categoria_id)
+    )
+    removida = cursor.rowcount > 0
+    conn.commit()
+    conn.close()
+    return removida
+
+# ====================================================================
+# FACETAS (OPÇÕES DE FILTRO COM CONTAGEM)
+# ====================================================================
+
+FACETAS = ("marca", "estilo", "tipo")
+
+_facetas_lock = threading.Lock()
+_facetas_cache = {"versao": None, "resultados": {}}
+
+@instrumented
+def get_versao_produtos():
+    """Versão dos dados de produtos (último seq do log + versões de estoque_local e das categorias).
+
+    Vale entre processos: qualquer escrita que afete listagens ou facetas muda o valor.
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        """
+        SELECT (SELECT COALESCE(MAX(seq), 0) FROM produtos_changes),
+               (SELECT versao FROM versoes_tabelas WHERE tabela = 'estoque_local'),
+               (SELECT versao FROM versoes_tabelas WHERE tabela = 'categorias')
+        """
+    )
+    versao = tuple(cursor.fetchone())
+    conn.close()
+    return versao
+
+@instrumented
+def get_versao_catalogo():
+    """get_versao_produtos() mais a versão das quantidades por local (muda com transferências)."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        """
+        SELECT (SELECT COALESCE(MAX(seq), 0) FROM produtos_changes),
+               (SELECT versao FROM versoes_tabelas WHERE tabela = 'estoque_local'),
+               (SELECT versao FROM versoes_tabelas WHERE tabela = 'categorias'),
+               (SELECT versao FROM versoes_tabelas WHERE tabela = 'estoque_local_quantidade')
+        """
+    )
+    versao = tuple(cursor.fetchone())
+    conn.close()
+    return versao
+
+def _calcular_facetas(local_id, filtros):
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    resultado = {}
+    for faceta in FACETAS:
+        # Cada faceta é condicionada aos outros filtros, não a ela mesma.
+        # Agrupa pelo id (índice) e só depois junta o nome da categoria.
+        where, params = [], []
+        if local_id is not None:
+            origem = "estoque_local e JOIN produtos p ON p.id = e.produto_id"
+            where.append("e.local_id = ?")
+            params.append(local_id)
+        else:
+            origem = "produtos p"
+        outros, outros_params = _filtros_categoria(filtros, exceto=faceta)
+        where += ["p.arquivado_em IS NULL"] + outros
+        params += outros_params
+        cursor.execute(
+            f"""
+            SELECT c.nome, g.total FROM (
+                SELECT p.{faceta}_id AS categoria_id, COUNT(*) AS total FROM {origem}
+                WHERE {' AND '.join(where)} GROUP BY p.{faceta}_id
+            ) g JOIN {CATEGORIAS[faceta]} c ON c.id = g.categoria_id
+            ORDER BY c.nome
+            """,
+            params
+        )
+        resultado[faceta] = [(valor, total) for valor, total in cursor.fetchall()]
+    conn.close()
+    return resultado
+
+@instrumented
+def get_facetas(local_id=None, marca=None, estilo=None, tipo=None):
+    """Retorna {'marca': [(valor, nº de produtos)], 'estilo': [...], 'tipo': [...]}.
+
+    As contagens de cada faceta consideram o local e os filtros das outras facetas.
+    O resultado fica em cache no processo até a versão dos produtos mudar.
+    """
+    versao = get_versao_produtos()
+    chave = (local_id, marca, estilo, tipo)
+    with _facetas_lock:
+        if _facetas_cache["versao"] != versao:
+            _facetas_cache["versao"] = versao
+            _facetas_cache["resultados"] = {}
+        elif chave in _facetas_cache["resultados"]:
+            return _facetas_cache["resultados"][chave]
+
+    resultado = _calcular_facetas(local_id, {"marca": marca, "estilo": estilo, "tipo": tipo})
+    with _facetas_lock:
+        if _facetas_cache["versao"] == versao:
+            _facetas_cache["resultados"][chave] = resultado
+    return resultado
+
+# ====================================================================
+# HISTÓRICO DO ESTOQUE (FOTOGRAFIAS DIÁRIAS)
+# ====================================================================
+
+@instrumented
+@repetir_se_ocupado
+def criar_snapshot(data=None):
+    """Grava a fotografia do estoque atual com a data informada (padrão: hoje).
+
+    Refazer a fotografia do mesmo dia substitui a anterior. Retorna os totais do dia.
+    """
+    data = data or date.today().isoformat()
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("BEGIN IMMEDIATE")
+    cursor.execute("DELETE FROM stock_snapshots WHERE data = ?", (data,))
+    cursor.execute(
+        """
+        INSERT INTO stock_snapshots (data, produto_id, quantidade, preco, marca_id, estilo_id, tipo_id)
+        SELECT ?, id, quantidade, preco, marca_id, estilo_id, tipo_id FROM produtos WHERE quantidade > 0
+        """,
+        (data,)
+    )
+    cursor.execute(
+        """
+        INSERT OR REPLACE INTO stock_snapshot_dias (data, produtos, unidades, valor, criado_em)
+        SELECT ?, COUNT(*), COALESCE(SUM(quantidade), 0), COALESCE(SUM(preco * quantidade), 0), ?
+        FROM stock_snapshots WHERE data = ?
+        """,
+        (data, datetime.now().isoformat(), data)
+    )
+    cursor.execute("SELECT data, produtos, unidades, valor FROM stock_snapshot_dias WHERE data = ?", (data,))
+    totais = dict(cursor.fetchone())
+    conn.commit()
+    conn.close()
+    return totais
+
+# Último dia em que este processo viu a fotografia gravada (app.py chama a cada rerun)
+_snapshot_garantido_em = None
+
+@instrumented
+def garantir_snapshot_do_dia():
+    """Cria a fotografia de hoje se ela ainda não existir. Retorna True se criou.
+
+    O banco é consultado uma vez por dia em cada processo; as chamadas seguintes não o acessam.
+    """
+    global _snapshot_garantido_em
+    hoje = date.today().isoformat()
+    if _snapshot_garantido_em == hoje:
+        return False
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT 1 FROM stock_snapshot_dias WHERE data = ?", (hoje,))
+    existe = cursor.fetchone() is not None
+    conn.close()
+    if not existe:
+        criar_snapshot(hoje)
+    _snapshot_garantido_em = hoje
+    return not existe
+
+def _data_snapshot(cursor, data):
+    """Data da fotografia mais recente até 'data' (inclusive), ou None."""
+    cursor.execute("SELECT MAX(data) FROM stock_snapshot_dias WHERE data <= ?", (data,))
+    return cursor.fetchone()[0]
+
+@instrumented
+def get_valor_estoque_em(data, agrupar_por=None):
+    """Valor do estoque numa data, pela fotografia mais recente até ela.
+
+    Retorna {'data': data da fotografia, 'produtos', 'unidades', 'valor', 'grupos'}, onde
+    'grupos' ([{'nome', 'produtos', 'unidades', 'valor'}]) só é preenchido com agrupar_por
+    ('marca', 'estilo' ou 'tipo'). Retorna None se não houver fotografia até a data.
+    """
+    if agrupar_por is not None:
+        _tabela_categoria(agrupar_por)
+    data = data.isoformat() if isinstance(data, date) else data
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    data_snapshot = _data_snapshot(cursor, data)
+    if data_snapshot is None:
+        conn.close()
+        return None
+
+    cursor.execute("SELECT data, produtos, unidades, valor FROM stock_snapshot_dias WHERE data = ?", (data_snapshot,))
+    resultado = dict(cursor.fetchone())
+    resultado["grupos"] = []
+    if agrupar_por is not None:
+        cursor.execute(
+            f"""
+            SELECT COALESCE(c.nome, '(sem {agrupar_por})') AS nome, g.produtos, g.unidades, g.valor FROM (
+                SELECT {agrupar_por}_id AS categoria_id, COUNT(*) AS produtos,
+                       SUM(quantidade) AS unidades, SUM(preco * quantidade) AS valor
+                FROM stock_snapshots WHERE data = ? GROUP BY {agrupar_por}_id
+            ) g LEFT JOIN {CATEGORIAS[agrupar_por]} c ON c.id = g.categoria_id
+            ORDER BY g.valor DESC
+            """,
+            (data_snapshot,)
+        )
+        resultado["grupos"] = [dict(row) for row in cursor.fetchall()]
+    conn.close()
+    return resultado
+
+@instrumented
+def get_historico_valor(desde=None, ate=None, agrupar_por=None):
+    """Série do valor em estoque por dia de fotografia, para gráficos.
+
+    Sem agrupar_por, lê os totais diários: [{'data', 'produtos', 'unidades', 'valor'}].
+    Com agrupar_por ('marca', 'estilo' ou 'tipo'), cada linha traz também 'nome'.
+    """
+    if agrupar_por is not None:
+        _tabela_categoria(agrupar_por)
+    desde = desde.isoformat() if isinstance(desde, date) else (desde or "0000-00-00")
+    ate = ate.isoformat() if isinstance(ate, date) else (ate or "9999-99-99")
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    if agrupar_por is None:
+        cursor.execute(
+            """
+            SELECT data, produtos, unidades, valor FROM stock_snapshot_dias
+            WHERE data BETWEEN ? AND ? ORDER BY data
+            """,
+            (desde, ate)
+        )
+    else:
+        cursor.execute(
+            f"""
+            SELECT g.data, COALESCE(c.nome, '(sem {agrupar_por})') AS nome, g.produtos, g.unidades, g.valor FROM (
+                SELECT data, {agrupar_por}_id AS categoria_id, COUNT(*) AS produtos,
+                       SUM(quantidade) AS unidades, SUM(preco * quantidade) AS valor
+                FROM stock_snapshots WHERE data BETWEEN ? AND ? GROUP BY data, {agrupar_por}_id
+            ) g LEFT JOIN {CATEGORIAS[agrupar_por]} c ON c.id = g.categoria_id
+            ORDER BY g.data, nome
+            """,
+            (desde, ate)
+        )
+    historico = [dict(row) for row in cursor.fetchall()]
+    conn.close()
+    return historico
+
+# ====================================================================
+# VENDAS E PREVISÃO DE DEMANDA
+# ====================================================================
+
+@instrumented
+def get_vendas_diarias(desde):
+    """Unidades vendidas por produto e dia desde a data (AAAA-MM-DD): [(produto_id, dia, quantidade)]."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        """
+        SELECT produto_id, substr(data, 1, 10) AS dia, SUM(quantidade) AS quantidade
+        FROM vendas WHERE data >= ? GROUP BY produto_id, dia
+        """,
+        (desde,)
+    )
+    vendas = [tuple(row) for row in cursor.fetchall()]
+    conn.close()
+    return vendas
+
+@instrumented
+def get_ultima_venda_id():
+    """Id da venda mais recente (0 se não houver); muda a cada venda registrada."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT COALESCE(MAX(id), 0) FROM vendas")
+    ultima = cursor.fetchone()[0]
+    conn.close()
+    return ultima
+
+@instrumented
+@repetir_se_ocupado
+def salvar_previsoes(linhas, ultima_venda_id, parametros):
+    """Substitui as previsões pré-calculadas: linhas = [(produto_id, media_movel, demanda_diaria)]."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("BEGIN IMMEDIATE")
+    cursor.execute("DELETE FROM previsoes_demanda")
+    cursor.executemany(
+        "INSERT INTO previsoes_demanda (produto_id, media_movel, demanda_diaria) VALUES (?, ?, ?)", linhas
+    )
+    cursor.execute(
+        """
+        INSERT OR REPLACE INTO previsoes_demanda_status (id, calculado_em, ultima_venda_id, parametros)
+        VALUES (1, ?, ?, ?)
+        """,
+        (datetime.now().isoformat(), ultima_venda_id, json.dumps(parametros, sort_keys=True))
+    )
+    conn.commit()
+    conn.close()
+
+@instrumented
+def get_status_previsoes():
+    """Quando as previsões foram calculadas: {'calculado_em', 'ultima_venda_id', 'parametros'} ou None."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT calculado_em, ultima_venda_id, parametros FROM previsoes_demanda_status WHERE id = 1")
+    row = cursor.fetchone()
+    conn.close()
+    if row is None:
+        return None
+    status = dict(row)
+    status["parametros"] = json.loads(status["parametros"])
+    return status
+
+@instrumented
+def get_previsoes_salvas():
+    """Previsões pré-calculadas com os dados atuais de cada produto (nome, categorias, quantidade)."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        """
+        SELECT p.id, p.nome, p.marca, p.estilo, p.tipo, p.preco, p.quantidade,
+               COALESCE(d.media_movel, 0) AS media_movel, COALESCE(d.demanda_diaria, 0) AS demanda_diaria
+        FROM vw_produtos p LEFT JOIN previsoes_demanda d ON d.produto_id = p.id
+        """
+    )
+    previsoes = [dict(row) for row in cursor.fetchall()]
+    conn.close()
+    return previsoes
+
+# ====================================================================
+# MANUTENÇÃO DO BANCO
+# ====================================================================
+
+def _tamanho_banco():
+    return sum(os.path.getsize(DATABASE + sufixo) for sufixo in ("", "-wal") if os.path.exists(DATABASE + sufixo))
+
+def otimizar_banco(vacuum=True):
+    """Executa VACUUM (opcional), ANALYZE e PRAGMA optimize. Retorna o tamanho em bytes antes e depois."""
+    antes = _tamanho_banco()
+    conn = get_db_connection()
+    if vacuum:
+        conn.execute("VACUUM")
+    conn.execute("ANALYZE")
+    conn.execute("PRAGMA optimize")
+    conn.close()
+    return {"antes": antes, "depois": _tamanho_banco()}
+
+# ====================================================================
+# LOG DE ALTERAÇÕES (CHANGE DATA CAPTURE / AUDITORIA)
+# ====================================================================
+
+def _change_row(row):
+    change = dict(row)
+    for campo in ("old_values", "new_values"):
+        change[campo] = json.loads(change[campo]) if change[campo] else {}
+    change["changed_columns"] = change["changed_columns"].split(",") if change["changed_columns"] else []
+    return change
+
+@instrumented
+def get_last_change_seq():
+    """Retorna o último número de sequência do log (0 se vazio). Serve como versão da tabela produtos."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT COALESCE(MAX(seq), 0) FROM produtos_changes")
+    seq = cursor.fetchone()[0]
+    conn.close()
+    return seq
+
+@instrumented
+def get_changes_since(seq, limit=1000):
+    """Retorna as alterações com sequência maior que `seq`, em ordem (busca pela chave primária)."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT * FROM produtos_changes WHERE seq > ? ORDER BY seq ASC LIMIT ?", (seq, limit))
+    changes = [_change_row(row) for row in cursor.fetchall()]
+    conn.close()
+    return changes
+
+@instrumented
+def get_audit_log(produto_id=None, desde=None, ate=None, limit=200):
+    """Retorna as alterações mais recentes, filtradas por produto e/ou período (datas ISO, inclusivas)."""
+    filtros, params = [], []
+    if produto_id is not None:
+        filtros.append("produto_id = ?")
+        params.append(produto_id)
+    if desde is not None:
+        filtros.append("ts >= ?")
+        params.append(str(desde))
+    if ate is not None:
+        # Inclui o dia inteiro quando `ate` é só uma data
+        filtros.append("ts < ?")
+        params.append(f"{ate}T99" if len(str(ate)) == 10 else str(ate))
+    where = ("WHERE " + " AND ".join(filtros)) if filtros else ""
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT * FROM produtos_changes {where} ORDER BY ts DESC, seq DESC LIMIT ?", params + [limit])
+    changes = [_change_row(row) for row in cursor.fetchall()]
+    conn.close()
+    return changes
+
+# ====================================================================
+# FUNÇÕES DE USUÁRIOS (LOGIN/ADMIN)
+# ====================================================================
+
+def get_users_version():
+    """Retorna a versão atual dos dados de usuários (incrementada por trigger a cada alteração).
+
+    Fica no banco, então uma alteração feita por outro processo também invalida os caches de permissões.
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT versao FROM versoes_tabelas WHERE tabela = 'users'")
+    row = cursor.fetchone()
+    conn.close()
+    return row[0] if row else 0
+
+@instrumented
+@repetir_se_ocupado
+def add_user(username, password, role="staff"):
+    """Adiciona um novo usuário (admin ou staff) ao banco de dados."""
+    hashed_pass = hash_password(password)
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            "INSERT INTO users (username, password, role) VALUES (?, ?, ?)",
+            (username, hashed_pass, role)
+        )
+        conn.commit()
+        return True
+    except sqlite3.IntegrityError:
+        # Usuário já existe (campo username é UNIQUE)
+        return False
+    finally:
+        conn.close()
+
+@instrumented
+def get_user(username):
+    """Busca um usuário pelo nome de usuário."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT * FROM users WHERE username = ?", (username,))
+    user = cursor.fetchone()
+    conn.close()
+    return dict(user) if user else None
+
+@instrumented
+@repetir_se_ocupado
+def update_user_password(username, hashed_password):
+    """Substitui o hash de senha de um usuário (ex.: migração do SHA256 legado para scrypt)."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("UPDATE users SET password = ? WHERE username = ?", (hashed_password, username))
+    conn.commit()
+    conn.close()
+
+@instrumented
+@repetir_se_ocupado
+def update_user_role(username, role):
+    """Altera o papel de um usuário. Não permite rebaixar o último admin; retorna True se alterou."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        """
+        UPDATE users SET role = ?
+        WHERE username = ?
+          AND (? = 'admin' OR role != 'admin' OR (SELECT COUNT(*) FROM users WHERE role = 'admin') > 1)
+        """,
+        (role, username, role)
+    )
+    alterado = cursor.rowcount > 0
+    conn.commit()
+    conn.close()
+    return alterado
+
+@instrumented
+@repetir_se_ocupado
+def delete_user(username):
+    """Remove um usuário. Não permite remover o último admin; retorna True se removeu."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        """
+        DELETE FROM users
+        WHERE username = ?
+          AND (role != 'admin' OR (SELECT COUNT(*) FROM users WHERE role = 'admin') > 1)
+        """,
+        (username,)
+    )
+    removido = cursor.rowcount > 0
+    conn.commit()
+    conn.close()
+    return removido
+
+@instrumented
+def get_all_users():
+    """Retorna todos os usuários cadastrados (sem senhas)."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT username, role FROM users ORDER BY role DESC, username ASC")
+    users = [dict(row) for row in cursor.fetchall()]
+    conn.close()
+    return users
+
+# ====================================================================
+# FUNÇÕES DE EXPORTAÇÃO/IMPORTAÇÃO (CSV/PDF)
+# ====================================================================
+
+@instrumented
+def export_produtos_to_csv(filepath):
+    """Exporta todos os produtos para um arquivo CSV."""
+    produtos = get_all_produtos()
+    if not produtos:
+        return
+        
+    fieldnames = list(produtos[0].keys())
+    with open(filepath, 'w', newline='', encoding='utf-8') as csvfile:
+        writer = csv.DictWriter(csvfile, fieldnames=fieldnames, extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(produtos)
+
+@instrumented
+@repetir_se_ocupado
+def import_produtos_from_csv(filepath):
+    """Importa produtos de um arquivo CSV (apenas adiciona novos; códigos de barras já cadastrados são ignorados)."""
+    # Arquivo aberto antes do bloqueio: um caminho inválido não segura o banco
+    with open(filepath, 'r', encoding='utf-8') as csvfile:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        count = 0
+        try:
+            # Bloqueio pego antes da primeira linha: "banco ocupado" não é confundido com erro de uma linha
+            cursor.execute("BEGIN IMMEDIATE")
+            reader = csv.DictReader(csvfile)
+            for row in reader:
+                # Mesmas regras dos formulários (utils/validacao.py); datas DD/MM/AAAA viram AAAA-MM-DD
+                try:
+                    campos = validar_produto({
+                        'nome': row.get('nome'), 'preco': row.get('preco'), 'quantidade': row.get('quantidade') or 0,
+                        'data_validade': row.get('data_validade'), 'data_ultima_venda': row.get('data_ultima_venda'),
+                    })
+                    vendido = int(row.get('vendido') or 0)
+                except ValueError:
+                    # Pula a linha se algum campo estiver inválido
+                    continue
+
+                # Insere um NOVO produto (ID será AUTOINCREMENT). As categorias novas só são cadastradas
+                # com o produto: se a linha for recusada, o savepoint desfaz as duas coisas
+                cursor.execute("SAVEPOINT linha_csv")
+                try:
+                    cursor.execute(
+                        """
+                        INSERT INTO produtos (nome, preco, quantidade, marca_id, estilo_id, tipo_id, foto, data_validade, vendido, data_ultima_venda, codigo_barras)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                        """,
+                        (
+                            campos['nome'], campos['preco'], campos['quantidade'], _categoria_id(cursor, 'marca', row.get('marca')),
+                            _categoria_id(cursor, 'estilo', row.get('estilo')), _categoria_id(cursor, 'tipo', row.get('tipo')),
+                            row.get('foto') or None, campos['data_validade'], vendido, campos['data_ultima_venda'],
+                            normalizar_codigo(row.get('codigo_barras'))
+                        )
+                    )
+                    cursor.execute("RELEASE linha_csv")
+                    count += 1
+                except sqlite3.IntegrityError:
+                    # Código de barras já cadastrado: o produto já existe, não duplica
+                    cursor.execute("ROLLBACK TO linha_csv")
+                    cursor.execute("RELEASE linha_csv")
+                except sqlite3.OperationalError:
+                    # Banco ocupado/travado: desfaz a importação inteira (repetir_se_ocupado tenta de novo)
+                    raise
+                except Exception as e:
+                    # Outros erros numa linha: registra e continua
+                    cursor.execute("ROLLBACK TO linha_csv")
+                    cursor.execute("RELEASE linha_csv")
+                    logger.warning("Erro ao inserir linha %d do CSV: %s", reader.line_num, e)
+            conn.commit()
+            return count
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+
+@instrumented
+def generate_stock_pdf(filepath):
+    """Gera um relatório PDF com a lista de produtos (layout em utils/pdf_layout.py)."""
+    produtos = get_all_produtos()
+    c = canvas.Canvas(filepath, pagesize=A4)
+    gerado_em = f'Data de Geração: {datetime.now().strftime("%d/%m/%Y %H:%M:%S")}'
+
     if not produtos:
-        # Cria um arquivo vazio se não houver produtos
-        c = canvas.Canvas(filepath, pagesize=A4)
-        c.setFont('Helvetica-Bold', 12)
+        # Cria um arquivo só com o aviso se não houver produtos
+        fonte, negrito = registrar_fontes()
+        c.setFont(negrito, 12)
         c.drawString(cm, A4[1] - 50, 'Relatório de Estoque - Vazio')
         c.drawString(cm, A4[1] - 70, 'Nenhum produto em estoque para gerar o relatório.')
         c.save()
         return
 
-    c = canvas.Canvas(filepath, pagesize=A4)
-    width, height = A4
-    
-    y_position = height - 50
-    
-    # Título
-    c.setFont('Helvetica-Bold', 16)
-    c.drawString(cm, y_position, 'Relatório de Estoque - Cores e Fragrâncias')
-    y_position -= 20
-    
-    # Data de Geração
-    c.setFont('Helvetica', 10)
-    c.drawString(cm, y_position, f'Data de Geração: {datetime.now().strftime("%d/%m/%Y %H:%M:%S")}')
-    y_position -= 20
-    
-    # Cabeçalho da tabela
-    c.setFont('Helvetica-Bold', 10)
-    col_x = [cm, cm*5, cm*10, cm*13, cm*15, cm*17.5] # Posições X das colunas
-    c.drawString(col_x[0], y_position, 'Nome')
-    c.drawString(col_x[1], y_position, 'Marca/Estilo')
-    c.drawString(col_x[2], y_position, 'Tipo')
-    c.drawString(col_x[3], y_position, 'Qtd')
-    c.drawString(col_x[4], y_position, 'Preço')
-    c.drawString(col_x[5], y_position, 'Validade')
-    y_position -= 5
-    c.line(cm, y_position, width - cm, y_position)
-    y_position -= 15
-    
-    # Conteúdo da tabela
-    c.setFont('Helvetica', 9)
-    for p in produtos:
-        if y_position < 40: # Se estiver chegando no fim da página
-            c.showPage() # Nova página
-            y_position = height - 50
-            # Repete o cabeçalho
-            c.setFont('Helvetica-Bold', 10)
-            c.drawString(col_x[0], y_position, 'Nome')
-            c.drawString(col_x[1], y_position, 'Marca/Estilo')
-            c.drawString(col_x[2], y_position, 'Tipo')
-            c.drawString(col_x[3], y_position, 'Qtd')
-            c.drawString(col_x[4], y_position, 'Preço')
-            c.drawString(col_x[5], y_position, 'Validade')
-            y_position -= 5
-            c.line(cm, y_position, width - cm, y_position)
-            y_position -= 15
-            c.setFont('Helvetica', 9)
-
-        # Formatação de Data de Validade
-        validade = p.get('data_validade') or '-'
-        if validade != '-':
-            try:
-                # Converte ISO format (armazenado no DB) para DD/MM/AAAA
-                validade = datetime.fromisoformat(validade).strftime('%d/%m/%Y')
-            except ValueError:
-                pass # Mantém o valor como está se a conversão falhar
-                
-        # Garante que os campos não sejam None
-        nome = p.get('nome') or '-'
-        marca = p.get('marca') or '-'
-        estilo = p.get('estilo') or '-'
-        tipo = p.get('tipo') or '-'
-        quantidade = p.get('quantidade') or 0
-        preco = p.get('preco') or 0.0
-
-        # Desenha as linhas
-        c.drawString(col_x[0], y_position, nome[:35]) # Limita o tamanho
-        c.drawString(col_x[1], y_position, f"{marca}/{estilo}")
-        c.drawString(col_x[2], y_position, tipo[:25])
-        c.drawString(col_x[3], y_position, str(quantidade))
-        c.drawString(col_x[4], y_position, f"R$ {float(preco):.2f}")
-        c.drawString(col_x[5], y_position, validade)
-        
-        y_position -= 15
-        
+    linhas = [
+        (
+            p.get('nome') or '-',
+            f"{p.get('marca') or '-'}/{p.get('estilo') or '-'}",
+            p.get('tipo') or '-',
+            str(p.get('quantidade') or 0),
+            f"R$ {float(p.get('preco') or 0):.2f}",
+            # Data ISO (como está no banco) em DD/MM/AAAA
+            date.fromisoformat(p['data_validade']).strftime('%d/%m/%Y') if p.get('data_validade') else '-',
+        )
+        for p in produtos
+    ]
+    colunas = [('Nome', 'esquerda', True), ('Marca/Estilo', 'esquerda', True), ('Tipo', 'esquerda', True),
+               ('Qtd', 'direita', False), ('Preço', 'direita', False), ('Validade', 'esquerda', False)]
+    desenhar_tabela(c, 'Relatório de Estoque - Cores e Fragrâncias', gerado_em, colunas, linhas)
     c.save()
\ No newline at end of file
@@ -0,0 +1,212 @@
+import hashlib
+import html
+import io
+import os
+import re
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+
+from utils.database import ASSETS_DIR, registrar_foto
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow vem com o Streamlit; sem ele as fotos são gravadas como enviadas
+    Image = None
+
+# ====================================================================
+# CONFIGURAÇÃO
+# ====================================================================
+
+# Maior lado da foto após a normalização (px) e qualidade do JPEG
+FOTO_MAX_PX = int(os.environ.get("ESTOQUE_FOTO_MAX_PX", 1600))
+FOTO_QUALIDADE = int(os.environ.get("ESTOQUE_FOTO_QUALIDADE", 85))
+CHUNK_BYTES = 1024 * 1024
+
+# Endereço da rota /fotos da API (api.py) visto pelo navegador, ex.: http://192.168.0.10:8502/fotos.
+# Vazio: as páginas usam st.image, que reenvia a foto a cada rerun
+FOTOS_URL = os.environ.get("ESTOQUE_FOTOS_URL", "").rstrip("/")
+# Larguras (px) das miniaturas servidas; o pedido é arredondado para cima
+MINIATURAS_PX = (240, 360, 640)
+MINIATURAS_DIR = os.environ.get("ESTOQUE_MINIATURAS_DIR", os.path.join("data", "miniaturas"))
+
+# Re-encodar imagens é CPU; o Pillow libera o GIL durante resize/encode
+_executor = ThreadPoolExecutor(max_workers=int(os.environ.get("ESTOQUE_FOTO_WORKERS", 2)), thread_name_prefix="fotos")
+
+
+# ====================================================================
+# UPLOAD
+# ====================================================================
+
+def _nome_final(nome_original):
+    base = os.path.splitext(os.path.basename(nome_original or "foto"))[0]
+    base = re.sub(r"[^\w\- ]", "_", base).strip() or "foto"
+    extensao = ".jpg" if Image is not None else os.path.splitext(nome_original or "")[1].lower() or ".jpg"
+    return f"{int(time.time())}_{base}{extensao}"
+
+
+def para_jpeg(img):
+    """Imagem em RGB pronta para salvar como JPEG; transparência vira fundo branco."""
+    if img.mode in ("RGBA", "LA", "P", "PA"):
+        img = img.convert("RGBA")
+        fundo = Image.new("RGB", img.size, (255, 255, 255))
+        fundo.paste(img, mask=img.getchannel("A"))
+        return fundo
+    return img if img.mode == "RGB" else img.convert("RGB")
+
+
+def _escrever_atomico(destino, escrever):
+    """Escreve num arquivo temporário do mesmo diretório e troca com os.replace (nunca há arquivo pela metade)."""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(destino), prefix=".upload-", suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            escrever(f)
+        # mkstemp cria o arquivo só com leitura do dono (0600): as fotos são servidas por outros processos
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, destino)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+def salvar_foto(uploaded, assets_dir=ASSETS_DIR):
+    """Grava a foto enviada e agenda a normalização; retorna (nome_do_arquivo, Future).
+
+    O upload é copiado em blocos para um arquivo temporário e renomeado, então o
+    formulário pode gravar o produto imediatamente. Em seguida, uma thread reduz a
+    foto para FOTO_MAX_PX, corrige a orientação EXIF e a substitui atomicamente.
+    O Future resolve para {'largura', 'altura', 'bytes'}.
+    """
+    os.makedirs(assets_dir, exist_ok=True)
+    nome = _nome_final(getattr(uploaded, "name", None))
+    destino = os.path.join(assets_dir, nome)
+
+    if hasattr(uploaded, "seek"):
+        uploaded.seek(0)
+
+    def copiar(f):
+        while True:
+            bloco = uploaded.read(CHUNK_BYTES)
+            if not bloco:
+                break
+            f.write(bloco)
+
+    _escrever_atomico(destino, copiar)
+    return nome, _executor.submit(normalizar_foto, destino)
+
+
+# ====================================================================
+# NORMALIZAÇÃO (roda no pool de fotos)
+# ====================================================================
+
+def normalizar_foto(caminho):
+    """Reduz a foto para o tamanho máximo, aplica a rotação EXIF e regrava como JPEG.
+
+    Registra dimensões e tamanho final na tabela 'fotos'. Se o Pillow não estiver
+    disponível (ou a imagem não puder ser lida), o arquivo é mantido como está.
+    """
+    largura = altura = None
+    if Image is not None:
+        try:
+            # O arquivo original é fechado antes de ser substituído (necessário no Windows)
+            with Image.open(caminho) as original:
+                formato, tamanho = original.format, original.size
+                img = ImageOps.exif_transpose(original)
+                img.thumbnail((FOTO_MAX_PX, FOTO_MAX_PX), Image.LANCZOS)
+            # JPEG pequeno e sem rotação já está normalizado; re-encodar só o faria crescer
+            ja_normalizado = formato == "JPEG" and img.size == tamanho and original.getexif().get(0x0112, 1) == 1
+            img = para_jpeg(img)
+            buffer = io.BytesIO()
+            img.save(buffer, "JPEG", quality=FOTO_QUALIDADE, optimize=True, progressive=True)
+            if not (ja_normalizado and buffer.tell() >= os.path.getsize(caminho)):
+                _escrever_atomico(caminho, lambda f: f.write(buffer.getbuffer()))
+            largura, altura = img.size
+        except OSError:
+            largura = altura = None
+
+    info = {"largura": largura, "altura": altura, "bytes": os.path.getsize(caminho)}
+    registrar_foto(os.path.basename(caminho), **info)
+    return info
+
+
+# ====================================================================
+# SERVIÇO DAS FOTOS (rota /fotos da API)
+# ====================================================================
+
+# nome -> (mtime_ns, tamanho, hash do conteúdo): o hash só é recalculado quando o arquivo muda
+_versoes = {}
+
+
+def versao_foto(nome, assets_dir=ASSETS_DIR):
+    """Hash curto do conteúdo da foto (None se o nome for inválido ou o arquivo não existir)."""
+    if not nome or nome != os.path.basename(nome) or nome.startswith("."):
+        return None
+    caminho = os.path.join(assets_dir, nome)
+    try:
+        info = os.stat(caminho)
+    except OSError:
+        return None
+    chave = (info.st_mtime_ns, info.st_size)
+    guardada = _versoes.get(nome)
+    if guardada and guardada[:2] == chave:
+        return guardada[2]
+    sha = hashlib.sha256()
+    with open(caminho, "rb") as f:
+        for bloco in iter(lambda: f.read(CHUNK_BYTES), b""):
+            sha.update(bloco)
+    versao = sha.hexdigest()[:16]
+    _versoes[nome] = chave + (versao,)
+    return versao
+
+
+def _largura_miniatura(largura):
+    return next((px for px in MINIATURAS_PX if px >= largura), MINIATURAS_PX[-1])
+
+
+def arquivo_foto(nome, px=None, assets_dir=ASSETS_DIR):
+    """Caminho da foto (ou da miniatura com `px` de largura) e sua versão; None se não existir.
+
+    A miniatura é gerada na primeira vez e guardada em MINIATURAS_DIR com a versão no nome,
+    então uma foto substituída ganha miniatura nova (as de versões antigas são removidas por
+    scripts/compact_storage.py). Sem Pillow, devolve a foto original.
+    """
+    versao = versao_foto(nome, assets_dir)
+    if versao is None:
+        return None
+    original = os.path.join(assets_dir, nome)
+    if px is None or Image is None:
+        return original, versao
+
+    miniatura = os.path.join(MINIATURAS_DIR, f"{versao}_{px}.jpg")
+    if not os.path.exists(miniatura):
+        try:
+            with Image.open(original) as img:
+                img = ImageOps.exif_transpose(img)
+                img.thumbnail((px, px), Image.LANCZOS)
+                img = para_jpeg(img)
+                buffer = io.BytesIO()
+                img.save(buffer, "JPEG", quality=80, optimize=True, progressive=True)
+        except OSError:
+            return original, versao
+        os.makedirs(MINIATURAS_DIR, exist_ok=True)
+        _escrever_atomico(miniatura, lambda f: f.write(buffer.getbuffer()))
+    return miniatura, versao
+
+
+def foto_html(nome, largura):
+    """<img> com carregamento tardio apontando para a rota /fotos (None sem FOTOS_URL ou sem arquivo).
+
+    A URL leva a versão do conteúdo (?v=), então a API pode mandar o navegador guardar a
+    foto por um ano: reruns e visitas seguintes não baixam a imagem de novo.
+    """
+    versao = versao_foto(nome) if FOTOS_URL else None
+    if versao is None:
+        return None
+    # Miniatura com o dobro da largura exibida (telas de alta densidade)
+    url = f"{FOTOS_URL}/{quote(nome)}?v={versao}&px={_largura_miniatura(largura * 2)}"
+    return (f'<img src="{html.escape(url)}" width="{largura}" loading="lazy" decoding="async" '
+            f'alt="" style="max-width:100%;height:auto">')
@@ -0,0 +1,222 @@
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+# ====================================================================
+# CONFIGURAÇÃO
+# ====================================================================
+
+logger = logging.getLogger(__name__)
+
+# Consultas acima deste limite (em milissegundos) são registradas no log
+SLOW_QUERY_MS = float(os.environ.get("ESTOQUE_SLOW_QUERY_MS", "100"))
+
+# Métricas acumuladas do processo atual (compartilhadas entre as sessões do Streamlit)
+_lock = threading.Lock()
+_local = threading.local()
+_funcoes = {}
+_paginas = {}
+_queries = {}
+
+
+def _novo_registro():
+    return {"chamadas": 0, "tempo_total": 0.0, "tempo_max": 0.0, "linhas": 0, "conexoes": 0}
+
+
+def _acumular(tabela, chave, duracao, linhas=0, conexoes=0, nova_chamada=True, tempo_chamada=None):
+    with _lock:
+        registro = tabela.setdefault(chave, _novo_registro())
+        if nova_chamada:
+            registro["chamadas"] += 1
+        registro["tempo_total"] += duracao
+        registro["tempo_max"] = max(registro["tempo_max"], duracao if tempo_chamada is None else tempo_chamada)
+        registro["linhas"] += linhas
+        registro["conexoes"] += conexoes
+
+
+def _pilha():
+    """Pilha de medições abertas na thread atual (página > função > função aninhada)."""
+    if not hasattr(_local, "pilha"):
+        _local.pilha = []
+    return _local.pilha
+
+
+def _contar_linhas(resultado):
+    if isinstance(resultado, (list, tuple)):
+        return len(resultado)
+    if isinstance(resultado, dict):
+        return 1
+    return 0
+
+
+def _normalizar_sql(sql):
+    return re.sub(r"\s+", " ", sql).strip()
+
+
+# ====================================================================
+# DECORADOR E CONTEXTO DE PÁGINA
+# ====================================================================
+
+@contextmanager
+def medir(tabela, nome):
+    """Mede o tempo de um bloco e acumula as métricas em `tabela` com a chave `nome`."""
+    quadro = {"linhas": 0, "conexoes": 0}
+    pilha = _pilha()
+    pilha.append(quadro)
+    inicio = time.perf_counter()
+    try:
+        yield quadro
+    finally:
+        duracao = time.perf_counter() - inicio
+        pilha.pop()
+        _acumular(tabela, nome, duracao, quadro["linhas"], quadro["conexoes"])
+
+
+def instrumented(func):
+    """Registra chamadas, tempo, linhas retornadas e conexões abertas de uma função do banco."""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        with medir(_funcoes, func.__name__) as quadro:
+            resultado = func(*args, **kwargs)
+            quadro["linhas"] = _contar_linhas(resultado)
+            return resultado
+    return wrapper
+
+
+@contextmanager
+def page_timer(nome_pagina):
+    """Mede a renderização completa de uma página (inclusive quando interrompida por st.rerun/st.stop)."""
+    with medir(_paginas, nome_pagina) as quadro:
+        yield quadro
+
+
+def registrar_conexao():
+    """Contabiliza a abertura de uma conexão em todas as medições abertas na thread."""
+    for quadro in _pilha():
+        quadro["conexoes"] += 1
+
+
+# ====================================================================
+# CONEXÃO SQLITE INSTRUMENTADA
+# ====================================================================
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Cursor que mede execute/fetch por comando SQL."""
+
+    def _iniciar(self, sql):
+        self._chave_sql = _normalizar_sql(sql)
+        self._tempo_stmt = 0.0
+        self._lento_registrado = False
+
+    def _registrar(self, duracao, nova_chamada, linhas=0):
+        chave = getattr(self, "_chave_sql", None)
+        if chave is None:
+            return
+        # O tempo de um comando inclui o execute e os fetch* seguintes
+        self._tempo_stmt += duracao
+        _acumular(_queries, chave, duracao, linhas=linhas, nova_chamada=nova_chamada,
+                  tempo_chamada=self._tempo_stmt)
+        if self._tempo_stmt * 1000 >= SLOW_QUERY_MS and not self._lento_registrado:
+            self._lento_registrado = True
+            texto = _normalizar_sql(getattr(self.connection, "ultimo_sql", None) or chave)
+            logger.warning("Consulta lenta (%.1f ms): %s", self._tempo_stmt * 1000, texto)
+
+    def execute(self, sql, parameters=()):
+        self._iniciar(sql)
+        inicio = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._registrar(time.perf_counter() - inicio, nova_chamada=True)
+
+    def executemany(self, sql, seq_of_parameters):
+        self._iniciar(sql)
+        inicio = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self._registrar(time.perf_counter() - inicio, nova_chamada=True)
+
+    def fetchone(self):
+        inicio = time.perf_counter()
+        linha = super().fetchone()
+        self._registrar(time.perf_counter() - inicio, nova_chamada=False, linhas=int(linha is not None))
+        return linha
+
+    def fetchmany(self, size=None):
+        inicio = time.perf_counter()
+        linhas = super().fetchmany(size if size is not None else self.arraysize)
+        self._registrar(time.perf_counter() - inicio, nova_chamada=False, linhas=len(linhas))
+        return linhas
+
+    def fetchall(self):
+        inicio = time.perf_counter()
+        linhas = super().fetchall()
+        self._registrar(time.perf_counter() - inicio, nova_chamada=False, linhas=len(linhas))
+        return linhas
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """Conexão que cria cursores instrumentados e guarda o último SQL expandido (via trace callback)."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.ultimo_sql = None
+        self.set_trace_callback(self._trace)
+
+    def _trace(self, sql):
+        # Chamado pelo SQLite com os parâmetros já substituídos; usado no log de consultas lentas
+        self.ultimo_sql = sql
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+# ====================================================================
+# CONSULTA DAS MÉTRICAS
+# ====================================================================
+
+def _como_linhas(tabela, coluna):
+    with _lock:
+        itens = [(chave, dict(registro)) for chave, registro in tabela.items()]
+    linhas = []
+    for chave, registro in itens:
+        chamadas = registro["chamadas"] or 1
+        linhas.append({
+            coluna: chave,
+            "chamadas": registro["chamadas"],
+            "tempo_total_ms": round(registro["tempo_total"] * 1000, 2),
+            "tempo_medio_ms": round(registro["tempo_total"] * 1000 / chamadas, 2),
+            "tempo_max_ms": round(registro["tempo_max"] * 1000, 2),
+            "linhas": registro["linhas"],
+            "conexoes": registro["conexoes"],
+        })
+    return sorted(linhas, key=lambda r: r["tempo_total_ms"], reverse=True)
+
+
+def get_metrics():
+    """Retorna as métricas por página, por função e por consulta, ordenadas por tempo total."""
+    return {
+        "paginas": _como_linhas(_paginas, "pagina"),
+        "funcoes": _como_linhas(_funcoes, "funcao"),
+        "queries": _como_linhas(_queries, "sql"),
+    }
+
+
+def reset_metrics():
+    """Zera todas as métricas acumuladas no processo."""
+    with _lock:
+        _paginas.clear()
+        _funcoes.clear()
+        _queries.clear()
@@ -0,0 +1,178 @@
+import os
+import unicodedata
+from functools import lru_cache
+
+import reportlab
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.units import cm
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+
+# Só depende do reportlab: é usado por utils.database e pelos processos de utils.relatorios.
+
+# ====================================================================
+# FONTES
+# ====================================================================
+
+FONTE = "EstoqueSans"
+FONTE_NEGRITO = "EstoqueSans-Negrito"
+
+_FONTES_REPORTLAB = os.path.join(os.path.dirname(reportlab.__file__), "fonts")
+# (normal, negrito) na ordem de preferência: a escolhida pelo ambiente, a DejaVu Sans do sistema
+# e a Bitstream Vera que vem com o reportlab (sempre presente; Latin-1 completo)
+FONTES_TTF = [
+    (os.environ.get("ESTOQUE_PDF_FONTE"), os.environ.get("ESTOQUE_PDF_FONTE_NEGRITO")),
+    ("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf"),
+    ("C:/Windows/Fonts/DejaVuSans.ttf", "C:/Windows/Fonts/DejaVuSans-Bold.ttf"),
+    (os.path.join(_FONTES_REPORTLAB, "Vera.ttf"), os.path.join(_FONTES_REPORTLAB, "VeraBd.ttf")),
+]
+
+RETICENCIAS = "…"
+# Espaço entre colunas (pontos)
+ESPACO_COLUNAS = 6
+
+
+@lru_cache(maxsize=None)
+def registrar_fontes():
+    """Registra a TTF normal e negrito (uma vez por processo) e retorna seus nomes.
+
+    A TTF é embutida no PDF só com os glifos usados, então acentos saem iguais em qualquer leitor.
+    """
+    for normal, negrito in FONTES_TTF:
+        if normal and negrito and os.path.isfile(normal) and os.path.isfile(negrito):
+            pdfmetrics.registerFont(TTFont(FONTE, normal))
+            pdfmetrics.registerFont(TTFont(FONTE_NEGRITO, negrito))
+            return FONTE, FONTE_NEGRITO
+    return "Helvetica", "Helvetica-Bold"
+
+
+# ====================================================================
+# MEDIDA E CORTE DE TEXTO
+# ====================================================================
+
+# fonte -> {caractere: (caractere que será desenhado, largura em tamanho 1)}
+_glifos = {}
+
+
+def _glifo(fonte, ch):
+    tabela = _glifos.setdefault(fonte, {})
+    glifo = tabela.get(ch)
+    if glifo is None:
+        face = getattr(pdfmetrics.getFont(fonte), "face", None)
+        desenhado = ch
+        if face is not None and ord(ch) not in face.charToGlyph:
+            # Sem glifo na fonte: usa a letra sem o acento ("č" -> "c"); sem equivalente, "?"
+            base = "".join(b for b in unicodedata.normalize("NFKD", ch) if not unicodedata.combining(b))
+            desenhado = base if base and all(ord(b) in face.charToGlyph for b in base) else "?"
+        glifo = tabela[ch] = (desenhado, pdfmetrics.stringWidth(desenhado, fonte, 1))
+    return glifo
+
+
+def largura(texto, fonte, tamanho):
+    """Largura do texto em pontos, somando a largura de cada caractere (tabela por fonte)."""
+    return sum(_glifo(fonte, ch)[1] for ch in texto) * tamanho
+
+
+@lru_cache(maxsize=65536)
+def cortar(texto, largura_max, fonte, tamanho):
+    """Texto pronto para desenhar: normalizado (NFC), só com glifos da fonte e, se passar de
+    `largura_max`, cortado com reticências. Linear no tamanho do texto; repetições (marcas,
+    estilos) vêm do cache.
+    """
+    texto = unicodedata.normalize("NFC", " ".join(str(texto).split()))
+    limite = largura_max / tamanho
+    glifos = [_glifo(fonte, ch) for ch in texto]
+    if sum(w for _, w in glifos) <= limite:
+        return "".join(d for d, _ in glifos)
+    limite -= _glifo(fonte, RETICENCIAS)[1]
+    usado, partes = 0.0, []
+    for desenhado, w in glifos:
+        usado += w
+        if usado > limite:
+            break
+        partes.append(desenhado)
+    return "".join(partes).rstrip() + RETICENCIAS
+
+
+# ====================================================================
+# TABELA
+# ====================================================================
+
+def calcular_colunas(titulos, linhas, flexiveis, largura_total, fonte, fonte_titulo, tamanho):
+    """Larguras das colunas, calculadas uma vez por relatório.
+
+    Cada coluna tem a largura natural do maior valor (ou do título). As fixas ficam com ela;
+    as flexíveis dividem o espaço restante na proporção das larguras naturais, sem ficar
+    mais estreitas que o título.
+    """
+    naturais = []
+    for i, titulo in enumerate(titulos):
+        maior = max((largura(linha[i], fonte, tamanho) for linha in linhas), default=0.0)
+        naturais.append(max(maior, largura(titulo, fonte_titulo, tamanho)) + ESPACO_COLUNAS)
+    fixas = sum(w for w, flexivel in zip(naturais, flexiveis) if not flexivel)
+    flexivel_total = sum(w for w, flexivel in zip(naturais, flexiveis) if flexivel)
+    fator = (largura_total - fixas) / flexivel_total if flexivel_total else 0
+    return [
+        max(w * fator, largura(t, fonte_titulo, tamanho) + ESPACO_COLUNAS) if flexivel else w
+        for t, w, flexivel in zip(titulos, naturais, flexiveis)
+    ]
+
+
+def desenhar_tabela(c, titulo, subtitulo, colunas, linhas, rodape=None, tamanho=9):
+    """Tabela paginada em A4 com cabeçalho repetido em cada página.
+
+    `colunas`: [(título, alinhamento 'esquerda'/'direita', flexível)]; `linhas`: lista de
+    tuplas de textos já formatados. As larguras são calculadas uma vez e cada célula é
+    cortada com reticências para caber na coluna (tempo linear no nº de linhas).
+    """
+    fonte, negrito = registrar_fontes()
+    largura_pagina, altura_pagina = A4
+    titulos = [t for t, _, _ in colunas]
+    larguras = calcular_colunas(titulos, linhas, [f for _, _, f in colunas], largura_pagina - 2 * cm,
+                                fonte, negrito, tamanho)
+    posicoes, x = [], cm
+    for w in larguras:
+        posicoes.append(x)
+        x += w
+    alinhamentos = [a for _, a, _ in colunas]
+
+    def celula(x, w, alinhamento, texto, fonte_celula):
+        texto = cortar(texto, w - ESPACO_COLUNAS, fonte_celula, tamanho)
+        if alinhamento == "direita":
+            c.drawRightString(x + w - ESPACO_COLUNAS, y, texto)
+        else:
+            c.drawString(x, y, texto)
+
+    def cabecalho(primeira):
+        nonlocal y
+        y = altura_pagina - 50
+        if primeira:
+            c.setFont(negrito, 16)
+            c.drawString(cm, y, cortar(titulo, largura_pagina - 2 * cm, negrito, 16))
+            y -= 20
+            c.setFont(fonte, 10)
+            c.drawString(cm, y, subtitulo)
+            y -= 20
+        c.setFont(negrito, tamanho + 1)
+        for x, w, alinhamento, t in zip(posicoes, larguras, alinhamentos, titulos):
+            celula(x, w, alinhamento, t, negrito)
+        y -= 5
+        c.line(cm, y, largura_pagina - cm, y)
+        y -= 15
+        c.setFont(fonte, tamanho)
+
+    y = 0
+    cabecalho(True)
+    for linha in linhas:
+        if y < 40:
+            c.showPage()
+            cabecalho(False)
+        for x, w, alinhamento, texto in zip(posicoes, larguras, alinhamentos, linha):
+            celula(x, w, alinhamento, texto, fonte)
+        y -= 15
+    if rodape:
+        if y < 40:
+            c.showPage()
+            cabecalho(False)
+        c.setFont(negrito, tamanho + 1)
+        c.drawString(cm, y - 5, rodape)
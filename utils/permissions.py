@@ -0,0 +1,162 @@
+import threading
+
+from utils.auth import issue_session_token, read_session_token
+from utils.database import get_user, get_all_users, get_users_version, set_usuario_atual
+
+# ====================================================================
+# PAPÉIS E AÇÕES
+# ====================================================================
+
+# Ações liberadas para quem não fez login (páginas públicas de consulta)
+ACOES_PUBLICAS = frozenset({"ver_estoque", "ver_vendidos"})
+
+PERMISSOES = {
+    "staff": ACOES_PUBLICAS | {"vender", "adicionar_produto", "editar_produto", "usar_chatbot", "ver_previsao"},
+    "admin": ACOES_PUBLICAS | {
+        "vender", "adicionar_produto", "editar_produto", "usar_chatbot", "ver_previsao",
+        "remover_produto", "gerenciar_contas", "ver_diagnostico", "ver_auditoria",
+        "gerenciar_categorias",
+    },
+}
+
+ROLES = list(PERMISSOES)
+
+
+class Principal:
+    """Usuário da sessão com as permissões já resolvidas (carregado uma vez por sessão)."""
+
+    __slots__ = ("username", "role", "acoes", "versao")
+
+    def __init__(self, username, role, acoes, versao):
+        self.username = username
+        self.role = role
+        self.acoes = acoes
+        self.versao = versao
+
+    @property
+    def autenticado(self):
+        return self.username is not None
+
+    def can(self, acao):
+        """Verifica se o usuário pode executar `acao` (consulta a um frozenset, sem acessar o banco)."""
+        return acao in self.acoes
+
+
+ANONIMO = Principal(None, None, ACOES_PUBLICAS, None)
+
+
+def _principal_para(user):
+    role = user.get("role") or "staff"
+    return Principal(user["username"], role, frozenset(PERMISSOES.get(role, ACOES_PUBLICAS)), get_users_version())
+
+
+# ====================================================================
+# CACHE DE USUÁRIOS (invalidado pela versão de users)
+# ====================================================================
+
+# A versão fica no banco: alterações feitas por outro processo (outro worker) também invalidam.
+# Ela é lida antes da consulta, e o resultado só entra no cache se a versão não mudou no meio.
+_cache_lock = threading.Lock()
+_cache = {"versao": None, "usuarios": {}, "lista": None}
+
+
+def _cache_atual(versao):
+    if _cache["versao"] != versao:
+        _cache["versao"] = versao
+        _cache["usuarios"] = {}
+        _cache["lista"] = None
+    return _cache
+
+
+def lookup_user(username):
+    """get_user com cache por processo; a entrada é descartada quando os usuários mudam."""
+    versao = get_users_version()
+    with _cache_lock:
+        cache = _cache_atual(versao)
+        if username in cache["usuarios"]:
+            return cache["usuarios"][username]
+    user = get_user(username)
+    with _cache_lock:
+        if _cache["versao"] == versao:
+            _cache["usuarios"][username] = user
+    return user
+
+
+def list_users():
+    """get_all_users com cache por processo (recarregado só após alterações em users)."""
+    versao = get_users_version()
+    with _cache_lock:
+        lista = _cache_atual(versao)["lista"]
+    if lista is None:
+        lista = get_all_users()
+        with _cache_lock:
+            if _cache["versao"] == versao:
+                _cache["lista"] = lista
+    return lista
+
+
+# ====================================================================
+# SESSÃO (st.session_state)
+# ====================================================================
+
+def login(session_state, user):
+    """Registra o login na sessão: flags antigas, token assinado e principal em cache."""
+    principal = _principal_para(user)
+    set_usuario_atual(principal.username)
+    session_state["logged_in"] = True
+    session_state["username"] = principal.username
+    session_state["role"] = principal.role
+    session_state["auth_token"] = issue_session_token(principal.username, principal.role)
+    session_state["principal"] = principal
+    return principal
+
+
+def logout(session_state):
+    """Encerra a sessão e descarta o principal em cache."""
+    session_state["logged_in"] = False
+    for chave in ("username", "role", "auth_token", "principal"):
+        session_state.pop(chave, None)
+
+
+def get_principal(session_state):
+    """Retorna o principal da sessão e o registra como autor das escritas desta execução.
+
+    Usa o objeto em cache enquanto o token for válido e os usuários não tiverem mudado;
+    se o usuário foi removido ou o token expirou, a sessão é encerrada.
+    """
+    principal = _resolver_principal(session_state)
+    set_usuario_atual(principal.username)
+    return principal
+
+
+def principal_do_token(token):
+    """Principal de um token assinado enviado fora do Streamlit (API HTTP); ANONIMO se inválido.
+
+    Também registra o usuário como autor das escritas feitas pela thread atual.
+    """
+    dados = read_session_token(token)
+    user = lookup_user(dados["username"]) if dados else None
+    principal = _principal_para(user) if user else ANONIMO
+    set_usuario_atual(principal.username)
+    return principal
+
+
+def _resolver_principal(session_state):
+    if not session_state.get("logged_in"):
+        return ANONIMO
+
+    token = read_session_token(session_state.get("auth_token"))
+    principal = session_state.get("principal")
+    if token is None or (principal is not None and principal.username != token["username"]):
+        logout(session_state)
+        return ANONIMO
+
+    if principal is None or principal.versao != get_users_version():
+        user = lookup_user(token["username"])
+        if not user:
+            logout(session_state)
+            return ANONIMO
+        principal = _principal_para(user)
+        session_state["principal"] = principal
+        session_state["role"] = principal.role
+    return principal
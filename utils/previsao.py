@@ -0,0 +1,137 @@
+import math
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+
+import pandas as pd
+
+from utils.database import (
+    get_vendas_diarias, get_ultima_venda_id, salvar_previsoes, get_status_previsoes, get_previsoes_salvas,
+)
+
+# ====================================================================
+# CONFIGURAÇÃO
+# ====================================================================
+
+# Dias de vendas considerados, janela da média móvel e peso do dia mais recente na suavização exponencial
+HISTORICO_DIAS = int(os.environ.get("ESTOQUE_PREVISAO_HISTORICO_DIAS", 180))
+JANELA_DIAS = int(os.environ.get("ESTOQUE_PREVISAO_JANELA_DIAS", 28))
+ALFA = float(os.environ.get("ESTOQUE_PREVISAO_ALFA", 0.1))
+# Intervalo entre pedidos ao fornecedor e estoque de segurança, em dias de venda
+CICLO_PEDIDO_DIAS = int(os.environ.get("ESTOQUE_CICLO_PEDIDO_DIAS", 14))
+SEGURANCA_DIAS = int(os.environ.get("ESTOQUE_SEGURANCA_DIAS", 7))
+
+# Um único cálculo em segundo plano por processo
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="previsao")
+_lock = threading.Lock()
+_em_andamento = None
+
+
+def _parametros():
+    return {"historico_dias": HISTORICO_DIAS, "janela_dias": JANELA_DIAS, "alfa": ALFA}
+
+
+# ====================================================================
+# CÁLCULO (vetorizado: uma coluna por produto, uma linha por dia)
+# ====================================================================
+
+def calcular_demanda(vendas, hoje=None, historico_dias=HISTORICO_DIAS, janela_dias=JANELA_DIAS, alfa=ALFA):
+    """Demanda diária por produto a partir de [(produto_id, dia, quantidade)].
+
+    Retorna um DataFrame indexado por produto_id com 'media_movel' (média simples dos últimos
+    janela_dias) e 'demanda_diaria' (suavização exponencial; dias sem venda contam como zero,
+    então a previsão cai aos poucos quando um produto para de vender). Só produtos com venda
+    no período aparecem; os demais têm demanda zero.
+    """
+    hoje = pd.Timestamp(hoje or date.today())
+    dias = pd.date_range(end=hoje, periods=historico_dias, freq="D")
+    if not vendas:
+        return pd.DataFrame(columns=["media_movel", "demanda_diaria"], dtype=float)
+
+    df = pd.DataFrame(vendas, columns=["produto_id", "dia", "quantidade"])
+    df["dia"] = pd.to_datetime(df["dia"])
+    serie = (
+        df.pivot_table(index="dia", columns="produto_id", values="quantidade", aggfunc="sum")
+        .reindex(dias, fill_value=0)
+        .fillna(0)
+    )
+    return pd.DataFrame({
+        "media_movel": serie.iloc[-janela_dias:].mean(),
+        "demanda_diaria": serie.ewm(alpha=alfa, adjust=False).mean().iloc[-1],
+    })
+
+
+def sugerir_reposicao(quantidade, demanda_diaria, ciclo_dias=CICLO_PEDIDO_DIAS, seguranca_dias=SEGURANCA_DIAS):
+    """Dias até acabar o estoque (None sem demanda) e unidades a pedir para cobrir ciclo + segurança."""
+    quantidade = max(quantidade or 0, 0)
+    if demanda_diaria <= 0:
+        return None, 0
+    dias_ate_ruptura = quantidade / demanda_diaria
+    sugestao = max(math.ceil(demanda_diaria * (ciclo_dias + seguranca_dias) - quantidade), 0)
+    return dias_ate_ruptura, sugestao
+
+
+# ====================================================================
+# PRÉ-CÁLCULO E CACHE
+# ====================================================================
+
+def recalcular_previsoes(hoje=None):
+    """Recalcula a demanda de todos os produtos e grava em 'previsoes_demanda'. Retorna o nº de produtos com demanda."""
+    hoje = hoje or date.today()
+    # Lido antes das vendas: uma venda feita durante o cálculo deixa as previsões desatualizadas
+    ultima_venda_id = get_ultima_venda_id()
+    desde = (hoje - timedelta(days=HISTORICO_DIAS - 1)).isoformat()
+    demanda = calcular_demanda(get_vendas_diarias(desde), hoje)
+    linhas = [
+        (int(produto_id), float(media), float(diaria))
+        for produto_id, media, diaria in zip(demanda.index, demanda["media_movel"], demanda["demanda_diaria"])
+        if diaria > 0 or media > 0
+    ]
+    salvar_previsoes(linhas, ultima_venda_id, _parametros())
+    return len(linhas)
+
+
+def previsoes_desatualizadas(status=None):
+    """True se as previsões não são de hoje, houve venda depois do cálculo ou os parâmetros mudaram."""
+    status = status or get_status_previsoes()
+    return (
+        status is None
+        or datetime.fromisoformat(status["calculado_em"]).date() != date.today()
+        or status["ultima_venda_id"] != get_ultima_venda_id()
+        or status["parametros"] != _parametros()
+    )
+
+
+def agendar_recalculo():
+    """Agenda o recálculo no pool de segundo plano (não duplica se já houver um em andamento)."""
+    global _em_andamento
+    with _lock:
+        if _em_andamento is None or _em_andamento.done():
+            _em_andamento = _executor.submit(recalcular_previsoes)
+        return _em_andamento
+
+
+def calculo_em_andamento():
+    with _lock:
+        return _em_andamento is not None and not _em_andamento.done()
+
+
+def get_previsoes(ciclo_dias=CICLO_PEDIDO_DIAS, seguranca_dias=SEGURANCA_DIAS):
+    """Previsões prontas para exibir, mais urgentes primeiro; agenda o recálculo se estiverem desatualizadas.
+
+    Lê o resultado pré-calculado (a página não espera o cálculo). Dias até a ruptura e a
+    sugestão de reposição usam a quantidade atual de cada produto.
+    Retorna (linhas, status); status é None se ainda não houve nenhum cálculo.
+    """
+    status = get_status_previsoes()
+    if previsoes_desatualizadas(status):
+        agendar_recalculo()
+
+    linhas = get_previsoes_salvas()
+    for p in linhas:
+        p["dias_ate_ruptura"], p["sugestao"] = sugerir_reposicao(
+            p["quantidade"], p["demanda_diaria"], ciclo_dias, seguranca_dias
+        )
+    linhas.sort(key=lambda p: (p["dias_ate_ruptura"] is None, p["dias_ate_ruptura"] or 0, -p["demanda_diaria"]))
+    return linhas, status
@@ -0,0 +1,250 @@
+import os
+import re
+import tempfile
+import time
+import unicodedata
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+from reportlab.graphics.barcode.code128 import Code128
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.units import cm
+from reportlab.pdfgen import canvas
+
+from utils.pdf_layout import cortar, desenhar_tabela, registrar_fontes
+
+# Este módulo é importado pelos processos do pool: utils.database (cujo import cria e migra
+# as tabelas) só é importado no processo principal, dentro de gerar_relatorios.
+
+# ====================================================================
+# CONFIGURAÇÃO
+# ====================================================================
+
+AGRUPAMENTOS = ("marca", "estilo")
+# Processos que renderizam os documentos (padrão: um por núcleo)
+PROCESSOS = int(os.environ.get("ESTOQUE_RELATORIOS_PROCESSOS", os.cpu_count() or 1))
+# Grupos maiores são divididos em partes, para um grupo grande não segurar o pool sozinho
+MAX_PRODUTOS_POR_DOCUMENTO = 2000
+
+LARGURA, ALTURA = A4
+
+
+# ====================================================================
+# AUXILIARES
+# ====================================================================
+
+def _slug(texto):
+    texto = unicodedata.normalize("NFKD", texto).encode("ascii", "ignore").decode()
+    return re.sub(r"[^a-z0-9]+", "-", texto.lower()).strip("-") or "sem-nome"
+
+
+def _preco(valor):
+    return "R$ " + f"{valor:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
+
+
+def _validade(data_iso):
+    return datetime.fromisoformat(data_iso).strftime("%d/%m/%Y") if data_iso else "-"
+
+
+# ====================================================================
+# DOCUMENTOS (rodam nos processos do pool)
+# ====================================================================
+
+def _folha_estoque(c, titulo, produtos):
+    """Tabela do estoque do grupo, com totais de unidades e valor no final."""
+    colunas = [("Nome", "esquerda", True), ("Estilo/Tipo", "esquerda", True), ("Qtd", "direita", False),
+               ("Preço", "direita", False), ("Validade", "esquerda", False)]
+    linhas = [
+        (p["nome"] or "-", f"{p['estilo'] or '-'}/{p['tipo'] or '-'}", str(p["quantidade"]),
+         _preco(p["preco"]), _validade(p["data_validade"]))
+        for p in produtos
+    ]
+    unidades = sum(p["quantidade"] for p in produtos)
+    valor = sum(p["quantidade"] * p["preco"] for p in produtos)
+    desenhar_tabela(c, titulo, datetime.now().strftime("%d/%m/%Y %H:%M"), colunas, linhas,
+                    rodape=f"{len(produtos)} produto(s) · {unidades} unidade(s) · {_preco(valor)} em estoque")
+
+
+def _grade(c, produtos, colunas, linhas, desenhar):
+    """Distribui etiquetas numa grade da folha A4, com linhas de corte tracejadas."""
+    largura, altura = LARGURA / colunas, ALTURA / linhas
+    por_folha = colunas * linhas
+    for i, p in enumerate(produtos):
+        if i and i % por_folha == 0:
+            c.showPage()
+        posicao = i % por_folha
+        x = (posicao % colunas) * largura
+        y = ALTURA - (posicao // colunas + 1) * altura
+        c.setDash(2, 2)
+        c.setStrokeGray(0.7)
+        c.rect(x, y, largura, altura)
+        c.setDash()
+        c.setStrokeGray(0)
+        desenhar(p, x, y, largura, altura)
+
+
+def _etiquetas_preco(c, titulo, produtos):
+    """Etiquetas de gôndola (3 x 8 por folha): nome, marca e preço em destaque."""
+    fonte, negrito = registrar_fontes()
+
+    def desenhar(p, x, y, largura, altura):
+        margem = 0.3 * cm
+        c.setFont(negrito, 10)
+        c.drawString(x + margem, y + altura - 0.6 * cm, cortar(p["nome"] or "-", largura - 2 * margem, negrito, 10))
+        c.setFont(fonte, 8)
+        c.drawString(x + margem, y + altura - 1.05 * cm, cortar(p["marca"] or "-", largura - 2 * margem, fonte, 8))
+        c.setFont(negrito, 18)
+        c.drawRightString(x + largura - margem, y + 0.5 * cm, _preco(p["preco"]))
+
+    _grade(c, produtos, 3, 8, desenhar)
+
+
+def codigo128_valido(codigo):
+    """Code 128 só codifica ASCII; o reportlab descartaria os outros caracteres sem avisar."""
+    return bool(codigo) and all(32 <= ord(ch) < 127 for ch in codigo)
+
+
+def _barras(codigo, largura_max):
+    barras = Code128(codigo, barHeight=1.1 * cm, barWidth=0.75)
+    # Códigos longos: estreita as barras para caber na etiqueta
+    if barras.width > largura_max:
+        barras = Code128(codigo, barHeight=1.1 * cm, barWidth=0.75 * largura_max / barras.width)
+    return barras
+
+
+def _etiquetas_codigo(c, titulo, produtos):
+    """Etiquetas de código de barras (3 x 10 por folha, Code 128) dos produtos com código cadastrado.
+
+    Códigos que o Code 128 não codifica (ex.: com acento) saem só como texto na etiqueta.
+    """
+    fonte, negrito = registrar_fontes()
+
+    def desenhar(p, x, y, largura, altura):
+        margem = 0.3 * cm
+        codigo = p["codigo_barras"]
+        barras = None
+        if codigo128_valido(codigo):
+            try:
+                barras = _barras(codigo, largura - 2 * margem)
+                barras.drawOn(c, x + (largura - barras.width) / 2, y + 0.75 * cm)
+            except Exception:
+                # Um código problemático não derruba o documento (nem o .zip) inteiro
+                barras = None
+        if barras is None:
+            c.setFont(negrito, 11)
+            c.drawCentredString(x + largura / 2, y + 1.15 * cm, cortar(codigo, largura - 2 * margem, negrito, 11))
+        else:
+            c.setFont(fonte, 7)
+            c.drawCentredString(x + largura / 2, y + 0.45 * cm, codigo)
+        c.setFont(fonte, 7)
+        c.drawCentredString(x + largura / 2, y + 0.15 * cm, cortar(p["nome"] or "-", largura - 2 * margem, fonte, 7))
+
+    _grade(c, [p for p in produtos if p["codigo_barras"]], 3, 10, desenhar)
+
+
+# tipo -> (descrição, função que desenha, precisa de código de barras)
+TIPOS = {
+    "estoque": ("Folhas de estoque", _folha_estoque, False),
+    "precos": ("Etiquetas de preço", _etiquetas_preco, False),
+    "codigos": ("Etiquetas de código de barras", _etiquetas_codigo, True),
+}
+
+
+def _renderizar(tarefa, pasta):
+    """Gera um PDF da tarefa em `pasta`. Retorna (nome no .zip, caminho, segundos)."""
+    tipo, grupo, parte, produtos = tarefa
+    inicio = time.perf_counter()
+    nome = f"{tipo}/{_slug(grupo)}" + (f"-parte{parte}" if parte else "") + ".pdf"
+    caminho = os.path.join(pasta, nome.replace("/", "__"))
+    c = canvas.Canvas(caminho, pagesize=A4)
+    c.setTitle(f"{TIPOS[tipo][0]} - {grupo}")
+    TIPOS[tipo][1](c, f"{grupo}" + (f" (parte {parte})" if parte else ""), produtos)
+    c.save()
+    return nome, caminho, time.perf_counter() - inicio
+
+
+# ====================================================================
+# GERAÇÃO (processo principal)
+# ====================================================================
+
+def planejar(produtos, tipos, agrupar_por="marca"):
+    """Divide os produtos em tarefas (tipo, grupo, parte, produtos): um documento por grupo e tipo.
+
+    Só entram campos simples (os processos recebem cópias); os maiores documentos vêm
+    primeiro, para não sobrar um grupo grande sozinho no fim.
+    """
+    if agrupar_por not in AGRUPAMENTOS:
+        raise ValueError(f"Agrupamento inválido: {agrupar_por}")
+    grupos = {}
+    for p in produtos:
+        grupos.setdefault(p.get(agrupar_por) or f"Sem {agrupar_por}", []).append({
+            "nome": (p.get("nome") or "").strip(), "preco": p["preco"], "quantidade": p["quantidade"],
+            "marca": p.get("marca"), "estilo": p.get("estilo"), "tipo": p.get("tipo"),
+            "data_validade": p.get("data_validade"), "codigo_barras": p.get("codigo_barras"),
+        })
+
+    tarefas = []
+    for tipo in tipos:
+        for grupo, itens in grupos.items():
+            if TIPOS[tipo][2]:
+                itens = [p for p in itens if p["codigo_barras"]]
+            partes = [itens[i:i + MAX_PRODUTOS_POR_DOCUMENTO] for i in range(0, len(itens), MAX_PRODUTOS_POR_DOCUMENTO)]
+            for numero, parte in enumerate(partes, start=1):
+                tarefas.append((tipo, grupo, numero if len(partes) > 1 else 0, parte))
+    tarefas.sort(key=lambda t: len(t[3]), reverse=True)
+    return tarefas
+
+
+def gerar_relatorios(destino, tipos=tuple(TIPOS), agrupar_por="marca", produtos=None, processos=PROCESSOS, progresso=None):
+    """Gera os documentos em paralelo e grava todos num .zip (`destino`: caminho ou arquivo aberto).
+
+    Cada PDF entra no .zip assim que fica pronto e o arquivo temporário é apagado, então
+    nem os documentos nem o .zip inteiro ficam na memória. `progresso(feitos, total, nome)`
+    é chamado a cada documento. Para cancelar, basta uma exceção sair de `progresso` (o
+    Streamlit faz isso quando o usuário clica em outro botão) ou um Ctrl+C: os documentos
+    que ainda não começaram são descartados e o .zip pela metade não substitui o anterior.
+
+    Retorna {'documentos', 'produtos', 'processos', 'segundos', 'segundos_documentos'}.
+    """
+    if produtos is None:
+        from utils.database import get_all_produtos
+        produtos = get_all_produtos()
+    tarefas = planejar(produtos, tipos, agrupar_por)
+    processos = max(1, min(processos, len(tarefas)))
+
+    inicio = time.perf_counter()
+    em_arquivo = isinstance(destino, (str, os.PathLike))
+    parcial = f"{destino}.part" if em_arquivo else None
+    soma = 0.0
+    with tempfile.TemporaryDirectory(prefix="relatorios_") as pasta:
+        executor = ProcessPoolExecutor(max_workers=processos) if processos > 1 else None
+        try:
+            # PDFs já são comprimidos: ZIP_STORED evita recomprimir
+            with zipfile.ZipFile(parcial or destino, "w", zipfile.ZIP_STORED) as zf:
+                if executor is not None:
+                    futuros = [executor.submit(_renderizar, tarefa, pasta) for tarefa in tarefas]
+                    prontos = (futuro.result() for futuro in as_completed(futuros))
+                else:
+                    prontos = (_renderizar(tarefa, pasta) for tarefa in tarefas)
+                for feitos, (nome, caminho, segundos) in enumerate(prontos, start=1):
+                    zf.write(caminho, nome)
+                    os.remove(caminho)
+                    soma += segundos
+                    if progresso:
+                        progresso(feitos, len(tarefas), nome)
+            if em_arquivo:
+                os.replace(parcial, destino)
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=True, cancel_futures=True)
+            if parcial and os.path.exists(parcial):
+                os.remove(parcial)
+
+    return {
+        "documentos": len(tarefas),
+        "produtos": len(produtos),
+        "processos": processos,
+        "segundos": time.perf_counter() - inicio,
+        "segundos_documentos": soma,
+    }
@@ -0,0 +1,112 @@
+from datetime import date, datetime
+
+# ====================================================================
+# REGRAS DE PRODUTO (formulários, chatbot, importação e triggers do banco)
+# ====================================================================
+
+# Mensagens também usadas nos triggers de utils/database.py: o erro do banco chega igual ao da validação
+ERRO_NOME = "O nome do produto é obrigatório."
+ERRO_PRECO = "O preço deve ser um número maior que zero."
+ERRO_QUANTIDADE = "A quantidade deve ser um número inteiro não negativo."
+ERRO_VALIDADE = "Data de validade inválida (use DD/MM/AAAA ou AAAA-MM-DD)."
+ERRO_DATA_VENDA = "Data da última venda inválida."
+ERRO_ESTOQUE_LOCAL = "O estoque de um local não pode ficar negativo."
+
+# Formatos aceitos na entrada (o banco guarda sempre AAAA-MM-DD)
+FORMATOS_DATA = ("%Y-%m-%d", "%d/%m/%Y", "%d/%m/%y", "%d-%m-%Y")
+
+
+def validar_nome(valor) -> str:
+    nome = str(valor).strip() if valor is not None else ""
+    if not nome:
+        raise ValueError(ERRO_NOME)
+    return nome
+
+
+def validar_preco(valor) -> float:
+    """Preço positivo; aceita texto com vírgula decimal ("49,90")."""
+    try:
+        preco = float(valor.replace(",", ".")) if isinstance(valor, str) else float(valor)
+    except (TypeError, ValueError):
+        raise ValueError(ERRO_PRECO)
+    if isinstance(valor, bool) or not preco > 0 or preco == float("inf"):
+        raise ValueError(ERRO_PRECO)
+    return preco
+
+
+def validar_quantidade(valor) -> int:
+    """Inteiro >= 0; aceita "3" e 3.0, mas não 3.5."""
+    try:
+        numero = float(valor.strip()) if isinstance(valor, str) else float(valor)
+    except (AttributeError, TypeError, ValueError):
+        raise ValueError(ERRO_QUANTIDADE)
+    if isinstance(valor, bool) or not numero.is_integer() or numero < 0:
+        raise ValueError(ERRO_QUANTIDADE)
+    return int(numero)
+
+
+def _data(valor):
+    if isinstance(valor, datetime):
+        return valor.date()
+    if isinstance(valor, date):
+        return valor
+    texto = str(valor).strip()
+    for formato in FORMATOS_DATA:
+        try:
+            return datetime.strptime(texto, formato).date()
+        except ValueError:
+            pass
+    # Data e hora ISO ("2026-05-12T10:00:00"): vale o dia
+    return datetime.fromisoformat(texto).date()
+
+
+def validar_data(valor) -> str | None:
+    """Data de validade como AAAA-MM-DD (None/vazio = sem validade)."""
+    if valor is None or (isinstance(valor, str) and not valor.strip()):
+        return None
+    try:
+        return _data(valor).isoformat()
+    except (TypeError, ValueError):
+        raise ValueError(ERRO_VALIDADE)
+
+
+def validar_data_hora(valor) -> str | None:
+    """Data e hora ISO (formato de data_ultima_venda); None/vazio = nunca vendido."""
+    if valor is None or (isinstance(valor, str) and not valor.strip()):
+        return None
+    if isinstance(valor, datetime):
+        return valor.isoformat()
+    try:
+        return datetime.fromisoformat(str(valor).strip()).isoformat()
+    except ValueError:
+        try:
+            return datetime.combine(_data(valor), datetime.min.time()).isoformat()
+        except (TypeError, ValueError):
+            raise ValueError(ERRO_DATA_VENDA)
+
+
+VALIDADORES = {
+    "nome": validar_nome,
+    "preco": validar_preco,
+    "quantidade": validar_quantidade,
+    "data_validade": validar_data,
+    "data_ultima_venda": validar_data_hora,
+}
+
+
+def validar_produto(campos):
+    """Valida e normaliza os campos informados de um produto (os demais passam sem alteração).
+
+    Retorna um novo dict com os valores convertidos (preço float, quantidade int, datas ISO).
+    Levanta ValueError com todas as mensagens se algum campo for inválido.
+    """
+    validos, erros = {}, []
+    for campo, valor in campos.items():
+        validador = VALIDADORES.get(campo)
+        try:
+            validos[campo] = validador(valor) if validador else valor
+        except ValueError as e:
+            erros.append(str(e))
+    if erros:
+        raise ValueError(" ".join(erros))
+    return validos